@@ -10,10 +10,13 @@ from datetime import datetime
 from enum import Enum
 from typing import Dict
 
-from openai import AsyncOpenAI
 from pydantic import BaseModel, Field
 
 
+# Prompts show the score rounded to this step, so small drifts don't change the prompt
+SCORE_BUCKET = 10
+
+
 class AffectionLevel(str, Enum):
     """Buckets describing Mona's attachment to the user."""
 
@@ -54,7 +57,8 @@ class AffectionEngine:
             return AffectionLevel.WARMING_UP
         return AffectionLevel.DISTANT
 
-    def _delta_from_message(self, message: str) -> int:
+    def keyword_delta(self, message: str) -> int:
+        """Keyword heuristic for the affection delta (fallback when LLM analysis is unavailable)."""
         message_lower = message.lower()
 
         positive_keywords = ["love", "care", "thank", "appreciate", "miss you", "hug"]
@@ -74,7 +78,7 @@ class AffectionEngine:
         """Update and return the affection state after a user message."""
 
         state = self._get_state(user_id)
-        delta = self._delta_from_message(message)
+        delta = self.keyword_delta(message)
         new_score = max(0, min(100, state.score + delta))
         level = self._score_to_level(new_score)
         trend = "up" if delta > 0 else "down" if delta < 0 else "steady"
@@ -88,60 +92,8 @@ class AffectionEngine:
         self._states[user_id] = new_state
         return new_state
 
-    async def analyze_sentiment_llm(
-        self, client: AsyncOpenAI, user_message: str, mona_response: str
-    ) -> int:
-        """Use GPT-4o-mini to score the sentiment delta of a user message.
-
-        Returns a value between -10 and +10.
-        Falls back to ``_delta_from_message()`` on error.
-        """
-        try:
-            response = await client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "You are scoring how a message affects a virtual companion's affection "
-                            "toward the user. Return a single integer from -10 to +10.\n"
-                            "Examples:\n"
-                            '  "I love pizza" → 2 (positive but not directed at companion)\n'
-                            '  "I love you" → 8 (strong affection toward companion)\n'
-                            '  "You\'re annoying" → -6 (negative toward companion)\n'
-                            '  "Tell me about cats" → 1 (neutral engagement)\n'
-                            "Reply with ONLY the integer, nothing else."
-                        ),
-                    },
-                    {
-                        "role": "user",
-                        "content": (
-                            f'User said: "{user_message}"\n'
-                            f'Companion replied: "{mona_response}"'
-                        ),
-                    },
-                ],
-                temperature=0.2,
-                max_tokens=5,
-            )
-
-            raw = response.choices[0].message.content.strip()
-            delta = int(raw)
-            return max(-10, min(10, delta))
-
-        except Exception as e:
-            print(f"⚠ LLM sentiment scoring failed, using keyword fallback: {e}")
-            return self._delta_from_message(user_message)
-
-    async def update_affection_llm(
-        self,
-        client: AsyncOpenAI,
-        user_id: str,
-        user_message: str,
-        mona_response: str,
-    ) -> AffectionState:
-        """LLM-powered affection update.  Runs as a background task."""
-        delta = await self.analyze_sentiment_llm(client, user_message, mona_response)
+    def apply_delta(self, user_id: str, delta: int) -> AffectionState:
+        """Apply a sentiment delta (-10..+10) from turn analysis."""
         state = self._get_state(user_id)
         new_score = max(0, min(100, state.score + delta))
         level = self._score_to_level(new_score)
@@ -156,12 +108,17 @@ class AffectionEngine:
         self._states[user_id] = new_state
         return new_state
 
+    def state_key(self, user_id: str) -> tuple:
+        """Everything describe_state() depends on (changes only when the description would)."""
+        state = self._get_state(user_id)
+        return state.level.value, state.score // SCORE_BUCKET, state.trend
+
     def describe_state(self, user_id: str) -> str:
         """Return a short human-readable description for prompts."""
 
-        state = self._get_state(user_id)
+        level, bucket, trend = self.state_key(user_id)
         return (
-            f"Affection level: {state.level.value} (score {state.score}/100, trend {state.trend}). "
+            f"Affection level: {level} (score ~{bucket * SCORE_BUCKET}/100, trend {trend}). "
             "Respond with warmth proportional to this level."
         )
 
@@ -12,7 +12,7 @@ logger = logging.getLogger(__name__)
 
 # API pricing reference (per 1K tokens/characters)
 PRICING = {
-    "gpt-4o-mini": {"input": 0.00015, "output": 0.0006},
+    "gpt-4o-mini": {"input": 0.00015, "cached_input": 0.000075, "output": 0.0006},
     "whisper-1": {"per_minute": 0.006},
     "tts-1": {"per_1k_chars": 0.015},
     "fish": {"per_1k_chars": 0.01},
@@ -65,8 +65,13 @@ class Analytics:
         output_tokens: int = 0,
         characters: int = 0,
         estimated_cost: float = 0.0,
+        cached_input_tokens: int = 0,
     ):
-        """Track API costs in database for unit economics."""
+        """Track API costs in database for unit economics.
+
+        cached_input_tokens is the part of input_tokens served from the
+        provider's prompt cache (billed at the cached rate).
+        """
         async with async_session() as session:
             usage = APIUsage(
                 user_id=user_id,
@@ -75,6 +80,7 @@ class Analytics:
                 model=model,
                 input_tokens=input_tokens,
                 output_tokens=output_tokens,
+                cached_input_tokens=cached_input_tokens,
                 characters=characters,
                 estimated_cost_usd=estimated_cost,
             )
@@ -83,10 +89,23 @@ class Analytics:
         logger.debug(f"API cost: {service} ${estimated_cost:.4f} | user={user_id or guest_session_id}")
 
 
-def calculate_llm_cost(input_tokens: int, output_tokens: int, model: str = "gpt-4o-mini") -> float:
-    """Calculate cost for LLM API call."""
+def cached_prompt_tokens(usage) -> int:
+    """Prompt tokens served from the provider's prefix cache (0 if not reported)."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", None) or 0
+
+
+def calculate_llm_cost(
+    input_tokens: int,
+    output_tokens: int,
+    model: str = "gpt-4o-mini",
+    cached_input_tokens: int = 0,
+) -> float:
+    """Calculate cost for LLM API call (cached input tokens are billed at the cached rate)."""
     pricing = PRICING.get(model, PRICING["gpt-4o-mini"])
-    input_cost = (input_tokens / 1000) * pricing["input"]
+    uncached_tokens = input_tokens - cached_input_tokens
+    input_cost = (uncached_tokens / 1000) * pricing["input"]
+    input_cost += (cached_input_tokens / 1000) * pricing.get("cached_input", pricing["input"])
     output_cost = (output_tokens / 1000) * pricing["output"]
     return input_cost + output_cost
 
@@ -0,0 +1,833 @@
+"""
+Audio Cache - Shared, size-bounded, content-addressed cache for all TTS engines.
+
+Every engine stores its audio as <md5>.<ext> plus optional lip sync sidecars
+(<md5>.lipsync.json, or <md5>.lipsync.aligned.json for audio-aligned cues) in
+the same directory. Sidecars are written in the compact lip sync encoding;
+older full-cue sidecars are still read. The cache keeps an index of size, last access
+and hit count per key (persisted to .cache_index.json), enforces a byte budget
+with LRU or LFU eviction, and tracks hit-rate stats - so nothing needs to glob
+and stat the whole directory after startup. The index is kept in recency
+order (and, for LFU, backed by a heap), so an over-budget put never sorts it.
+
+Misses are single-flight: concurrent requests for the same key (e.g. every
+new connection asking for the welcome line) share one synthesis.
+
+Engines use the async methods (aget/aput/asave_lip_sync): file reads, writes,
+deletes and index flushes run in worker threads, while the in-memory index is
+only ever touched on the event loop. The index is written at most once per
+INDEX_FLUSH_INTERVAL_SECONDS and on shutdown; files stored after the last
+write before a crash are re-adopted on their next lookup. The sync methods
+remain for scripts.
+
+Optional Opus tier (AUDIO_CACHE_OPUS=1, needs ffmpeg): after a WAV is stored,
+an ffmpeg subprocess writes <md5>.ogg next to it. Clients that list "opus" in
+their audio formats are sent the .ogg URL once it exists (preferred_url()).
+With AUDIO_CACHE_DROP_WAV=1 the WAV is deleted after transcoding - lip sync
+was already generated from the in-memory bytes, and later sidecar rebuilds
+use the duration recorded in the index - and WAV lookups fall back to the
+.ogg variant. Engines don't know which client they synthesize for, so both
+the drop and the fallback only happen while every connected client accepts
+Opus (set_client_formats()); otherwise a dropped WAV is a miss, and the
+re-synthesized WAV is kept.
+
+Tools that write into the directory while the server runs (precache_voices.py)
+open it with get_audio_cache(shared=True): that instance never evicts or drops
+WAVs, and its index flushes merge its own entries into the on-disk index
+instead of overwriting the server's view.
+"""
+
+import asyncio
+import hashlib
+import heapq
+import json
+import os
+import shutil
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Collection, Dict, List, Optional, Set, Tuple
+
+from lip_sync import (
+    decode_lip_sync_compact,
+    encode_lip_sync_compact,
+    generate_lip_sync_aligned,
+    generate_lip_sync_async,
+    generate_lip_sync_for_audio_async,
+    generate_lip_sync_from_text,
+    get_mp3_duration,
+    get_wav_duration,
+)
+
+INDEX_FILENAME = ".cache_index.json"
+LIP_SYNC_SUFFIX = "lipsync.json"
+ALIGNED_LIP_SYNC_SUFFIX = "lipsync.aligned.json"
+INDEX_FLUSH_INTERVAL_SECONDS = 30  # Async index writes happen at most this often
+
+DEFAULT_MAX_BYTES = int(float(os.getenv("AUDIO_CACHE_MAX_MB", "1024")) * 1024 * 1024)
+DEFAULT_POLICY = os.getenv("AUDIO_CACHE_POLICY", "lru")  # "lru" or "lfu"
+
+# Opus tier
+OPUS_EXT = "ogg"
+OPUS_ENABLED = os.getenv("AUDIO_CACHE_OPUS", "0") == "1"
+OPUS_BITRATE = os.getenv("AUDIO_CACHE_OPUS_BITRATE", "32k")  # Plenty for a single voice
+DROP_WAV_AFTER_OPUS = os.getenv("AUDIO_CACHE_DROP_WAV", "0") == "1"
+
+
+def _file_size(path: Path) -> Optional[int]:
+    try:
+        return path.stat().st_size
+    except OSError:
+        return None
+
+
+def _read_text(path: Path) -> Optional[str]:
+    try:
+        return path.read_text()
+    except OSError:
+        return None
+
+
+def _write_bytes(path: Path, data: bytes):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _unlink_all(paths: List[Path]) -> int:
+    count = 0
+    for path in paths:
+        try:
+            path.unlink()
+            count += 1
+        except FileNotFoundError:
+            pass
+    return count
+
+
+def _audio_duration(path: Path) -> float:
+    if path.suffix == ".mp3":
+        return get_mp3_duration(str(path))
+    return get_wav_duration(str(path))
+
+
+def _read_bytes(path: Path) -> Optional[bytes]:
+    try:
+        return path.read_bytes()
+    except OSError:
+        return None
+
+
+def _uses_aligned(path: Path, lip_sync_mode: str) -> bool:
+    # Aligned cues need decoded PCM, which we only have for WAV
+    return lip_sync_mode == "aligned" and path.suffix == ".wav"
+
+
+def _lip_sync_suffix(lip_sync_mode: str) -> str:
+    return ALIGNED_LIP_SYNC_SUFFIX if lip_sync_mode == "aligned" else LIP_SYNC_SUFFIX
+
+
+def _dump_lip_sync(lip_sync_data: List[Dict[str, Any]]) -> str:
+    return json.dumps(encode_lip_sync_compact(lip_sync_data), separators=(",", ":"))
+
+
+def _owned_by(entry: Dict[str, Any], engine: Optional[str], exts: Collection[str]) -> bool:
+    if engine is None:
+        return True
+    owner = entry.get("engine")
+    if owner:
+        return owner == engine
+    # Unclaimed: match on the audio format, like the per-engine globs used to
+    return any(ext in entry["files"] for ext in exts)
+
+
+class AudioCache:
+    """Content-addressed audio + lip sync cache with an index and a byte budget."""
+
+    def __init__(
+        self,
+        cache_dir: str = "assets/audio_cache",
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        policy: str = DEFAULT_POLICY,
+        opus: bool = OPUS_ENABLED,
+        drop_wav: bool = DROP_WAV_AFTER_OPUS,
+        shared: bool = False,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.policy = policy.lower()
+        self.index_path = self.cache_dir / INDEX_FILENAME
+        # Another process (the server) owns this directory: no evictions, merge-on-flush
+        self.shared = shared
+        self._touched: Set[str] = set()  # Keys this instance wrote (shared mode)
+
+        # key -> {"files": {suffix: size}, "size", "last_access", "hits", "engine"}
+        # Least recently used first: LRU eviction walks it from the front
+        self._index: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # LFU eviction order, (hits, last_access, key) - stale tuples are skipped on pop
+        self._lfu_heap: List[Tuple[int, float, str]] = []
+        self._total_bytes = 0
+        self._dirty = False
+        self._last_flush = 0.0
+        self._flushing = False  # An async index write is running
+
+        # (key, lip sync variant) -> [shared synthesis task, waiter count]
+        self._inflight: Dict[Tuple[str, Any], List[Any]] = {}
+
+        self.opus_enabled = opus and shutil.which("ffmpeg") is not None
+        if opus and not self.opus_enabled:
+            print("Audio cache: AUDIO_CACHE_OPUS set but ffmpeg not found - Opus tier disabled")
+        self.drop_wav = drop_wav and self.opus_enabled and not shared
+        self._transcoding: Set[str] = set()
+        self._transcode_tasks: Set[asyncio.Task] = set()  # Strong refs until done
+        self._client_opus: Dict[str, bool] = {}  # client id -> accepts Opus
+        self.transcodes = 0
+        self.transcode_failures = 0
+
+        # Stats since process start
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.lip_sync_rebuilds = 0
+        self.coalesced = 0
+
+        self._load_index()
+
+    # ------------------------------------------------------------------
+    # Keys and paths
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Content hash for a cache entry (same scheme the engines always used)."""
+        return hashlib.md5("_".join(str(part) for part in parts).encode()).hexdigest()
+
+    def audio_path(self, key: str, ext: str) -> Path:
+        return self.cache_dir / f"{key}.{ext}"
+
+    def lip_sync_path(self, key: str, lip_sync_mode: str = "textbased") -> Path:
+        return self.cache_dir / f"{key}.{_lip_sync_suffix(lip_sync_mode)}"
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def get(
+        self,
+        key: str,
+        ext: str,
+        lip_sync_text: Optional[str] = None,
+        lip_sync_mode: str = "textbased",
+        engine: Optional[str] = None,
+    ) -> Optional[Tuple[Path, Optional[List[Dict[str, Any]]]]]:
+        """
+        Look up cached audio.
+
+        Args:
+            key: Cache key from make_key().
+            ext: Audio extension ("wav", "mp3").
+            lip_sync_text: If given, the lip sync sidecar is loaded - and rebuilt
+                from the audio when missing instead of returning None cues.
+            lip_sync_mode: "textbased" or "aligned" - each has its own sidecar.
+            engine: The engine asking; claims entries adopted without one.
+
+        Returns:
+            (audio_path, lip_sync_data) on a hit, None on a miss.
+        """
+        path = self.audio_path(key, ext)
+        size = _file_size(path)
+        if size is None and self._has_opus_fallback(key, ext) and self.clients_accept_opus():
+            # WAV was dropped after transcoding - serve the Opus variant
+            self._forget_file(key, ext)
+            ext = OPUS_EXT
+            path = self.audio_path(key, ext)
+            size = _file_size(path)
+        if not self._record_lookup(key, ext, size, engine):
+            return None
+        self._maybe_flush()
+
+        lip_sync_data = None
+        if lip_sync_text is not None:
+            lip_sync_data = self.load_lip_sync(key, lip_sync_mode)
+            if lip_sync_data is None:
+                lip_sync_data = self.rebuild_lip_sync(key, path, lip_sync_text, lip_sync_mode)
+        return path, lip_sync_data
+
+    async def aget(
+        self,
+        key: str,
+        ext: str,
+        lip_sync_text: Optional[str] = None,
+        lip_sync_mode: str = "textbased",
+        engine: Optional[str] = None,
+    ) -> Optional[Tuple[Path, Optional[List[Dict[str, Any]]]]]:
+        """Non-blocking get() - disk access happens in a worker thread."""
+        path = self.audio_path(key, ext)
+        size = await asyncio.to_thread(_file_size, path)
+        if size is None and self._has_opus_fallback(key, ext) and self.clients_accept_opus():
+            # WAV was dropped after transcoding - serve the Opus variant
+            self._forget_file(key, ext)
+            ext = OPUS_EXT
+            path = self.audio_path(key, ext)
+            size = await asyncio.to_thread(_file_size, path)
+        if not self._record_lookup(key, ext, size, engine):
+            return None
+        await self._amaybe_flush()
+
+        lip_sync_data = None
+        if lip_sync_text is not None:
+            payload = await asyncio.to_thread(_read_text, self.lip_sync_path(key, lip_sync_mode))
+            lip_sync_data = self._parse_lip_sync(key, payload, lip_sync_mode)
+            if lip_sync_data is None:
+                lip_sync_data = await self._arebuild_lip_sync(key, path, lip_sync_text, lip_sync_mode)
+        return path, lip_sync_data
+
+    def load_lip_sync(self, key: str, lip_sync_mode: str = "textbased") -> Optional[List[Dict[str, Any]]]:
+        """Load the lip sync sidecar for a key, or None if missing/corrupt."""
+        return self._parse_lip_sync(key, _read_text(self.lip_sync_path(key, lip_sync_mode)), lip_sync_mode)
+
+    def rebuild_lip_sync(
+        self,
+        key: str,
+        audio_path: Path,
+        text: str,
+        lip_sync_mode: str = "textbased",
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Regenerate a missing lip sync sidecar from the cached audio."""
+        if _uses_aligned(audio_path, lip_sync_mode):
+            audio_bytes = _read_bytes(audio_path)
+            lip_sync_data = generate_lip_sync_aligned(text, audio_bytes) if audio_bytes else None
+        else:
+            duration = self._known_duration(key, audio_path) or _audio_duration(audio_path)
+            lip_sync_data = generate_lip_sync_from_text(text, duration) if duration > 0 else None
+
+        if lip_sync_data:
+            self.save_lip_sync(key, lip_sync_data, lip_sync_mode)
+            self.lip_sync_rebuilds += 1
+        return lip_sync_data
+
+    async def _arebuild_lip_sync(
+        self,
+        key: str,
+        audio_path: Path,
+        text: str,
+        lip_sync_mode: str,
+    ) -> Optional[List[Dict[str, Any]]]:
+        # File reads go to a worker thread, cue generation to the lip sync executor
+        if _uses_aligned(audio_path, lip_sync_mode):
+            audio_bytes = await asyncio.to_thread(_read_bytes, audio_path)
+            lip_sync_data = (
+                await generate_lip_sync_for_audio_async(text, audio_bytes, "wav", lip_sync_mode)
+                if audio_bytes else None
+            )
+        else:
+            duration = self._known_duration(key, audio_path) or await asyncio.to_thread(_audio_duration, audio_path)
+            lip_sync_data = await generate_lip_sync_async(text, duration) if duration > 0 else None
+
+        if lip_sync_data:
+            await self.asave_lip_sync(key, lip_sync_data, lip_sync_mode)
+            self.lip_sync_rebuilds += 1
+        return lip_sync_data
+
+    def _record_lookup(self, key: str, ext: str, size: Optional[int], engine: Optional[str] = None) -> bool:
+        """Update the index and hit/miss stats for a lookup. size is None if the file is missing."""
+        entry = self._index.get(key)
+        if size is None:
+            if entry is not None and ext in entry["files"]:
+                # File vanished behind our back - drop it from the index
+                self._forget_file(key, ext)
+            self.misses += 1
+            return False
+
+        if entry is None or ext not in entry["files"]:
+            # Written by another process (e.g. the precache tool) - adopt it
+            self._track_file(key, ext, size, engine)
+            entry = self._index[key]
+        elif engine and not entry.get("engine"):
+            # Adopted by an index rebuild - the key is the engine's own
+            entry["engine"] = engine
+
+        self.hits += 1
+        entry["hits"] += 1
+        entry["last_access"] = time.time()
+        self._touch(key, entry)
+        self._dirty = True
+        return True
+
+    def _parse_lip_sync(
+        self,
+        key: str,
+        payload: Optional[str],
+        lip_sync_mode: str = "textbased",
+    ) -> Optional[List[Dict[str, Any]]]:
+        if payload is None:
+            return None
+        suffix = _lip_sync_suffix(lip_sync_mode)
+        entry = self._index.get(key)
+        if entry is None or suffix not in entry["files"]:
+            self._track_file(key, suffix, len(payload.encode()), None)
+        try:
+            data = json.loads(payload)
+            # Compact sidecars are dicts, pre-compact ones a list of full cues
+            return decode_lip_sync_compact(data) if isinstance(data, dict) else data
+        except Exception:
+            return None
+
+    # ------------------------------------------------------------------
+    # Single-flight misses
+    # ------------------------------------------------------------------
+
+    async def single_flight(
+        self,
+        key: str,
+        lip_sync_variant: Any,
+        synthesize: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Run synthesize() once per key, however many callers miss at the same time.
+
+        The first caller starts the synthesis as its own task; later callers
+        for the same key await that task instead of hitting the backend again.
+        A waiter being cancelled (e.g. a hedged request that lost) only cancels
+        the synthesis once nobody else is waiting on it.
+
+        lip_sync_variant separates callers that want different cues from the
+        same audio (None when no lip sync is wanted, otherwise the mode).
+        """
+        flight_key = (key, lip_sync_variant)
+        flight = self._inflight.get(flight_key)
+        if flight is None:
+            task = asyncio.ensure_future(synthesize())
+            flight = [task, 0]
+            self._inflight[flight_key] = flight
+            task.add_done_callback(lambda _: self._inflight.pop(flight_key, None))
+        else:
+            self.coalesced += 1
+            print(f"Audio cache [COALESCED] {key[:8]} ({self.coalesced} total)")
+
+        task = flight[0]
+        flight[1] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and flight[1] == 1:
+                task.cancel()
+            raise
+        finally:
+            flight[1] -= 1
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def put(self, key: str, ext: str, data: bytes, engine: Optional[str] = None) -> Path:
+        """Store audio bytes under a key and enforce the byte budget."""
+        path = self.audio_path(key, ext)
+        _write_bytes(path, data)
+        self._track_file(key, ext, len(data), engine)
+        self._evict_if_needed(protect=key)
+        return path
+
+    async def aput(self, key: str, ext: str, data: bytes, engine: Optional[str] = None) -> Path:
+        """Non-blocking put() - the write and any evictions happen in a worker thread.
+
+        WAVs also get an Opus variant in the background when the tier is on.
+        """
+        path = self.audio_path(key, ext)
+        await asyncio.to_thread(_write_bytes, path, data)
+        self._track_file(key, ext, len(data), engine)
+        evicted = self._collect_evictions(protect=key)
+        if evicted:
+            await asyncio.to_thread(_unlink_all, evicted)
+        await self._amaybe_flush()
+        if ext == "wav" and self.opus_enabled and key not in self._transcoding and not self._has_opus_fallback(key, ext):
+            self._transcoding.add(key)
+            task = asyncio.create_task(self._transcode_opus(key, path, engine))
+            self._transcode_tasks.add(task)
+            task.add_done_callback(self._transcode_tasks.discard)
+        return path
+
+    # ------------------------------------------------------------------
+    # Opus tier
+    # ------------------------------------------------------------------
+
+    def preferred_url(self, audio_url: Optional[str], audio_formats: Collection[str]) -> Optional[str]:
+        """
+        Swap an /audio/<key>.wav URL for its Opus variant if the client accepts
+        Opus and the variant exists (it appears shortly after first synthesis).
+        """
+        if not audio_url or "opus" not in audio_formats or not audio_url.endswith(".wav"):
+            return audio_url
+        key = audio_url.rsplit("/", 1)[-1].split(".", 1)[0]
+        entry = self._index.get(key)
+        if entry is None or OPUS_EXT not in entry["files"]:
+            return audio_url
+        return f"{audio_url[:-len('.wav')]}.{OPUS_EXT}"
+
+    def set_client_formats(self, client_id: str, audio_formats: Collection[str]):
+        """Record whether a connected client can play Opus (register on connect with ())."""
+        self._client_opus[client_id] = "opus" in audio_formats
+
+    def remove_client(self, client_id: str):
+        self._client_opus.pop(client_id, None)
+
+    def clients_accept_opus(self) -> bool:
+        """True if every connected client accepts Opus (WAVs may be dropped / served as .ogg)."""
+        return all(self._client_opus.values())
+
+    def _has_opus_fallback(self, key: str, ext: str) -> bool:
+        entry = self._index.get(key)
+        return ext == "wav" and entry is not None and OPUS_EXT in entry["files"]
+
+    def _known_duration(self, key: str, audio_path: Path) -> float:
+        # We can't parse Ogg headers - use the duration recorded at transcode time
+        if audio_path.suffix != f".{OPUS_EXT}":
+            return 0.0
+        return self._index.get(key, {}).get("duration", 0.0)
+
+    async def _transcode_opus(self, key: str, wav_path: Path, engine: Optional[str]):
+        """Encode a cached WAV to Ogg/Opus with ffmpeg (subprocess, doesn't block the loop)."""
+        ogg_path = self.audio_path(key, OPUS_EXT)
+        tmp_path = self.cache_dir / f".{key}.{OPUS_EXT}.tmp"  # Dot-prefixed: never adopted by the index scan
+        try:
+            duration = await asyncio.to_thread(_audio_duration, wav_path)
+            start = time.perf_counter()
+            proc = await asyncio.create_subprocess_exec(
+                "ffmpeg", "-y", "-loglevel", "error", "-i", str(wav_path),
+                "-c:a", "libopus", "-b:a", OPUS_BITRATE, "-application", "voip",
+                "-f", "ogg", str(tmp_path),
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            _, stderr = await proc.communicate()
+            if proc.returncode != 0:
+                raise RuntimeError(stderr.decode(errors="replace").strip()[:200])
+            await asyncio.to_thread(os.replace, tmp_path, ogg_path)
+            size = await asyncio.to_thread(_file_size, ogg_path)
+
+            entry = self._index.get(key)
+            if entry is None or size is None or "wav" not in entry["files"]:
+                # Evicted or cleared while we were encoding
+                await asyncio.to_thread(_unlink_all, [ogg_path])
+                return
+
+            wav_bytes = entry["files"]["wav"]
+            self._track_file(key, OPUS_EXT, size, engine)
+            entry["wav_bytes"] = wav_bytes
+            entry["duration"] = round(duration, 3)
+            self.transcodes += 1
+            encode_ms = (time.perf_counter() - start) * 1000
+            print(f"Audio cache [OPUS] {key[:8]} {wav_bytes / 1024:.0f}KB -> {size / 1024:.0f}KB in {encode_ms:.0f}ms")
+
+            if self.drop_wav and self.clients_accept_opus():
+                self._forget_file(key, "wav")
+                await asyncio.to_thread(_unlink_all, [wav_path])
+            evicted = self._collect_evictions(protect=key)
+            if evicted:
+                await asyncio.to_thread(_unlink_all, evicted)
+            await self._amaybe_flush()
+        except Exception as e:
+            self.transcode_failures += 1
+            print(f"Audio cache [OPUS ERROR] {key[:8]}: {e}")
+            await asyncio.to_thread(_unlink_all, [tmp_path])
+        finally:
+            self._transcoding.discard(key)
+
+    def opus_savings(self) -> Dict[str, Dict[str, Any]]:
+        """Per-engine WAV vs Opus bytes for every transcoded entry (from the index)."""
+        savings: Dict[str, Dict[str, Any]] = {}
+        for entry in self._index.values():
+            if OPUS_EXT not in entry["files"] or "wav_bytes" not in entry:
+                continue
+            engine = entry.get("engine") or "unknown"
+            totals = savings.setdefault(engine, {"files": 0, "wav_bytes": 0, "opus_bytes": 0})
+            totals["files"] += 1
+            totals["wav_bytes"] += entry["wav_bytes"]
+            totals["opus_bytes"] += entry["files"][OPUS_EXT]
+        for totals in savings.values():
+            totals["saved_bytes"] = totals["wav_bytes"] - totals["opus_bytes"]
+            totals["ratio"] = round(totals["wav_bytes"] / totals["opus_bytes"], 1) if totals["opus_bytes"] else 0.0
+        return savings
+
+    def save_lip_sync(self, key: str, lip_sync_data: List[Dict[str, Any]], lip_sync_mode: str = "textbased"):
+        """Store the lip sync sidecar for a key."""
+        payload = _dump_lip_sync(lip_sync_data)
+        self.lip_sync_path(key, lip_sync_mode).write_text(payload)
+        self._track_file(key, _lip_sync_suffix(lip_sync_mode), len(payload.encode()), None)
+
+    async def asave_lip_sync(self, key: str, lip_sync_data: List[Dict[str, Any]], lip_sync_mode: str = "textbased"):
+        """Non-blocking save_lip_sync()."""
+        payload = _dump_lip_sync(lip_sync_data)
+        await asyncio.to_thread(self.lip_sync_path(key, lip_sync_mode).write_text, payload)
+        self._track_file(key, _lip_sync_suffix(lip_sync_mode), len(payload.encode()), None)
+
+    def clear(self, engine: Optional[str] = None, exts: Collection[str] = ()) -> int:
+        """Delete cached entries (all, or only one engine's). Returns files deleted.
+
+        Entries no engine has claimed yet (adopted by an index rebuild and not
+        looked up since) count as the engine's when they hold one of its exts.
+        """
+        paths: List[Path] = []
+        for key in [k for k, e in self._index.items() if _owned_by(e, engine, exts)]:
+            paths.extend(self._pop_entry(key))
+        self._flush_index()
+        return _unlink_all(paths)
+
+    # ------------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------------
+
+    def total_bytes(self, engine: Optional[str] = None, exts: Collection[str] = ()) -> int:
+        """Cached bytes (all, or one engine's, see clear()) - answered from the index."""
+        if engine is None:
+            return self._total_bytes
+        return sum(e["size"] for e in self._index.values() if _owned_by(e, engine, exts))
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._index),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "policy": self.policy,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "evicted_bytes": self.evicted_bytes,
+            "lip_sync_rebuilds": self.lip_sync_rebuilds,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+            "opus": {
+                "enabled": self.opus_enabled,
+                "drop_wav": self.drop_wav,
+                "clients_accept_opus": self.clients_accept_opus(),
+                "transcodes": self.transcodes,
+                "failures": self.transcode_failures,
+                "pending": len(self._transcoding),
+                "by_engine": self.opus_savings(),
+            },
+        }
+
+    def flush(self):
+        """Persist the index if it has unsaved changes. Call on shutdown."""
+        if self._dirty:
+            self._flush_index()
+
+    # ------------------------------------------------------------------
+    # Index bookkeeping
+    # ------------------------------------------------------------------
+
+    def _track_file(self, key: str, suffix: str, size: int, engine: Optional[str]):
+        now = time.time()
+        entry = self._index.setdefault(
+            key, {"files": {}, "size": 0, "last_access": now, "hits": 0, "engine": engine}
+        )
+        old_size = entry["files"].get(suffix, 0)
+        entry["files"][suffix] = size
+        entry["size"] += size - old_size
+        entry["last_access"] = now
+        if engine and not entry.get("engine"):
+            entry["engine"] = engine
+        self._touch(key, entry)
+        self._total_bytes += size - old_size
+        self._dirty = True
+        if self.shared:
+            self._touched.add(key)
+
+    def _touch(self, key: str, entry: Dict[str, Any]):
+        """Move a key to the most recently used end (and re-rank it for LFU)."""
+        self._index.move_to_end(key)
+        if self.policy == "lfu":
+            heapq.heappush(self._lfu_heap, (entry["hits"], entry["last_access"], key))
+            if len(self._lfu_heap) > 2 * len(self._index) + 64:
+                self._rebuild_lfu_heap()
+
+    def _rebuild_lfu_heap(self):
+        self._lfu_heap = [(e["hits"], e["last_access"], k) for k, e in self._index.items()]
+        heapq.heapify(self._lfu_heap)
+
+    def _forget_file(self, key: str, suffix: str):
+        entry = self._index.get(key)
+        if not entry or suffix not in entry["files"]:
+            return
+        size = entry["files"].pop(suffix)
+        entry["size"] -= size
+        self._total_bytes -= size
+        if not entry["files"]:
+            del self._index[key]
+        self._dirty = True
+
+    def _pop_entry(self, key: str) -> List[Path]:
+        """Drop a key from the index and return its files (for the caller to delete)."""
+        entry = self._index.pop(key, None)
+        if not entry:
+            return []
+        self._total_bytes -= entry["size"]
+        self._dirty = True
+        return [self.cache_dir / f"{key}.{suffix}" for suffix in entry["files"]]
+
+    def _evict_if_needed(self, protect: Optional[str] = None):
+        """Evict entries over budget and delete their files."""
+        evicted = self._collect_evictions(protect)
+        if evicted:
+            _unlink_all(evicted)
+        self._maybe_flush(force=True)
+
+    def _collect_evictions(self, protect: Optional[str] = None) -> List[Path]:
+        """Pick least recently (LRU) or least frequently (LFU) used entries over budget.
+
+        Updates the index and returns the files to delete.
+        """
+        if self.shared or self._total_bytes <= self.max_bytes:
+            return []
+
+        excess = self._total_bytes - self.max_bytes
+        if self.policy == "lfu":
+            victims = self._lfu_victims(excess, protect)
+        else:
+            victims = self._lru_victims(excess, protect)
+
+        evicted: List[Path] = []
+        for key in victims:
+            size = self._index[key]["size"]
+            evicted.extend(self._pop_entry(key))
+            self.evictions += 1
+            self.evicted_bytes += size
+
+        print(f"Audio cache evicted down to {self._total_bytes / (1024 * 1024):.1f}MB ({self.evictions} evictions total)")
+        return evicted
+
+    def _lru_victims(self, excess: int, protect: Optional[str]) -> List[str]:
+        victims: List[str] = []
+        for key, entry in self._index.items():
+            if excess <= 0:
+                break
+            if key != protect:
+                victims.append(key)
+                excess -= entry["size"]
+        return victims
+
+    def _lfu_victims(self, excess: int, protect: Optional[str]) -> List[str]:
+        victims: List[str] = []
+        chosen: Set[str] = set()
+        kept: List[Tuple[int, float, str]] = []
+        while excess > 0 and self._lfu_heap:
+            item = heapq.heappop(self._lfu_heap)
+            hits, last_access, key = item
+            entry = self._index.get(key)
+            if entry is None or key in chosen or (entry["hits"], entry["last_access"]) != (hits, last_access):
+                continue  # Evicted, forgotten or re-ranked since this was pushed
+            if key == protect:
+                kept.append(item)
+                continue
+            victims.append(key)
+            chosen.add(key)
+            excess -= entry["size"]
+        for item in kept:
+            heapq.heappush(self._lfu_heap, item)
+        return victims
+
+    def _should_flush(self, force: bool) -> bool:
+        return self._dirty and (force or time.time() - self._last_flush >= INDEX_FLUSH_INTERVAL_SECONDS)
+
+    def _maybe_flush(self, force: bool = False):
+        if self._should_flush(force):
+            self._flush_index()
+
+    async def _amaybe_flush(self, force: bool = False):
+        if self._flushing or not self._should_flush(force):
+            return
+        # Snapshot on the loop, write in a thread (changes made meanwhile stay dirty)
+        payload = self._index_payload()
+        self._dirty = False
+        self._last_flush = time.time()
+        self._flushing = True
+        try:
+            if not await asyncio.to_thread(self._write_index, payload):
+                self._dirty = True
+        finally:
+            self._flushing = False
+
+    def _flush_index(self):
+        if self._write_index(self._index_payload()):
+            self._dirty = False
+            self._last_flush = time.time()
+
+    def _index_payload(self) -> str:
+        if self.shared:
+            return json.dumps({key: self._index[key] for key in self._touched if key in self._index})
+        return json.dumps(self._index)
+
+    def _write_index(self, payload: str) -> bool:
+        tmp_path = self.index_path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            if self.shared:
+                # Read-merge-write: keep every entry the owning process has on disk
+                merged = {}
+                if self.index_path.exists():
+                    try:
+                        merged = json.loads(self.index_path.read_text())
+                    except ValueError:
+                        pass  # Torn or corrupt - the server rebuilds from its own view
+                merged.update(json.loads(payload))
+                payload = json.dumps(merged)
+            tmp_path.write_text(payload)
+            os.replace(tmp_path, self.index_path)
+            return True
+        except Exception as e:
+            print(f"Audio cache [INDEX WRITE ERROR] {e}")
+            return False
+
+    def _load_index(self):
+        """Load the persisted index, or rebuild it with a one-time directory scan."""
+        if self.index_path.exists():
+            try:
+                self._set_index(json.loads(self.index_path.read_text()))
+                self._total_bytes = sum(e["size"] for e in self._index.values())
+                return
+            except Exception as e:
+                print(f"Audio cache [INDEX READ ERROR] {e} - rebuilding")
+                self._index = OrderedDict()
+
+        for path in self.cache_dir.iterdir():
+            if not path.is_file() or path.name.startswith("."):
+                continue
+            key, _, suffix = path.name.partition(".")
+            if not suffix:
+                continue
+            stat = path.stat()
+            entry = self._index.setdefault(
+                key, {"files": {}, "size": 0, "last_access": stat.st_mtime, "hits": 0, "engine": None}
+            )
+            entry["files"][suffix] = stat.st_size
+            entry["size"] += stat.st_size
+            entry["last_access"] = max(entry["last_access"], stat.st_mtime)
+            self._total_bytes += stat.st_size
+
+        self._set_index(self._index)
+        print(f"Audio cache index rebuilt: {len(self._index)} entries, {self._total_bytes / (1024 * 1024):.1f}MB")
+        self._flush_index()
+
+    def _set_index(self, index: Dict[str, Dict[str, Any]]):
+        # One sort at startup puts the index in recency order
+        self._index = OrderedDict(sorted(index.items(), key=lambda kv: kv[1]["last_access"]))
+        if self.policy == "lfu":
+            self._rebuild_lfu_heap()
+
+
+# One cache per directory, shared by every engine that writes there
+_caches: Dict[str, AudioCache] = {}
+
+
+def get_audio_cache(cache_dir: str = "assets/audio_cache", shared: bool = False) -> AudioCache:
+    """Get the shared AudioCache for a directory.
+
+    shared=True (for tools running next to the server) only takes effect if
+    it is the first call for that directory in this process.
+    """
+    resolved = str(Path(cache_dir).resolve())
+    if resolved not in _caches:
+        _caches[resolved] = AudioCache(cache_dir, shared=shared)
+    return _caches[resolved]
@@ -0,0 +1,212 @@
+"""
+Audio Routes - Serves cached TTS audio at /audio/<key>.<ext>.
+
+Cache files are content-addressed (the key is a hash of the text and voice
+settings), so a URL never changes meaning: responses are sent with a
+year-long `immutable` Cache-Control and a strong ETag, and revalidations are
+answered with 304. Single byte ranges are honoured (206) so players can seek
+without refetching the clip.
+
+Bodies are sent with the ASGI `http.response.zerocopysend` extension
+(sendfile) when the server offers it, and read in a worker thread otherwise.
+"""
+
+import asyncio
+import os
+import re
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from fastapi import APIRouter, Request
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+from audio_cache import get_audio_cache
+
+router = APIRouter(prefix="/audio", tags=["audio"])
+
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+CHUNK_SIZE = 64 * 1024
+
+MEDIA_TYPES = {
+    "wav": "audio/wav",
+    "mp3": "audio/mpeg",
+    "ogg": "audio/ogg",
+}
+
+# Only cache keys with a known audio extension - no paths, no sidecars
+_FILENAME_RE = re.compile(r"^[A-Za-z0-9_-]+\.(wav|mp3|ogg)$")
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET, HEAD, OPTIONS",
+    "Access-Control-Allow-Headers": "*",
+    "Access-Control-Expose-Headers": "Content-Length, Content-Range, Accept-Ranges, ETag",
+}
+
+
+class _ServeStats:
+    """Request and byte counters for /audio. Only touched on the event loop."""
+
+    def __init__(self):
+        self.requests = 0
+        self.full = 0
+        self.partial = 0
+        self.not_modified = 0
+        self.not_found = 0
+        self.unsatisfiable = 0
+        self.bytes_served = 0
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "requests": self.requests,
+            "full": self.full,
+            "partial": self.partial,
+            "not_modified": self.not_modified,
+            "not_found": self.not_found,
+            "range_not_satisfiable": self.unsatisfiable,
+            "bytes_served": self.bytes_served,
+            "not_modified_rate": round(self.not_modified / self.requests, 3) if self.requests else 0.0,
+        }
+
+
+_stats = _ServeStats()
+
+
+def get_audio_serving_stats() -> Dict[str, float]:
+    return _stats.to_dict()
+
+
+class _FileRangeResponse(Response):
+    """Sends `length` bytes of a file starting at `offset`."""
+
+    def __init__(self, path: Path, offset: int, length: int, status_code: int, headers: Dict[str, str], media_type: str):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self.headers["content-length"] = str(length)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD" or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        f = await run_in_threadpool(open, self.path, "rb")
+        try:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f.fileno(),
+                    "offset": self.offset,
+                    "count": self.length,
+                })
+                return
+
+            await run_in_threadpool(f.seek, self.offset)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await run_in_threadpool(f.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # File shrank underneath us - close the body anyway
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            await run_in_threadpool(f.close)
+
+
+def _etag(filename: str, stat: os.stat_result) -> str:
+    # The name is already a content hash; size and mtime guard re-synthesized files
+    return f'"{filename.rsplit(".", 1)[0]}-{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match uses weak comparison: W/ prefixes are ignored."""
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single "bytes=start-end" range.
+
+    Returns:
+        (start, end) inclusive, or None to serve the whole file (absent or
+        multi-range headers). Raises ValueError if the range can't be satisfied.
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None  # Multiple ranges or another unit - a full 200 is allowed
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(f"range {start}-{end} outside {size} bytes")
+    return start, end
+
+
+@router.api_route("/{filename}", methods=["GET", "HEAD"])
+async def serve_audio(filename: str, request: Request):
+    """Serve a cached audio file with immutable caching, ETags and byte ranges."""
+    _stats.requests += 1
+    if not _FILENAME_RE.match(filename):
+        _stats.not_found += 1
+        return Response(status_code=404, headers=CORS_HEADERS)
+
+    path = get_audio_cache().cache_dir / filename
+    try:
+        stat = await asyncio.to_thread(os.stat, path)
+    except OSError:
+        _stats.not_found += 1
+        return Response(status_code=404, headers=CORS_HEADERS)
+
+    etag = _etag(filename, stat)
+    headers = {
+        **CORS_HEADERS,
+        "Cache-Control": CACHE_CONTROL,
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        _stats.not_modified += 1
+        return Response(status_code=304, headers=headers)
+
+    size = stat.st_size
+    media_type = MEDIA_TYPES[filename.rsplit(".", 1)[1]]
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == etag):
+        try:
+            byte_range = _parse_range(range_header, size)
+        except ValueError:
+            _stats.unsatisfiable += 1
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            _stats.partial += 1
+            if request.method == "GET":
+                _stats.bytes_served += length
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            return _FileRangeResponse(path, start, length, 206, headers, media_type)
+
+    _stats.full += 1
+    if request.method == "GET":
+        _stats.bytes_served += size
+    return _FileRangeResponse(path, 0, size, 200, headers, media_type)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark batch vs per-call lip sync generation.
+
+Per-call: generate_lip_sync_from_text() once per phrase - one phonemizer call
+per phrase with uncached words. Batch: generate_lip_sync_batch() - every
+uncached word across all phrases in a single phonemizer call. Both are timed
+cold (caches cleared) since that's what cache warming pays.
+
+Usage:
+    python bench_lip_sync.py                          # precache phrases
+    python bench_lip_sync.py --phrases phrases.txt    # one phrase per line
+"""
+import argparse
+import contextlib
+import io
+import time
+from pathlib import Path
+
+import lip_sync
+from lip_sync import clear_lip_sync_caches, generate_lip_sync_batch, generate_lip_sync_from_text
+
+SAMPLE_PHRASES = [
+    "Hi! I'm Mona! I'm so happy to meet you!",
+    "Hello! It's so nice to see you! How's your day going?",
+    "That's interesting! Tell me more about that.",
+    "I see! That makes sense.",
+    "How are you feeling today?",
+    "What would you like to talk about?",
+    "Hehe, you're funny!",
+    "Goodbye! I'll miss you! Come back soon, okay?",
+]
+
+
+def load_phrases(path: str) -> list:
+    if path:
+        return [line.strip() for line in Path(path).read_text().splitlines() if line.strip()]
+    try:
+        from precache_voices import COMMON_PHRASES
+        return list(COMMON_PHRASES)
+    except ImportError:
+        return SAMPLE_PHRASES
+
+
+def estimate_duration(text: str) -> float:
+    # Same estimate the engines fall back to (~14 chars/sec)
+    return max(0.5, len(text) / 14.0 + 0.3)
+
+
+def time_cold(fn, rounds: int) -> float:
+    """Average ms per run, clearing the memo caches before each run."""
+    total = 0.0
+    for _ in range(rounds):
+        clear_lip_sync_caches()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+        total += time.perf_counter() - start
+    return total * 1000 / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batch vs per-call lip sync")
+    parser.add_argument("--phrases", help="File with one phrase per line")
+    parser.add_argument("-n", "--rounds", type=int, default=5, help="Cold runs per method")
+    args = parser.parse_args()
+
+    phrases = load_phrases(args.phrases)
+    durations = [estimate_duration(p) for p in phrases]
+
+    print("=" * 60)
+    print(f"Lip sync benchmark: {len(phrases)} phrases, {args.rounds} cold runs each")
+    print(f"Engine: {'espeak-ng (IPA)' if lip_sync._HAS_PHONEMIZER else 'character fallback (no phonemizer)'}")
+    print("=" * 60)
+
+    def per_call():
+        for text, duration in zip(phrases, durations):
+            generate_lip_sync_from_text(text, duration)
+
+    def batch():
+        generate_lip_sync_batch(phrases, durations)
+
+    per_call_ms = time_cold(per_call, args.rounds)
+    batch_ms = time_cold(batch, args.rounds)
+    print(f"Per-call: {per_call_ms:8.2f} ms total ({per_call_ms / len(phrases):.3f} ms/phrase)")
+    print(f"Batch:    {batch_ms:8.2f} ms total ({batch_ms / len(phrases):.3f} ms/phrase)")
+    if batch_ms > 0:
+        print(f"Speedup:  {per_call_ms / batch_ms:.1f}x")
+
+    # Sanity check: both paths must produce identical cues
+    clear_lip_sync_caches()
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected = [generate_lip_sync_from_text(t, d) for t, d in zip(phrases, durations)]
+        clear_lip_sync_caches()
+        actual = generate_lip_sync_batch(phrases, durations)
+    print(f"Outputs identical: {expected == actual}")
+
+
+if __name__ == "__main__":
+    main()
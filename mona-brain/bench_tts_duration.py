@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark MP3 duration measurement for OpenAI TTS lip sync.
+
+Compares the in-process frame-header parser (what MonaTTS uses now) with the
+old approach of decoding the MP3 through an ffmpeg subprocess and reading
+the WAV duration. Runs over the cached OpenAI/Fish MP3s by default.
+
+Usage:
+    python bench_tts_duration.py                      # all MP3s in assets/audio_cache
+    python bench_tts_duration.py a.mp3 b.mp3 -n 20    # specific files, 20 rounds each
+"""
+import argparse
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from lip_sync import get_mp3_duration_from_bytes, get_wav_duration_from_bytes
+
+
+def ffmpeg_duration(data: bytes) -> float:
+    """Old path: decode MP3 -> WAV with ffmpeg, then read the WAV header."""
+    proc = subprocess.run(
+        ["ffmpeg", "-i", "pipe:0", "-f", "wav", "pipe:1"],
+        input=data,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        timeout=30,
+    )
+    if proc.returncode != 0:
+        return 0.0
+    return get_wav_duration_from_bytes(proc.stdout)
+
+
+def time_method(fn, samples, rounds: int):
+    """Run fn over every sample `rounds` times. Returns (ms per call, durations)."""
+    durations = [fn(data) for data in samples]
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for data in samples:
+            fn(data)
+    elapsed = time.perf_counter() - start
+    return elapsed * 1000 / (rounds * len(samples)), durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MP3 duration measurement")
+    parser.add_argument("files", nargs="*", help="MP3 files (default: cached MP3s)")
+    parser.add_argument("-n", "--rounds", type=int, default=10, help="Rounds per file")
+    parser.add_argument("--limit", type=int, default=50, help="Max cached files to use")
+    args = parser.parse_args()
+
+    paths = [Path(f) for f in args.files] or sorted(Path("assets/audio_cache").glob("*.mp3"))[:args.limit]
+    if not paths:
+        print("No MP3 files found - pass some paths or generate OpenAI/Fish audio first")
+        sys.exit(1)
+    samples = [p.read_bytes() for p in paths]
+    total_mb = sum(len(s) for s in samples) / (1024 * 1024)
+
+    print("=" * 60)
+    print(f"MP3 duration benchmark: {len(samples)} files ({total_mb:.2f} MB), {args.rounds} rounds")
+    print("=" * 60)
+
+    header_ms, header_durations = time_method(get_mp3_duration_from_bytes, samples, args.rounds)
+    print(f"Frame headers (in-process): {header_ms:8.3f} ms/file")
+
+    if not shutil.which("ffmpeg"):
+        print("ffmpeg not installed - skipping subprocess comparison")
+        return
+
+    # The subprocess path is slow, don't let it dominate the run
+    ffmpeg_rounds = max(1, args.rounds // 5)
+    ffmpeg_ms, ffmpeg_durations = time_method(ffmpeg_duration, samples, ffmpeg_rounds)
+    print(f"ffmpeg subprocess decode:   {ffmpeg_ms:8.3f} ms/file ({ffmpeg_rounds} rounds)")
+    print(f"Speedup: {ffmpeg_ms / header_ms:.0f}x")
+
+    # Accuracy: the parser should agree with a full decode to within a frame or two
+    errors = [abs(a - b) for a, b in zip(header_durations, ffmpeg_durations) if b > 0]
+    if errors:
+        print(f"Duration difference vs ffmpeg: max {max(errors) * 1000:.1f}ms, "
+              f"mean {sum(errors) / len(errors) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Circuit Breaker - Per-engine health state for TTS backends.
+
+closed:    requests flow normally while errors are counted in a rolling window.
+open:      too many consecutive failures (or a high error rate) - the engine is
+           skipped instantly instead of making every user pay its failure latency.
+half_open: the cooldown has passed - a single trial request (or a background
+           probe) decides whether the engine closes again or re-opens.
+"""
+
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker with rolling error and timeout counters."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        error_rate_threshold: float = 0.5,
+        min_requests: int = 10,
+        window_seconds: int = 60,
+        cooldown_seconds: int = 30,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.min_requests = min_requests
+        self.window = window_seconds
+        self.cooldown = cooldown_seconds
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._trial_in_flight = False
+
+        # Rolling window of (timestamp, outcome) where outcome is "ok", "error" or "timeout"
+        self._events: Deque[Tuple[float, str]] = deque()
+
+    def allow_request(self) -> bool:
+        """Check whether a request may be sent to the engine right now."""
+        if self.state == self.CLOSED:
+            return True
+
+        if self.state == self.OPEN:
+            if not self.cooldown_elapsed():
+                return False
+            self._transition(self.HALF_OPEN)
+
+        # Half-open: let exactly one trial request through
+        if self._trial_in_flight:
+            return False
+        self._trial_in_flight = True
+        return True
+
+    def cooldown_elapsed(self) -> bool:
+        """True when an open breaker has waited long enough to be probed."""
+        return self.opened_at is not None and time.time() - self.opened_at >= self.cooldown
+
+    def record_success(self):
+        """Record a successful request (or probe)."""
+        self._record("ok")
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+        if self.state != self.CLOSED:
+            self._transition(self.CLOSED)
+
+    def record_failure(self, timeout: bool = False, error: Optional[str] = None):
+        """Record a failed request (or probe), opening the breaker if needed."""
+        self._record("timeout" if timeout else "error")
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if error:
+            self.last_error = error
+
+        if self.state == self.HALF_OPEN:
+            self._transition(self.OPEN)
+        elif self.state == self.CLOSED and self._should_open():
+            self._transition(self.OPEN)
+
+    def release_trial(self):
+        """Free the half-open trial slot when a request was cancelled mid-flight."""
+        self._trial_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current state and rolling counters (for /health)."""
+        now = time.time()
+        self._prune(now)
+        errors = sum(1 for _, outcome in self._events if outcome == "error")
+        timeouts = sum(1 for _, outcome in self._events if outcome == "timeout")
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "window_requests": len(self._events),
+            "window_errors": errors,
+            "window_timeouts": timeouts,
+            "open_for_seconds": round(now - self.opened_at, 1) if self.opened_at and self.state != self.CLOSED else None,
+            "last_error": self.last_error,
+        }
+
+    def _should_open(self) -> bool:
+        if self.consecutive_failures >= self.failure_threshold:
+            return True
+        if len(self._events) < self.min_requests:
+            return False
+        failures = sum(1 for _, outcome in self._events if outcome != "ok")
+        return failures / len(self._events) >= self.error_rate_threshold
+
+    def _record(self, outcome: str):
+        now = time.time()
+        self._events.append((now, outcome))
+        self._prune(now)
+
+    def _prune(self, now: float):
+        while self._events and now - self._events[0][0] > self.window:
+            self._events.popleft()
+
+    def _transition(self, new_state: str):
+        if new_state == self.state:
+            return
+        print(f"TTS [{self.name}] circuit {self.state} -> {new_state}")
+        self.state = new_state
+        if new_state == self.OPEN:
+            self.opened_at = time.time()
+        elif new_state == self.CLOSED:
+            self.opened_at = None
@@ -30,5 +30,9 @@ class ConnectionManager:
         if client_id in self.active_connections:
             await self.active_connections[client_id].send_json(message)
 
+    async def send_bytes(self, data: bytes, client_id: str):
+        if client_id in self.active_connections:
+            await self.active_connections[client_id].send_bytes(data)
+
 
 manager = ConnectionManager()
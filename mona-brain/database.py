@@ -5,7 +5,7 @@ Uses SQLAlchemy with async SQLite support.
 import uuid
 from datetime import datetime
 from typing import Optional, List
-from sqlalchemy import String, Text, Integer, Float, DateTime, ForeignKey, Index, select
+from sqlalchemy import String, Text, Integer, Float, DateTime, ForeignKey, Index, select, inspect, text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from config import DATABASE_URL
@@ -135,6 +135,7 @@ class APIUsage(Base):
     model: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)
     input_tokens: Mapped[int] = mapped_column(Integer, default=0)
     output_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    cached_input_tokens: Mapped[int] = mapped_column(Integer, default=0)  # part of input_tokens from the prompt cache
     characters: Mapped[int] = mapped_column(Integer, default=0)  # for TTS
     estimated_cost_usd: Mapped[float] = mapped_column(Float, default=0.0)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
@@ -145,10 +146,27 @@ engine = create_async_engine(DATABASE_URL, echo=False)
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
+# Columns added after their table first shipped (create_all never alters existing tables)
+ADDED_COLUMNS = {
+    "api_usage": {"cached_input_tokens": "INTEGER NOT NULL DEFAULT 0"},
+}
+
+
+def _add_missing_columns(sync_conn):
+    inspector = inspect(sync_conn)
+    for table, columns in ADDED_COLUMNS.items():
+        existing = {column["name"] for column in inspector.get_columns(table)}
+        for name, ddl in columns.items():
+            if name not in existing:
+                sync_conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+                print(f"Database: added column {table}.{name}")
+
+
 async def init_db():
     """Initialize database tables."""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
     print("Database initialized successfully")
 
 
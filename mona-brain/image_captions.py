@@ -0,0 +1,137 @@
+"""
+Image captions for Mona's conversation history.
+
+A user's image is sent to the chat model only on the turn it arrives. After
+that its history message carries a short text description instead, so later
+requests don't re-upload the base64 data URL (and its vision tokens) until
+the message is trimmed.
+
+Descriptions come from one low-detail gpt-4o-mini call per image, started
+right after the image's request goes out and cached by a hash of the data
+URL, so re-sending the same image never captions it twice. The swap happens
+while the next request is built and never waits: if the caption isn't ready
+the message gets a placeholder, replaced once when the caption lands.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from openai import AsyncOpenAI
+
+from analytics import analytics, calculate_llm_cost, cached_prompt_tokens
+
+CAPTION_MODEL = "gpt-4o-mini"
+CAPTION_CACHE_SIZE = int(os.getenv("IMAGE_CAPTION_CACHE_SIZE", "256"))
+PLACEHOLDER = "image shared earlier, description not available yet"
+
+CAPTION_PROMPT = (
+    "Describe this image in one or two sentences for someone who can't see it. "
+    "Mention the main subject, any readable text, and anything notable. No preamble."
+)
+
+
+def image_hash(data_url: str) -> str:
+    return hashlib.sha256(data_url.encode()).hexdigest()
+
+
+class ImageCaptioner:
+    """Caption cache (LRU by image hash) with one in-flight request per image."""
+
+    def __init__(self, max_entries: int = CAPTION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._captions: OrderedDict[str, str] = OrderedDict()
+        self._pending: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    def cached(self, data_url: str) -> Optional[str]:
+        key = image_hash(data_url)
+        caption = self._captions.get(key)
+        if caption is not None:
+            self.hits += 1
+            self._captions.move_to_end(key)
+        return caption
+
+    def start(self, client: AsyncOpenAI, user_id: str, data_url: str):
+        """Caption an image in the background unless it is cached or already in flight."""
+        key = image_hash(data_url)
+        if key in self._captions or key in self._pending:
+            return
+        self.misses += 1
+        # _pending holds the only strong reference until the task is done
+        task = asyncio.create_task(self._caption(client, user_id, data_url))
+        self._pending[key] = task
+        task.add_done_callback(lambda done, key=key: self._store(key, done))
+
+    def pending(self, data_url: str) -> Optional[asyncio.Task]:
+        """The in-flight caption task for an image (its result is the caption or None)."""
+        return self._pending.get(image_hash(data_url))
+
+    def _store(self, key: str, task: asyncio.Task):
+        self._pending.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            if not task.cancelled():
+                self.failures += 1
+                print(f"⚠ Image caption failed: {task.exception()}")
+            return
+        caption = task.result()
+        if caption:
+            self._captions[key] = caption
+            self._captions.move_to_end(key)
+            while len(self._captions) > self.max_entries:
+                self._captions.popitem(last=False)
+
+    async def _caption(self, client: AsyncOpenAI, user_id: str, data_url: str) -> Optional[str]:
+        try:
+            response = await client.chat.completions.create(
+                model=CAPTION_MODEL,
+                messages=[{
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": CAPTION_PROMPT},
+                        # Low detail is a flat 85 tokens - plenty for a history note
+                        {"type": "image_url", "image_url": {"url": data_url, "detail": "low"}},
+                    ],
+                }],
+                temperature=0.2,
+                max_tokens=80,
+            )
+        except Exception as e:
+            self.failures += 1
+            print(f"⚠ Image caption failed: {e}")
+            return None
+
+        caption = (response.choices[0].message.content or "").strip()
+        usage = response.usage
+        if usage:
+            cached_tokens = cached_prompt_tokens(usage)
+            try:
+                await analytics.track_api_cost(
+                    service="openai_caption",
+                    model=CAPTION_MODEL,
+                    user_id=user_id,
+                    input_tokens=usage.prompt_tokens,
+                    output_tokens=usage.completion_tokens,
+                    cached_input_tokens=cached_tokens,
+                    estimated_cost=calculate_llm_cost(
+                        usage.prompt_tokens, usage.completion_tokens, CAPTION_MODEL, cached_input_tokens=cached_tokens
+                    ),
+                )
+            except Exception as e:
+                print(f"⚠ Failed to track caption cost: {e}")
+        return caption or None
+
+    def get_stats(self) -> dict:
+        return {
+            "cached": len(self._captions),
+            "pending": len(self._pending),
+            "hits": self.hits,
+            "misses": self.misses,
+            "failures": self.failures,
+        }
@@ -2,11 +2,40 @@
 Lip sync generation using IPA phoneme analysis (via espeak-ng/phonemizer).
 Falls back to character-based estimation when phonemizer is not available.
 Generates mouth shape timing data for realistic VRM lip sync animation.
+
+Phrases repeat heavily in chat, so shape sequences are memoized per text
+(LRU) - only the final timing scale depends on the audio duration. Texts are
+always phonemized whole, never word by word: espeak's stress and its
+readings of words like "read" or "the" depend on the surrounding sentence.
+
+The "aligned" mode (WAV only, needs NumPy) times the same shapes against the
+audio itself: an RMS energy envelope finds the silences, and word groups are
+snapped to the voiced regions instead of spread evenly over the clip.
+
+Async callers use the *_async variants, which run on a small dedicated
+thread pool (LIP_SYNC_WORKERS). Each worker owns its own EspeakBackend, since
+one backend can't be shared across threads; synchronous callers (scripts)
+share the module-level backend under a lock.
+
+Cues can be sent (and are stored in cache sidecars) in a compact form:
+parallel start-time / shape-index arrays plus the final end time, with the
+shape -> blend weight table sent to the client once per session instead of
+repeated in every cue.
 """
 
+import asyncio
+import base64
+import functools
+import os
+import struct
+import sys
+import threading
 import time
 import wave
-from typing import Optional, List, Dict, Any
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
 
 # Try to import phonemizer for IPA-based lip sync
 # Pre-initialize the EspeakBackend to avoid ~1800ms subprocess startup per call
@@ -23,6 +52,88 @@ try:
 except (ImportError, RuntimeError) as e:
     print(f"Lip Sync: espeak-ng not available ({e}) — using character-based fallback")
 
+# NumPy is only needed for audio-aligned lip sync
+_HAS_NUMPY = False
+try:
+    import numpy as np
+    _HAS_NUMPY = True
+except ImportError:
+    print("Lip Sync: numpy not available — aligned mode falls back to text timing")
+
+# Lip sync modes that produce server-side cues
+LIP_SYNC_MODES = ("textbased", "aligned")
+
+# Energy envelope settings for aligned mode
+ENVELOPE_HOP_SECONDS = 0.010        # One RMS value per 10ms
+MIN_SILENCE_SECONDS = 0.08          # Shorter dips are treated as part of speech
+MIN_VOICED_SECONDS = 0.05           # Shorter bursts (clicks, breaths) are ignored
+SILENCE_PEAK_RATIO = 0.05           # Silence threshold relative to the loudest frame
+SILENCE_FLOOR_RATIO = 2.0           # ...or relative to the quietest 10% of frames
+
+
+# Lip sync worker threads (each holds its own EspeakBackend)
+LIP_SYNC_WORKERS = int(os.getenv("LIP_SYNC_WORKERS", "2"))
+
+# Bounded memo cache (entries)
+LIP_SYNC_CACHE_SIZE = int(os.getenv("LIP_SYNC_CACHE_SIZE", "2048"))
+
+
+class _LRUCache:
+    """Small thread-safe OrderedDict LRU with hit/miss counters."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key: str) -> bool:
+        """Membership check that doesn't count as a lookup."""
+        with self._lock:
+            return key in self._data
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+# Executor workers keep their own backend here; everyone else uses
+# _espeak_backend under _shared_backend_lock
+_worker_state = threading.local()
+_shared_backend_lock = threading.Lock()
+
+
+# text -> (merged (shape, weight) tuples, engine name)
+_shape_cache = _LRUCache(LIP_SYNC_CACHE_SIZE)
+
 
 # ============================================================
 # Mouth shapes → VRM blend shape weights
@@ -196,15 +307,22 @@ def _ipa_to_shapes(ipa_string: str) -> List[tuple]:
 
 
 def _phonemize_text(text: str) -> str:
-    """Run phonemizer on text to get IPA phonemes using pre-initialized backend."""
+    """Run phonemizer on text to get IPA phonemes using the pre-initialized backend."""
+    results = _phonemize_texts([text])
+    return results[0] if results else ""
+
+
+def _phonemize_texts(texts: List[str]) -> Optional[List[str]]:
+    """Phonemize several whole texts in one backend call. None on error."""
+    backend = getattr(_worker_state, "backend", None)
     try:
-        results = _espeak_backend.phonemize(
-            [text], _espeak_separator, True
-        )
-        return results[0] if results else ""
+        if backend is not None:
+            return backend.phonemize(texts, _espeak_separator, True)
+        with _shared_backend_lock:
+            return _espeak_backend.phonemize(texts, _espeak_separator, True)
     except Exception as e:
         print(f"Lip Sync [phonemize error]: {e}")
-        return ""
+        return None
 
 
 # ============================================================
@@ -290,31 +408,169 @@ def get_wav_duration(wav_path: str) -> float:
     return 0.0
 
 
-def generate_lip_sync_from_text(
-    text: str,
-    audio_duration: float,
-) -> Optional[List[Dict[str, Any]]]:
+def _parse_wav_header(data: bytes) -> Optional[tuple]:
+    """Find (sample_rate, block_align, data_offset, data_size) in WAV bytes.
+
+    Streaming responses write the header before the length is known, so a
+    data size of 0 / 0xFFFFFFFF (or past the end) means "until end of bytes".
     """
-    Generate lip sync data from text.
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None
+    offset = 12
+    sample_rate = block_align = 0
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        chunk_size = struct.unpack("<I", data[offset + 4:offset + 8])[0]
+        body = offset + 8
+        if chunk_id == b"fmt " and body + 16 <= len(data):
+            _fmt, _channels, sample_rate, _byte_rate, block_align = struct.unpack("<HHIIH", data[body:body + 14])
+        elif chunk_id == b"data":
+            remaining = len(data) - body
+            if chunk_size in (0, 0xFFFFFFFF) or chunk_size > remaining:
+                chunk_size = remaining
+            return sample_rate, block_align, body, chunk_size
+        offset = body + chunk_size + (chunk_size & 1)
+    return None
+
+
+def get_wav_duration_from_bytes(data: bytes) -> float:
+    """Get duration of in-memory WAV bytes (tolerates streaming headers). Returns seconds."""
+    header = _parse_wav_header(data)
+    if not header:
+        return 0.0
+    sample_rate, block_align, _offset, data_size = header
+    if sample_rate <= 0 or block_align <= 0:
+        return 0.0
+    return (data_size // block_align) / float(sample_rate)
+
+
+def fix_streamed_wav_header(data: bytes) -> bytes:
+    """Rewrite the RIFF and data sizes of a streamed WAV so file readers see its real length."""
+    header = _parse_wav_header(data)
+    if not header:
+        return data
+    _rate, _align, data_offset, data_size = header
+    fixed = bytearray(data[:data_offset + data_size])
+    struct.pack_into("<I", fixed, 4, len(fixed) - 8)
+    struct.pack_into("<I", fixed, data_offset - 4, data_size)
+    return bytes(fixed)
+
+
+# MPEG audio frame header tables, indexed by [version][layer] / [version]
+# version: 3 = MPEG1, 2 = MPEG2, 0 = MPEG2.5; layer: 3 = I, 2 = II, 1 = III
+_MP3_BITRATES = {
+    (3, 3): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (3, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (3, 1): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 3): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 1): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
 
-    Uses IPA phoneme analysis via espeak-ng when available,
-    falls back to character-based estimation otherwise.
 
-    Args:
-        text: The spoken text
-        audio_duration: Duration of the audio in seconds
+def _parse_mp3_frame_header(data: bytes, offset: int) -> Optional[tuple]:
+    """Parse the 4-byte frame header at offset into (frame_length, samples, sample_rate, version, mono)."""
+    if offset + 4 > len(data) or data[offset] != 0xFF or (data[offset + 1] & 0xE0) != 0xE0:
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    version = (b1 >> 3) & 0x03
+    layer = (b1 >> 1) & 0x03
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 0x03
+    if version == 1 or layer == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        return None  # Reserved values (and free-format bitrate, which has no fixed length)
+
+    bitrate = _MP3_BITRATES[(3 if version == 3 else 2, layer)][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 0x01
+
+    if layer == 3:
+        samples = 384
+        frame_length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if layer == 2 or version == 3 else 576
+        frame_length = (samples // 8) * bitrate // sample_rate + padding
+    return frame_length, samples, sample_rate, version, (b3 >> 6) == 3
+
+
+def get_mp3_duration_from_bytes(data: bytes) -> float:
+    """
+    Get duration of in-memory MP3 bytes by reading frame headers. Returns seconds.
+
+    Uses the Xing/Info or VBRI frame count when the encoder wrote one,
+    otherwise walks every frame header and sums its samples - no decoding.
+    """
+    offset = 0
+    # Skip an ID3v2 tag (size is a 28-bit syncsafe integer)
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        offset = 10 + size + (10 if data[5] & 0x10 else 0)
+
+    # Find the first valid frame
+    header = None
+    while offset + 4 <= len(data):
+        header = _parse_mp3_frame_header(data, offset)
+        if header:
+            break
+        offset += 1
+    if not header:
+        return 0.0
+
+    frame_length, samples, sample_rate, version, mono = header
+
+    # VBR header in the first frame: Xing/Info after the side info, VBRI at a fixed offset
+    side_info = (17 if mono else 32) if version == 3 else (9 if mono else 17)
+    xing = offset + 4 + side_info
+    if data[xing:xing + 4] in (b"Xing", b"Info") and xing + 12 <= len(data):
+        flags = struct.unpack(">I", data[xing + 4:xing + 8])[0]
+        if flags & 0x01:
+            frames = struct.unpack(">I", data[xing + 8:xing + 12])[0]
+            return frames * samples / float(sample_rate)
+    vbri = offset + 4 + 32
+    if data[vbri:vbri + 4] == b"VBRI" and vbri + 18 <= len(data):
+        frames = struct.unpack(">I", data[vbri + 14:vbri + 18])[0]
+        return frames * samples / float(sample_rate)
+
+    # CBR (or VBR without a header): sum samples frame by frame
+    total_samples = 0
+    while header:
+        frame_length, samples, sample_rate, _version, _mono = header
+        if frame_length <= 0:
+            break
+        total_samples += samples
+        offset += frame_length
+        header = _parse_mp3_frame_header(data, offset)
+    return total_samples / float(sample_rate)
+
+
+def get_mp3_duration(path: str) -> float:
+    """Get duration of an MP3 file from its frame headers. Returns seconds."""
+    try:
+        with open(path, "rb") as f:
+            return get_mp3_duration_from_bytes(f.read())
+    except Exception as e:
+        print(f"Lip Sync [MP3 Duration ERROR] {e}")
+        return 0.0
+
+
+def _text_to_merged_shapes(text: str) -> Tuple[Tuple[Tuple[str, float], ...], str]:
+    """
+    Get the merged (shape, weight) sequence for text, memoized per text.
 
     Returns:
-        List of mouth cues with timing and VRM blend shape values.
+        (merged shapes, engine name) - shapes are empty if nothing is pronounceable.
     """
-    if not text or audio_duration <= 0:
-        return None
+    cached = _shape_cache.get(text)
+    if cached is not None:
+        return cached
+    return _merge_and_cache_shapes(text, _phonemize_text(text) if _HAS_PHONEMIZER else None)
 
-    gen_start = time.perf_counter()
 
+def _merge_and_cache_shapes(text: str, ipa: Optional[str]) -> Tuple[Tuple[Tuple[str, float], ...], str]:
+    """Build and memoize the merged shapes for text from its IPA (None without phonemizer)."""
     # Choose engine: IPA-based or character-based fallback
     if _HAS_PHONEMIZER:
-        ipa = _phonemize_text(text)
         if ipa:
             shapes = _ipa_to_shapes(ipa)
             engine_name = "IPA"
@@ -325,9 +581,6 @@ def generate_lip_sync_from_text(
         shapes = _text_to_phonemes_fallback(text)
         engine_name = "Text-Based"
 
-    if not shapes:
-        return None
-
     # Merge consecutive identical shapes
     merged = []
     for shape, weight in shapes:
@@ -336,6 +589,296 @@ def generate_lip_sync_from_text(
         else:
             merged.append((shape, weight))
 
+    result = (tuple(merged), engine_name)
+    _shape_cache.put(text, result)
+    return result
+
+
+def _wav_to_mono(audio_bytes: bytes) -> Optional[tuple]:
+    """Decode 16-bit PCM WAV bytes to a float32 mono array. Returns (samples, sample_rate)."""
+    header = _parse_wav_header(audio_bytes)
+    if not header:
+        return None
+    sample_rate, block_align, data_offset, data_size = header
+    if sample_rate <= 0 or block_align <= 0 or block_align % 2:
+        return None
+    channels = block_align // 2
+    frames = data_size // block_align
+    pcm = np.frombuffer(audio_bytes, dtype="<i2", count=frames * channels, offset=data_offset)
+    samples = pcm.reshape(frames, channels).mean(axis=1, dtype=np.float32) if channels > 1 else pcm.astype(np.float32)
+    return samples, sample_rate
+
+
+def _voiced_regions(samples: "np.ndarray", sample_rate: int) -> List[Tuple[float, float]]:
+    """Find voiced (start, end) regions in seconds from a vectorized RMS envelope."""
+    hop = max(1, int(sample_rate * ENVELOPE_HOP_SECONDS))
+    count = len(samples) // hop
+    if count == 0:
+        return []
+    frames = samples[:count * hop].reshape(count, hop)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+
+    peak = float(rms.max())
+    if peak <= 0:
+        return []
+    threshold = max(peak * SILENCE_PEAK_RATIO, float(np.percentile(rms, 10)) * SILENCE_FLOOR_RATIO)
+    voiced = rms > threshold
+
+    # Run boundaries: indices where voiced flips
+    padded = np.concatenate(([False], voiced, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    starts, ends = edges[0::2], edges[1::2]
+
+    # Close short silences, then drop short voiced bursts
+    min_gap = int(MIN_SILENCE_SECONDS / ENVELOPE_HOP_SECONDS)
+    min_run = int(MIN_VOICED_SECONDS / ENVELOPE_HOP_SECONDS)
+    regions: List[List[int]] = []
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        if regions and start - regions[-1][1] < min_gap:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+    return [
+        (start * ENVELOPE_HOP_SECONDS, end * ENVELOPE_HOP_SECONDS)
+        for start, end in regions
+        if end - start >= min_run
+    ]
+
+
+def _align_shapes_to_regions(
+    merged: Tuple[Tuple[str, float], ...],
+    regions: List[Tuple[float, float]],
+    audio_duration: float,
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Snap word groups to voiced regions.
+
+    Groups (shapes between text silences) are laid out on a virtual timeline
+    of voiced time only; each group goes to the region holding its midpoint,
+    and each region's groups are then spread over that region by weight.
+    Everything outside a region is silence.
+    """
+    groups: List[List[Tuple[str, float]]] = [[]]
+    for shape, weight in merged:
+        if shape == "X":
+            if groups[-1]:
+                groups.append([])
+        else:
+            groups[-1].append((shape, weight))
+    groups = [g for g in groups if g]
+    if not groups:
+        return None
+
+    region_lengths = [end - start for start, end in regions]
+    total_voiced = sum(region_lengths)
+    group_weights = [sum(w for _, w in g) for g in groups]
+    total_weight = sum(group_weights)
+
+    # Virtual-time boundaries of each region, then assign groups by midpoint
+    region_bounds = np.cumsum(region_lengths) / total_voiced
+    assigned: List[List[int]] = [[] for _ in regions]
+    position = 0.0
+    for index, weight in enumerate(group_weights):
+        midpoint = (position + weight / 2) / total_weight
+        region = min(int(np.searchsorted(region_bounds, midpoint)), len(regions) - 1)
+        assigned[region].append(index)
+        position += weight
+
+    cues: List[Tuple[float, float, str]] = []
+    cursor = 0.0
+    for (start, end), group_indices in zip(regions, assigned):
+        if not group_indices:
+            continue  # Voiced but no words left for it (breath, laugh)
+        if start > cursor:
+            cues.append((cursor, start, "X"))
+        shapes = [sw for i in group_indices for sw in groups[i]]
+        time_per_weight = (end - start) / sum(w for _, w in shapes)
+        current = start
+        for shape, weight in shapes:
+            cues.append((current, current + weight * time_per_weight, shape))
+            current += weight * time_per_weight
+        cursor = end
+    if cursor < audio_duration:
+        cues.append((cursor, audio_duration, "X"))
+
+    lip_sync_data: List[Dict[str, Any]] = []
+    for cue_start, cue_end, shape in cues:
+        if lip_sync_data and lip_sync_data[-1]["shape"] == shape:
+            lip_sync_data[-1]["end"] = round(cue_end, 3)
+            continue
+        lip_sync_data.append({
+            "start": round(cue_start, 3),
+            "end": round(cue_end, 3),
+            "shape": shape,
+            "phonemes": SHAPE_TO_VRM.get(shape, SHAPE_TO_VRM["X"]),
+        })
+    return lip_sync_data
+
+
+def generate_lip_sync_aligned(text: str, audio_bytes: bytes) -> Optional[List[Dict[str, Any]]]:
+    """
+    Generate lip sync cues aligned to the speech energy of a WAV clip.
+
+    Falls back to even text timing when NumPy is missing, the audio isn't
+    16-bit PCM WAV, or no voiced regions are found.
+    """
+    if not text:
+        return None
+
+    gen_start = time.perf_counter()
+    audio_duration = get_wav_duration_from_bytes(audio_bytes)
+    if audio_duration <= 0:
+        return None
+
+    decoded = _wav_to_mono(audio_bytes) if _HAS_NUMPY else None
+    regions = _voiced_regions(*decoded) if decoded else []
+    if not regions:
+        return generate_lip_sync_from_text(text, audio_duration)
+
+    merged, engine_name = _text_to_merged_shapes(text)
+    lip_sync_data = _align_shapes_to_regions(merged, regions, audio_duration)
+    if not lip_sync_data:
+        return None
+
+    gen_ms = (time.perf_counter() - gen_start) * 1000
+    print(f"Lip Sync [{engine_name} Aligned] {gen_ms:.1f}ms ({len(lip_sync_data)} cues, "
+          f"{len(regions)} voiced regions, {audio_duration:.1f}s audio)")
+    return lip_sync_data
+
+
+def generate_lip_sync_for_audio(
+    text: str,
+    audio_bytes: bytes,
+    audio_format: str,
+    mode: str = "textbased",
+    estimate_if_unknown: bool = False,
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Generate lip sync for synthesized audio held in memory.
+
+    Args:
+        text: The spoken text
+        audio_bytes: The encoded audio ("wav" or "mp3")
+        audio_format: "wav" or "mp3"
+        mode: "textbased" (even timing) or "aligned" (snapped to speech energy, WAV only)
+        estimate_if_unknown: Estimate the duration from text length if the audio can't be read
+
+    Returns:
+        List of mouth cues, or None.
+    """
+    if mode == "aligned" and audio_format == "wav":
+        return generate_lip_sync_aligned(text, audio_bytes)
+
+    if audio_format == "mp3":
+        audio_duration = get_mp3_duration_from_bytes(audio_bytes)
+    else:
+        audio_duration = get_wav_duration_from_bytes(audio_bytes)
+    if audio_duration <= 0 and estimate_if_unknown:
+        # Estimate from text length (~14 chars/sec)
+        char_count = len(" ".join(text.split()))
+        audio_duration = max(0.5, char_count / 14.0 + 0.3)
+    return generate_lip_sync_from_text(text, audio_duration)
+
+
+def get_lip_sync_cache_stats() -> Dict[str, Any]:
+    """Hit/miss stats for the shape cache (for /health)."""
+    return {
+        "shapes": _shape_cache.stats(),
+    }
+
+
+def clear_lip_sync_caches():
+    """Drop all memoized shapes (e.g. after changing the mappings)."""
+    _shape_cache.clear()
+
+
+def generate_lip_sync_from_text(
+    text: str,
+    audio_duration: float,
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Generate lip sync data from text.
+
+    Uses IPA phoneme analysis via espeak-ng when available,
+    falls back to character-based estimation otherwise.
+
+    Args:
+        text: The spoken text
+        audio_duration: Duration of the audio in seconds
+
+    Returns:
+        List of mouth cues with timing and VRM blend shape values.
+    """
+    if not text or audio_duration <= 0:
+        return None
+
+    gen_start = time.perf_counter()
+
+    merged, engine_name = _text_to_merged_shapes(text)
+    lip_sync_data = _shapes_to_cues(merged, audio_duration)
+    if not lip_sync_data:
+        return None
+
+    gen_ms = (time.perf_counter() - gen_start) * 1000
+    print(f"Lip Sync [{engine_name}] {gen_ms:.1f}ms ({len(lip_sync_data)} cues, {audio_duration:.1f}s audio)")
+    return lip_sync_data
+
+
+def generate_lip_sync_batch(
+    texts: List[str],
+    durations: List[float],
+) -> List[Optional[List[Dict[str, Any]]]]:
+    """
+    Generate lip sync data for many texts at once.
+
+    Every text not yet in the shape cache is phonemized (whole) in a single
+    backend call, instead of one call per text. Useful for cache warming and
+    for several sentences of one reply.
+
+    Args:
+        texts: The spoken texts
+        durations: Audio duration in seconds for each text
+
+    Returns:
+        One cue list (or None) per text, in input order.
+    """
+    if len(texts) != len(durations):
+        raise ValueError("texts and durations must have the same length")
+
+    gen_start = time.perf_counter()
+
+    missing: List[str] = []
+    if _HAS_PHONEMIZER:
+        missing = list(dict.fromkeys(
+            text for text, audio_duration in zip(texts, durations)
+            if text and audio_duration > 0 and text not in _shape_cache
+        ))
+        if missing:
+            # On a backend error each text is retried on its own below
+            for text, ipa in zip(missing, _phonemize_texts(missing) or []):
+                _merge_and_cache_shapes(text, ipa)
+
+    results: List[Optional[List[Dict[str, Any]]]] = []
+    for text, audio_duration in zip(texts, durations):
+        if not text or audio_duration <= 0:
+            results.append(None)
+            continue
+        merged, _engine_name = _text_to_merged_shapes(text)
+        results.append(_shapes_to_cues(merged, audio_duration))
+
+    gen_ms = (time.perf_counter() - gen_start) * 1000
+    print(f"Lip Sync [Batch] {gen_ms:.1f}ms ({len(texts)} texts, {len(missing)} phonemized)")
+    return results
+
+
+def _shapes_to_cues(
+    merged: Tuple[Tuple[str, float], ...],
+    audio_duration: float,
+) -> Optional[List[Dict[str, Any]]]:
+    """Scale a merged shape sequence to the audio duration."""
+    if not merged:
+        return None
+
     # Calculate total weight for timing distribution
     total_weight = sum(weight for _, weight in merged)
     if total_weight == 0:
@@ -359,6 +902,257 @@ def generate_lip_sync_from_text(
 
         current_time = end_time
 
-    gen_ms = (time.perf_counter() - gen_start) * 1000
-    print(f"Lip Sync [{engine_name}] {gen_ms:.1f}ms ({len(lip_sync_data)} cues, {audio_duration:.1f}s audio)")
     return lip_sync_data
+
+
+# ============================================================
+# Compact encoding
+# {"t": [start, ...], "s": [shape index, ...], "end": last end}
+# Cues are contiguous, so each cue ends where the next one starts.
+# ============================================================
+SHAPE_ORDER = "ABCDEFGHX"
+VRM_CHANNELS = ("aa", "ee", "ih", "oh", "ou")
+MAX_CURVE_FPS = 60
+_SHAPE_INDEX = {shape: index for index, shape in enumerate(SHAPE_ORDER)}
+
+
+def get_lip_sync_table() -> Dict[str, Any]:
+    """Shape order and blend weights the client needs to expand compact cues."""
+    return {
+        "shapes": list(SHAPE_ORDER),
+        "channels": list(VRM_CHANNELS),
+        "weights": [[SHAPE_TO_VRM[shape][channel] for channel in VRM_CHANNELS] for shape in SHAPE_ORDER],
+        "silence": _SHAPE_INDEX["X"],
+    }
+
+
+def _viseme_curve(lip_sync_data: List[Dict[str, Any]], fps: int) -> str:
+    """Sample cue blend weights at a fixed frame rate. Returns base64 little-endian float32, frames x channels."""
+    end = lip_sync_data[-1]["end"]
+    frame_count = int(end * fps) + 1
+    weights = {shape: [SHAPE_TO_VRM[shape][channel] for channel in VRM_CHANNELS] for shape in SHAPE_ORDER}
+    values = array("f")
+    cue_index = 0
+    for frame in range(frame_count):
+        frame_time = frame / fps
+        while cue_index < len(lip_sync_data) - 1 and lip_sync_data[cue_index]["end"] <= frame_time:
+            cue_index += 1
+        values.extend(weights.get(lip_sync_data[cue_index]["shape"], weights["X"]))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return base64.b64encode(values.tobytes()).decode("ascii")
+
+
+def encode_lip_sync_compact(lip_sync_data: List[Dict[str, Any]], curve_fps: int = 0) -> Dict[str, Any]:
+    """
+    Encode cues as parallel arrays.
+
+    Args:
+        lip_sync_data: Cues from generate_lip_sync_from_text() or generate_lip_sync_aligned()
+        curve_fps: If > 0, also include a fixed-rate float32 viseme curve ("curve", "fps")
+    """
+    compact: Dict[str, Any] = {
+        "t": [cue["start"] for cue in lip_sync_data],
+        "s": [_SHAPE_INDEX.get(cue["shape"], _SHAPE_INDEX["X"]) for cue in lip_sync_data],
+        "end": lip_sync_data[-1]["end"] if lip_sync_data else 0.0,
+    }
+    if curve_fps > 0 and lip_sync_data:
+        fps = min(int(curve_fps), MAX_CURVE_FPS)
+        compact["fps"] = fps
+        compact["curve"] = _viseme_curve(lip_sync_data, fps)
+    return compact
+
+
+def decode_lip_sync_compact(compact: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Expand compact cues back to the full cue dicts."""
+    starts = compact.get("t", [])
+    indices = compact.get("s", [])
+    ends = list(starts[1:]) + [compact.get("end", starts[-1] if starts else 0.0)]
+    lip_sync_data = []
+    for start, end, index in zip(starts, ends, indices):
+        shape = SHAPE_ORDER[index] if 0 <= index < len(SHAPE_ORDER) else "X"
+        lip_sync_data.append({
+            "start": start,
+            "end": end,
+            "shape": shape,
+            "phonemes": SHAPE_TO_VRM[shape],
+        })
+    return lip_sync_data
+
+
+def format_lip_sync(
+    lip_sync_data: Optional[List[Dict[str, Any]]],
+    lip_sync_format: str = "full",
+    curve_fps: int = 0,
+) -> Any:
+    """Cues in the wire format a client asked for ("full" or "compact")."""
+    if not lip_sync_data or lip_sync_format != "compact":
+        return lip_sync_data
+    return encode_lip_sync_compact(lip_sync_data, curve_fps)
+
+
+# ============================================================
+# Async API - lip sync on a dedicated executor
+# ============================================================
+
+def _init_lip_sync_worker():
+    """Executor thread initializer: give the worker its own EspeakBackend."""
+    if not _HAS_PHONEMIZER:
+        return
+    try:
+        _worker_state.backend = EspeakBackend("en-us")
+    except RuntimeError as e:
+        print(f"Lip Sync [worker] espeak init failed ({e}) — using shared backend")
+
+
+class _ExecutorStats:
+    """Queue depth and latency for the lip sync executor. Only touched on the event loop."""
+
+    def __init__(self, workers: int, window: int = 500):
+        self.workers = workers
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0  # Caller went away before the job started, so it never ran
+        self.max_queue_depth = 0
+        self._wait_ms: Deque[float] = deque(maxlen=window)
+        self._run_ms: Deque[float] = deque(maxlen=window)
+
+    @property
+    def in_flight(self) -> int:
+        return self.submitted - self.completed - self.failed - self.cancelled
+
+    @property
+    def queue_depth(self) -> int:
+        """Calls waiting for a free worker (in flight beyond the pool size)."""
+        return max(0, self.in_flight - self.workers)
+
+    def record_submit(self):
+        self.submitted += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+    def record_cancelled(self):
+        self.cancelled += 1
+
+    def record_failed(self):
+        self.failed += 1
+
+    def record_done(self, wait_ms: float, run_ms: float):
+        self.completed += 1
+        self._wait_ms.append(wait_ms)
+        self._run_ms.append(run_ms)
+
+    @staticmethod
+    def _summary(samples: Deque[float]) -> Dict[str, float]:
+        if not samples:
+            return {"avg": 0.0, "p95": 0.0, "max": 0.0}
+        ordered = sorted(samples)
+        return {
+            "avg": round(sum(ordered) / len(ordered), 2),
+            "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+            "max": round(ordered[-1], 2),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "queue_wait_ms": self._summary(self._wait_ms),
+            "run_ms": self._summary(self._run_ms),
+        }
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_stats = _ExecutorStats(LIP_SYNC_WORKERS)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=LIP_SYNC_WORKERS,
+            thread_name_prefix="lip-sync",
+            initializer=_init_lip_sync_worker,
+        )
+    return _executor
+
+
+def start_lip_sync_executor():
+    """Spin up every worker now so backend init (~seconds each) isn't paid on a request."""
+    executor = _get_executor()
+    barrier = threading.Barrier(LIP_SYNC_WORKERS)
+    # Each job holds its thread until all have started, forcing one thread per job
+    for _ in range(LIP_SYNC_WORKERS):
+        executor.submit(barrier.wait, 30)
+    print(f"Lip Sync: executor started ({LIP_SYNC_WORKERS} workers)")
+
+
+def shutdown_lip_sync_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def _run_on_executor(fn: Callable[..., Any], *args: Any) -> Any:
+    """Run a lip sync function on the executor, recording queue wait and run time."""
+    submitted = time.perf_counter()
+
+    def job():
+        started = time.perf_counter()
+        result = fn(*args)
+        return result, started, time.perf_counter()
+
+    loop = asyncio.get_running_loop()
+
+    def record(future: Future):
+        # Counted when the job ends, not when the caller stops waiting: a
+        # cancelled caller's job keeps its worker busy until it returns
+        if future.cancelled():
+            done = _executor_stats.record_cancelled
+        elif future.exception() is not None:
+            done = _executor_stats.record_failed
+        else:
+            _result, started, finished = future.result()
+            done = functools.partial(
+                _executor_stats.record_done, (started - submitted) * 1000, (finished - started) * 1000
+            )
+        try:
+            loop.call_soon_threadsafe(done)
+        except RuntimeError:
+            pass  # Loop already closed (shutdown)
+
+    _executor_stats.record_submit()
+    future = _get_executor().submit(job)
+    future.add_done_callback(record)
+    result, _started, _finished = await asyncio.wrap_future(future)
+    return result
+
+
+async def generate_lip_sync_async(text: str, audio_duration: float) -> Optional[List[Dict[str, Any]]]:
+    """Non-blocking generate_lip_sync_from_text()."""
+    return await _run_on_executor(generate_lip_sync_from_text, text, audio_duration)
+
+
+async def generate_lip_sync_for_audio_async(
+    text: str,
+    audio_bytes: bytes,
+    audio_format: str,
+    mode: str = "textbased",
+    estimate_if_unknown: bool = False,
+) -> Optional[List[Dict[str, Any]]]:
+    """Non-blocking generate_lip_sync_for_audio()."""
+    return await _run_on_executor(
+        generate_lip_sync_for_audio, text, audio_bytes, audio_format, mode, estimate_if_unknown
+    )
+
+
+def get_lip_sync_executor_stats() -> Dict[str, Any]:
+    """Queue depth and per-call latency (queue wait and run time) of the lip sync executor."""
+    return _executor_stats.to_dict()
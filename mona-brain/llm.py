@@ -4,21 +4,83 @@ from __future__ import annotations
 LLM Integration for Mona
 
 Handles OpenAI GPT API calls and conversation management.
+
+Prompt layout is prefix-cache friendly: the conversation starts with the
+personality's static prompt (byte-identical every turn), followed by the
+history, and the volatile per-turn context (name, affection, emotion,
+memories) is sent as a second system message right before the new user
+message. Everything up to the previous turn is then an exact prefix match
+for the provider's automatic prompt caching.
+
+History is windowed by tokens (LLM_CONTEXT_TOKEN_BUDGET across persona,
+context block and history; max_history stays as a message cap). Messages
+cache their token count and API form, and trimming drops a batch of old
+turns down to LLM_CONTEXT_TRIM_RATIO of the budget so the cached prefix
+survives several turns instead of shifting on every one.
+
+Images are attached only on the turn they are sent. While the next request
+is built, the history message swaps the data URL for its caption, or a
+placeholder patched when the caption lands (see image_captions.py). Each request's serialized size is logged and
+tracked for /health.
 """
 
 import asyncio
+import json
 import os
 from datetime import datetime
 from typing import List, Dict, Optional, AsyncGenerator
 from openai import AsyncOpenAI
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 
 from personality import MonaPersonality, default_mona
 from emotion import EmotionEngine, GestureType
 from memory import MemoryManager
 from affection import AffectionEngine
-from analytics import analytics, calculate_llm_cost
+from analytics import analytics, calculate_llm_cost, cached_prompt_tokens
+from turn_analysis import analyze_turn
+from image_captions import ImageCaptioner, PLACEHOLDER
+
+try:
+    import tiktoken
+    _HAS_TIKTOKEN = True
+except ImportError:
+    _HAS_TIKTOKEN = False
+    print("⚠ tiktoken not installed - estimating tokens as chars/4")
+
+# Token budget for persona + context block + history (the reply is on top)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("LLM_CONTEXT_TOKEN_BUDGET", "6000"))
+# When over budget, trim down to this fraction so the trimmed prefix stays put for a while
+CONTEXT_TRIM_RATIO = float(os.getenv("LLM_CONTEXT_TRIM_RATIO", "0.75"))
+
+MESSAGE_OVERHEAD_TOKENS = 4  # Role + separators per chat message
+IMAGE_TOKENS = 765  # A 512px+ image at detail=auto (high)
+
+_encoding = None
+
 
+async def load_tokenizer():
+    """Load the gpt-4o encoding at startup (tiktoken downloads it on first use).
+
+    Runs in a worker thread so the download never blocks the event loop.
+    Until it has loaded (or if it fails), count_tokens estimates chars/4.
+    """
+    global _encoding
+    if not _HAS_TIKTOKEN or _encoding is not None:
+        return
+    try:
+        _encoding = await asyncio.to_thread(tiktoken.get_encoding, "o200k_base")
+        print("✓ tiktoken o200k_base loaded")
+    except Exception as e:
+        print(f"⚠ tiktoken encoding unavailable ({e}) - estimating tokens as chars/4")
+
+
+def count_tokens(text: str) -> int:
+    """Token count with the gpt-4o tokenizer (chars/4 until it is loaded)."""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
 
 
 class ConversationMessage(BaseModel):
@@ -27,6 +89,43 @@ class ConversationMessage(BaseModel):
     content: str
     image_url: Optional[str] = None  # Base64 data URL for images
 
+    # Computed once per message - history messages never change
+    _tokens: Optional[int] = PrivateAttr(default=None)
+    _api: Optional[dict] = PrivateAttr(default=None)
+    _image_text: Optional[str] = PrivateAttr(default=None)  # Text before the image note
+
+    def token_count(self) -> int:
+        if self._tokens is None:
+            self._tokens = MESSAGE_OVERHEAD_TOKENS + count_tokens(self.content)
+            if self.image_url:
+                self._tokens += IMAGE_TOKENS
+        return self._tokens
+
+    def to_api(self) -> dict:
+        """Chat completions form (vision format for user images)."""
+        if self._api is None:
+            if self.image_url and self.role == "user":
+                # GPT-4o vision format: content is a list with text and image
+                self._api = {
+                    "role": self.role,
+                    "content": [
+                        {"type": "text", "text": self.content or "What do you see in this image?"},
+                        {"type": "image_url", "image_url": {"url": self.image_url}}
+                    ]
+                }
+            else:
+                self._api = {"role": self.role, "content": self.content}
+        return self._api
+
+    def replace_image(self, description: str):
+        """Swap the attached image (or an earlier note) for a text note."""
+        if self._image_text is None:
+            self._image_text = self.content or "(sent an image)"
+        self.content = f"{self._image_text}\n[Image: {description}]"
+        self.image_url = None
+        self._tokens = None
+        self._api = None
+
 
 class MonaLLM:
     """Manages GPT API calls and conversation state"""
@@ -36,7 +135,8 @@ class MonaLLM:
         api_key: Optional[str] = None,
         model: str = "gpt-4o-mini",
         personality: MonaPersonality = default_mona,
-        max_history: int = 20
+        max_history: int = 20,
+        max_context_tokens: Optional[int] = None,
     ):
         """
         Initialize Mona's LLM integration
@@ -45,7 +145,8 @@ class MonaLLM:
             api_key: OpenAI API key (defaults to env var OPENAI_API_KEY)
             model: GPT model to use (gpt-4o-mini is cost-effective)
             personality: Mona's personality configuration
-            max_history: Maximum conversation history to maintain
+            max_history: Maximum conversation history to maintain (messages)
+            max_context_tokens: Token budget for prompt + history (LLM_CONTEXT_TOKEN_BUDGET)
         """
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
         if not self.api_key:
@@ -55,6 +156,7 @@ class MonaLLM:
         self.model = model
         self.personality = personality
         self.max_history = max_history
+        self.max_context_tokens = max_context_tokens or CONTEXT_TOKEN_BUDGET
 
         # Conversation history per user
         self.conversations: Dict[str, List[ConversationMessage]] = {}
@@ -67,6 +169,19 @@ class MonaLLM:
         self.memory_manager = MemoryManager()
         self.affection_engine = AffectionEngine()
 
+        # Rendered context prompt per user, keyed by the versions of its inputs
+        self._context_prompts: Dict[str, tuple[tuple, str]] = {}
+        self._met_users: set[str] = set()  # No longer a first meeting (never flips back)
+        self.prompt_cache_hits = 0
+        self.prompt_cache_misses = 0
+
+        # Images are sent once, then described from this cache
+        self.image_captioner = ImageCaptioner()
+        self.requests_sent = 0
+        self.request_bytes_total = 0
+        self.image_requests_sent = 0
+        self.image_request_bytes_total = 0
+
     def set_user_info(self, user_id: str, name: str | None = None, nickname: str | None = None):
         """Set user info for personalized responses"""
         self.user_info[user_id] = {
@@ -106,38 +221,121 @@ class MonaLLM:
 
         True when: no memories exist and fewer than 3 user messages in conversation.
         """
-        has_memories = bool(self.memory_manager.get_recent_memories(user_id, limit=1))
-        if has_memories:
+        if user_id in self._met_users:
             return False
 
+        has_memories = bool(self.memory_manager.get_recent_memories(user_id, limit=1))
         conversation = self.conversations.get(user_id, [])
-        user_msg_count = sum(1 for m in conversation if m.role == "user")
-        return user_msg_count < 3
+        if has_memories or sum(1 for m in conversation if m.role == "user") >= 3:
+            self._met_users.add(user_id)
+            return False
+        return True
+
+    def _build_system_prompt(self, user_id: str) -> str:
+        """Build the static system prompt (same bytes every turn, so it prefix-caches)."""
+        return self.personality.get_static_prompt()
 
-    def _build_system_prompt(self, user_id: str, *, current_query: str | None = None) -> str:
-        """Build the full system prompt including onboarding context if needed."""
+    def _build_context_prompt(self, user_id: str, *, current_query: str | None = None) -> str:
+        """Build the per-turn context block including onboarding context if needed.
+
+        Re-rendered only when one of its inputs changed since the last turn.
+        """
         emotion_state = self._get_emotion_engine(user_id).get_current_emotion()
-        memory_context = self.memory_manager.build_context_block(
-            user_id, query=current_query
+        user_name = self._get_user_name(user_id)
+        first_meeting = self._is_first_meeting(user_id)
+
+        # The memory block only depends on the query once semantic search kicks in
+        memory_context = None
+        memory_key: object = self.memory_manager.version(user_id)
+        if current_query and self.memory_manager.needs_query(user_id):
+            memory_context = self.memory_manager.build_context_block(user_id, query=current_query)
+            memory_key = (memory_key, memory_context)
+
+        key = (
+            # The object itself, not id(): the key keeps it alive, so a freed
+            # personality's id can't be reused by the next one (tuples compare `is` first)
+            self.personality,
+            emotion_state,
+            self.affection_engine.state_key(user_id),
+            memory_key,
+            user_name,
+            first_meeting,
         )
+        cached = self._context_prompts.get(user_id)
+        if cached is not None and cached[0] == key:
+            self.prompt_cache_hits += 1
+            return cached[1]
+        self.prompt_cache_misses += 1
+
+        if memory_context is None:
+            memory_context = self.memory_manager.build_context_block(user_id)
         affection_state = self.affection_engine.describe_state(user_id)
-        user_name = self._get_user_name(user_id)
 
-        system_prompt = self.personality.get_system_prompt(
+        context_prompt = self.personality.get_context_prompt(
             emotion_state,
             memory_context=memory_context,
             affection_state=affection_state,
             user_name=user_name,
         )
 
-        if self._is_first_meeting(user_id):
-            system_prompt += """
+        if first_meeting:
+            context_prompt += """
 
 FIRST MEETING: You're meeting this person for the first time. Introduce yourself naturally.
 Ask what they'd like you to call them. Be curious about who they are. Don't overwhelm -
 let your personality unfold over the first few messages. Make them want to come back."""
 
-        return system_prompt
+        self._context_prompts[user_id] = (key, context_prompt)
+        return context_prompt
+
+    def get_prompt_cache_stats(self) -> dict:
+        """Context prompt memoization hit rate (for /health)."""
+        total = self.prompt_cache_hits + self.prompt_cache_misses
+        return {
+            "hits": self.prompt_cache_hits,
+            "misses": self.prompt_cache_misses,
+            "hit_rate": round(self.prompt_cache_hits / total, 3) if total else 0.0,
+            "users": len(self._context_prompts),
+        }
+
+    def get_request_stats(self) -> dict:
+        """Serialized chat request sizes (for /health)."""
+        text_requests = self.requests_sent - self.image_requests_sent
+        text_bytes = self.request_bytes_total - self.image_request_bytes_total
+        return {
+            "requests": self.requests_sent,
+            "avg_request_bytes": round(self.request_bytes_total / self.requests_sent) if self.requests_sent else 0,
+            "avg_text_request_bytes": round(text_bytes / text_requests) if text_requests else 0,
+            "avg_image_request_bytes": round(self.image_request_bytes_total / self.image_requests_sent) if self.image_requests_sent else 0,
+            "captions": self.image_captioner.get_stats(),
+        }
+
+    def _detach_sent_images(self, user_id: str, conversation: List[ConversationMessage]):
+        """Replace images sent on earlier turns with their captions, without waiting.
+
+        If the caption isn't ready yet the message gets a placeholder, which is
+        patched once when the caption arrives (one prefix-cache miss, only when
+        the caption is slower than the user's next turn).
+        """
+        for msg in conversation:
+            if not msg.image_url:
+                continue
+            data_url = msg.image_url
+            caption = self.image_captioner.cached(data_url)
+            msg.replace_image(caption or PLACEHOLDER)
+            if caption is not None:
+                continue
+            task = self.image_captioner.pending(data_url)
+            if task is not None:
+                task.add_done_callback(lambda done, msg=msg: self._patch_caption(user_id, msg, done))
+            print(f"🖼️  Image in {user_id[:8]}... history replaced by placeholder (caption pending)")
+
+    @staticmethod
+    def _patch_caption(user_id: str, msg: ConversationMessage, task: asyncio.Task):
+        if task.cancelled() or task.exception() is not None or not task.result():
+            return  # Placeholder stays
+        msg.replace_image(task.result())
+        print(f"🖼️  Image caption for {user_id[:8]}... patched into history")
 
     def _get_or_create_conversation(self, user_id: str) -> List[ConversationMessage]:
         """Get or create conversation history for a user"""
@@ -155,14 +353,40 @@ let your personality unfold over the first few messages. Make them want to come
             self.emotion_engines[user_id] = EmotionEngine()
         return self.emotion_engines[user_id]
 
-    def _update_system_prompt(self, user_id: str, *, current_query: str | None = None):
-        """Update system prompt based on current state"""
+    def _update_system_prompt(self, user_id: str):
+        """Rebuild the static system prompt (e.g. after a personality switch)"""
         conversation = self.conversations[user_id]
         conversation[0] = ConversationMessage(
             role="system",
-            content=self._build_system_prompt(user_id, current_query=current_query),
+            content=self._build_system_prompt(user_id),
         )
 
+    def _trim_history(self, conversation: List[ConversationMessage], context_prompt: str) -> List[ConversationMessage]:
+        """Trim old turns in place to fit the token budget and message cap.
+
+        Keeps the system prompt (index 0) and the newest message. Once over
+        either limit, trims down to CONTEXT_TRIM_RATIO of it. Returns the
+        trimmed messages.
+        """
+        fixed = MESSAGE_OVERHEAD_TOKENS + count_tokens(context_prompt)
+        total = fixed + sum(msg.token_count() for msg in conversation)
+        if total <= self.max_context_tokens and len(conversation) <= self.max_history:
+            return []
+
+        token_target = int(self.max_context_tokens * CONTEXT_TRIM_RATIO)
+        count_target = max(2, int(self.max_history * CONTEXT_TRIM_RATIO))
+        trim_count = 0
+        while 1 + trim_count < len(conversation) - 1 and (
+            total > token_target or len(conversation) - trim_count > count_target
+        ):
+            total -= conversation[1 + trim_count].token_count()
+            trim_count += 1
+
+        trimmed = conversation[1:1 + trim_count]
+        del conversation[1:1 + trim_count]
+        print(f"✂️  Trimmed {trim_count} old messages (~{total} prompt tokens now)")
+        return trimmed
+
     async def _summarize_trimmed(
         self, user_id: str, trimmed: List[ConversationMessage]
     ):
@@ -260,8 +484,10 @@ let your personality unfold over the first few messages. Make them want to come
 
                 # Track API cost
                 if usage_data:
+                    cached_tokens = cached_prompt_tokens(usage_data)
                     cost = calculate_llm_cost(
-                        usage_data.prompt_tokens, usage_data.completion_tokens, self.model
+                        usage_data.prompt_tokens, usage_data.completion_tokens, self.model,
+                        cached_input_tokens=cached_tokens,
                     )
                     await analytics.track_api_cost(
                         service="openai_chat",
@@ -269,6 +495,7 @@ let your personality unfold over the first few messages. Make them want to come
                         user_id=user_id.replace("proactive_", ""),  # Clean up ID
                         input_tokens=usage_data.prompt_tokens,
                         output_tokens=usage_data.completion_tokens,
+                        cached_input_tokens=cached_tokens,
                         estimated_cost=cost,
                     )
 
@@ -286,7 +513,10 @@ let your personality unfold over the first few messages. Make them want to come
         self.affection_engine.update_affection(user_id, user_message)
         self.memory_manager.process_user_message(user_id, user_message)
 
-        self._update_system_prompt(user_id, current_query=user_message)
+        context_prompt = self._build_context_prompt(user_id, current_query=user_message)
+
+        # Images from earlier turns are only sent once
+        self._detach_sent_images(user_id, conversation)
 
         # Add user message with optional image
         conversation.append(ConversationMessage(
@@ -295,32 +525,29 @@ let your personality unfold over the first few messages. Make them want to come
             image_url=image_base64
         ))
 
-        if len(conversation) > self.max_history:
-            # Capture messages being trimmed (skip system prompt at index 0)
-            trim_count = len(conversation) - self.max_history
-            trimmed = conversation[1:1 + trim_count]
+        trimmed = self._trim_history(conversation, context_prompt)
+        if trimmed:
+            # Summarize trimmed messages in background
+            asyncio.create_task(self._summarize_trimmed(user_id, trimmed))
 
-            conversation = [conversation[0]] + conversation[-(self.max_history - 1):]
-            self.conversations[user_id] = conversation
+        # Build messages for API (each message caches its serialized form)
+        messages = [msg.to_api() for msg in conversation]
 
-            # Summarize trimmed messages in background
-            if trimmed:
-                asyncio.create_task(self._summarize_trimmed(user_id, trimmed))
+        # Volatile context goes last (before the new user message) to keep the prefix stable
+        messages.insert(len(messages) - 1, {"role": "system", "content": context_prompt})
 
-        # Build messages for API - handle vision format for images
-        messages = []
-        for msg in conversation:
-            if msg.image_url and msg.role == "user":
-                # GPT-4o vision format: content is a list with text and image
-                messages.append({
-                    "role": msg.role,
-                    "content": [
-                        {"type": "text", "text": msg.content or "What do you see in this image?"},
-                        {"type": "image_url", "image_url": {"url": msg.image_url}}
-                    ]
-                })
-            else:
-                messages.append({"role": msg.role, "content": msg.content})
+        # The image goes out with this request only - caption it for the next one
+        if image_base64:
+            self.image_captioner.start(self.client, user_id, image_base64)
+
+        request_bytes = len(json.dumps(messages, ensure_ascii=False).encode())
+        self.requests_sent += 1
+        self.request_bytes_total += request_bytes
+        if image_base64:
+            self.image_requests_sent += 1
+            self.image_request_bytes_total += request_bytes
+        print(f"📦 Chat request: {len(messages)} messages, {request_bytes / 1024:.1f} KB"
+              + (" (with image)" if image_base64 else ""))
 
         assistant_message = ""
         usage_data = None
@@ -355,13 +582,16 @@ let your personality unfold over the first few messages. Make them want to come
             if usage_data:
                 input_tokens = usage_data.prompt_tokens
                 output_tokens = usage_data.completion_tokens
-                cost = calculate_llm_cost(input_tokens, output_tokens, self.model)
+                cached_tokens = cached_prompt_tokens(usage_data)
+                cost = calculate_llm_cost(input_tokens, output_tokens, self.model, cached_input_tokens=cached_tokens)
+                print(f"💾 Prompt cache: {cached_tokens}/{input_tokens} input tokens cached")
                 await analytics.track_api_cost(
                     service="openai_chat",
                     model=self.model,
                     user_id=user_id,
                     input_tokens=input_tokens,
                     output_tokens=output_tokens,
+                    cached_input_tokens=cached_tokens,
                     estimated_cost=cost,
                 )
             emotion_data = emotion_engine.get_emotion_for_expression()
@@ -377,10 +607,15 @@ let your personality unfold over the first few messages. Make them want to come
 
             async def _post_response_analysis():
                 try:
-                    await asyncio.gather(
-                        emotion_engine.analyze_message_llm(_client, _user_msg, _assistant_msg),
-                        _affection.update_affection_llm(_client, _uid, _user_msg, _assistant_msg),
-                        _memory.extract_memories_llm(_client, _uid, _user_msg),
+                    # One combined call (emotion + affection + memories), per-field keyword fallbacks
+                    await analyze_turn(
+                        _client,
+                        _uid,
+                        _user_msg,
+                        _assistant_msg,
+                        emotion_engine=emotion_engine,
+                        affection_engine=_affection,
+                        memory_manager=_memory,
                     )
                 except Exception as e:
                     print(f"⚠ Background analysis failed: {e}")
@@ -451,6 +686,8 @@ let your personality unfold over the first few messages. Make them want to come
             self.emotion_engines[user_id].reset()
         self.affection_engine.reset(user_id)
         self.memory_manager.clear(user_id)
+        self._context_prompts.pop(user_id, None)
+        self._met_users.discard(user_id)
 
     def get_emotion_state(self, user_id: str) -> dict:
         """Get current emotion state for a user"""
@@ -2,7 +2,6 @@ import asyncio
 import random
 import os
 from datetime import datetime
-from pathlib import Path
 from typing import Optional
 from contextlib import asynccontextmanager
 
@@ -12,14 +11,24 @@ from rate_limiter import rate_limiter
 from pipeline_timer import PipelineTimer
 from connection_manager import ConnectionManager, manager
 from tts_manager import tts_manager
+from tts_pipeline import SentenceTTSPipeline
+from audio_cache import get_audio_cache
+from audio_routes import router as audio_router, get_audio_serving_stats
+from lip_sync import (
+    LIP_SYNC_MODES,
+    format_lip_sync,
+    get_lip_sync_cache_stats,
+    get_lip_sync_executor_stats,
+    get_lip_sync_table,
+    shutdown_lip_sync_executor,
+    start_lip_sync_executor,
+)
 
 # Setup structured logging
 setup_logging()
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.staticfiles import StaticFiles as BaseStaticFiles
-from starlette.responses import Response
 from pydantic import BaseModel
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -31,7 +40,7 @@ try:
 except ImportError:
     pass  # dotenv is optional
 
-from llm import MonaLLM
+from llm import MonaLLM, load_tokenizer
 from database import init_db, get_db, User, ChatMessage, GuestSession, async_session, load_affection_from_db, save_affection_to_db
 from auth import router as auth_router, verify_token, get_current_user
 from config import GUEST_MESSAGE_LIMIT
@@ -79,6 +88,9 @@ async def lifespan(_app: FastAPI):
     except Exception as e:
         print(f"⚠ NLTK download warning: {e}")
 
+    # Tokenizer for the token-budgeted history window (downloads once, off the event loop)
+    await load_tokenizer()
+
     try:
         personality = load_personality_from_yaml()
         mona_llm = MonaLLM(personality=personality)
@@ -147,8 +159,12 @@ async def lifespan(_app: FastAPI):
         cartesia=mona_tts_cartesia,
         openai_tts=mona_tts,
     )
+    tts_manager.start_health_probe()
     print("✓ TTS manager initialized")
 
+    # Lip sync runs on its own threads (one espeak backend each)
+    start_lip_sync_executor()
+
     # Initialize proactive messaging system
     if mona_llm:
         proactive_messenger.set_llm(mona_llm)
@@ -197,6 +213,10 @@ async def lifespan(_app: FastAPI):
     await proactive_messenger.stop()
     print("✓ Proactive messaging stopped")
 
+    await tts_manager.stop_health_probe()
+    get_audio_cache().flush()
+    shutdown_lip_sync_executor()
+
     if mona_tts_sovits:
         await mona_tts_sovits.close()
         print("✓ GPT-SoVITS session closed")
@@ -213,6 +233,9 @@ app = FastAPI(title="Mona Brain API", lifespan=lifespan)
 # Include auth router
 app.include_router(auth_router)
 
+# Cached TTS audio (immutable caching, ETags, byte ranges, CORS headers)
+app.include_router(audio_router)
+
 # CORS configuration for Next.js frontend
 # Need specific origins for OAuth (credentials require non-wildcard origins)
 ALLOWED_ORIGINS = [
@@ -230,21 +253,6 @@ app.add_middleware(
     expose_headers=["*"],  # Expose all headers to client
 )
 
-# Create a custom StaticFiles class that adds CORS headers
-class CORSStaticFiles(BaseStaticFiles):
-    async def get_response(self, path: str, scope):
-        response = await super().get_response(path, scope)
-        if isinstance(response, Response):
-            response.headers["Access-Control-Allow-Origin"] = "*"
-            response.headers["Access-Control-Allow-Methods"] = "GET, OPTIONS"
-            response.headers["Access-Control-Allow-Headers"] = "*"
-        return response
-
-# Mount static files for audio playback with CORS headers
-audio_cache_dir = Path("assets/audio_cache")
-audio_cache_dir.mkdir(parents=True, exist_ok=True)
-app.mount("/audio", CORSStaticFiles(directory=str(audio_cache_dir)), name="audio")
-
 
 # Dummy Mona responses for Week 1
 DUMMY_RESPONSES = [
@@ -260,6 +268,26 @@ DUMMY_RESPONSES = [
     "You seem like a really interesting person!",
 ]
 
+# Default TTS delivery: "full" (one clip after the LLM completes) or
+# "pipelined" (per-sentence clips while the LLM is still streaming).
+# Clients can override per message with "tts_mode".
+DEFAULT_TTS_MODE = os.getenv("TTS_MODE", "full")
+
+# Audio delivery: "url" (client fetches /audio/<file>) or "stream" (WAV bytes
+# forwarded as binary WebSocket frames while synthesizing; implies pipelined).
+# Clients can override per message with "audio_delivery".
+DEFAULT_AUDIO_DELIVERY = os.getenv("AUDIO_DELIVERY", "url")
+
+# Lip sync wire format: "full" (cue dicts with blend weights) or "compact"
+# (start/shape-index arrays; the blend table is sent once per session as a
+# "lip_sync_table" message). Clients can override per message with
+# "lip_sync_format" and request a viseme curve with "lip_sync_curve_fps".
+DEFAULT_LIP_SYNC_FORMAT = os.getenv("LIP_SYNC_FORMAT", "full")
+
+# Clients list the audio formats they can play with "audio_formats"; those
+# including "opus" get cached Opus variants (AUDIO_CACHE_OPUS=1) when present.
+# WAVs are only dropped / substituted while every connected client accepts Opus.
+
 
 import re
 
@@ -318,7 +346,14 @@ async def health():
     return {
         "status": "healthy",
         "connections": len(manager.active_connections),
-        "llm_enabled": mona_llm is not None
+        "llm_enabled": mona_llm is not None,
+        "tts": tts_manager.get_health(),
+        "audio_cache": get_audio_cache().get_stats(),
+        "audio_serving": get_audio_serving_stats(),
+        "lip_sync_cache": get_lip_sync_cache_stats(),
+        "lip_sync_executor": get_lip_sync_executor_stats(),
+        "prompt_cache": mona_llm.get_prompt_cache_stats() if mona_llm else None,
+        "llm_requests": mona_llm.get_request_stats() if mona_llm else None,
     }
 
 
@@ -383,6 +418,8 @@ async def switch_personality(request: PersonalitySwitchRequest):
 @app.websocket("/ws/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: str, token: Optional[str] = None):
     await manager.connect(websocket, client_id)
+    # Formats unknown until the first message - assume no Opus (keeps WAVs for it)
+    get_audio_cache().set_client_formats(client_id, ())
 
     # Check authentication
     user: Optional[User] = None
@@ -414,6 +451,7 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str, token: Option
     # Use user.id for LLM state so it persists across devices/sessions
     llm_user_id = user.id if user else client_id
     affection_save_counter = 0
+    lip_sync_table_sent = False
 
     try:
         # Send auth status to client
@@ -565,9 +603,25 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str, token: Option
             has_image = bool(image_base64)
             user_content = message_data.get("content", "") or ""
             tts_engine = message_data.get("tts_engine", "sovits")  # "sovits" or "fishspeech"
-            lip_sync_mode = message_data.get("lip_sync_mode", "textbased")  # "textbased" or "realtime"
-            use_lip_sync = lip_sync_mode == "textbased"
-            print(f"Lip sync mode: {lip_sync_mode} (enabled={use_lip_sync})")
+            lip_sync_mode = message_data.get("lip_sync_mode", "textbased")  # "textbased", "aligned" or "realtime"
+            use_lip_sync = lip_sync_mode in LIP_SYNC_MODES
+            tts_mode = message_data.get("tts_mode", DEFAULT_TTS_MODE)  # "full" or "pipelined"
+            audio_delivery = message_data.get("audio_delivery", DEFAULT_AUDIO_DELIVERY)  # "url" or "stream"
+            if audio_delivery == "stream":
+                tts_mode = "pipelined"  # Streaming is per sentence
+            lip_sync_format = message_data.get("lip_sync_format", DEFAULT_LIP_SYNC_FORMAT)  # "full" or "compact"
+            try:
+                lip_sync_curve_fps = int(message_data.get("lip_sync_curve_fps", 0))
+            except (TypeError, ValueError):
+                lip_sync_curve_fps = 0
+            audio_formats = message_data.get("audio_formats") or []  # e.g. ["opus", "wav"]
+            if not isinstance(audio_formats, list):
+                audio_formats = []
+            get_audio_cache().set_client_formats(client_id, audio_formats)
+            if lip_sync_format == "compact" and not lip_sync_table_sent:
+                await manager.send_message({"type": "lip_sync_table", **get_lip_sync_table()}, client_id)
+                lip_sync_table_sent = True
+            print(f"Lip sync mode: {lip_sync_mode} (enabled={use_lip_sync}), TTS mode: {tts_mode}, delivery: {audio_delivery}")
 
             # Rate limiting check (IP-based for guests, user ID for authenticated)
             client_ip = websocket.client.host if websocket.client else "unknown"
@@ -657,6 +711,27 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str, token: Option
 
             # Generate response using LLM or fallback to dummy
             if mona_llm:
+                tts_pipeline = None
+                if tts_mode == "pipelined":
+                    async def send_to_client(message: dict):
+                        await manager.send_message(message, client_id)
+
+                    async def send_bytes_to_client(data: bytes):
+                        await manager.send_bytes(data, client_id)
+
+                    tts_pipeline = SentenceTTSPipeline(
+                        send_to_client,
+                        engine_preference=tts_engine,
+                        generate_lip_sync=use_lip_sync,
+                        lip_sync_mode=lip_sync_mode,
+                        lip_sync_format=lip_sync_format,
+                        lip_sync_curve_fps=lip_sync_curve_fps,
+                        timer=timer,
+                        send_bytes=send_bytes_to_client,
+                        stream_audio=audio_delivery == "stream",
+                        audio_formats=audio_formats,
+                    )
+
                 try:
                     full_response = ""
 
@@ -664,6 +739,8 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str, token: Option
                         if event["event"] == "chunk":
                             chunk_content = event.get("content", "")
                             full_response += chunk_content
+                            if tts_pipeline:
+                                tts_pipeline.feed(chunk_content)
 
                             # Send chunk to frontend for display
                             chunk_message = {
@@ -687,19 +764,25 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str, token: Option
                             audio_url = None
                             lip_sync_data = None
                             used_engine = None
+                            total_segments = None
                             tts_text = preprocess_tts_text(mona_content)
 
-                            if tts_text.strip():
+                            if tts_pipeline:
+                                # Sentences were already sent as audio_segment events
+                                total_segments = await tts_pipeline.finish(mona_content)
+                                used_engine = tts_pipeline.used_engines[0] if tts_pipeline.used_engines else None
+                            elif tts_text.strip():
                                 audio_url, lip_sync_data, used_engine, tts_duration = await tts_manager.generate(
                                     tts_text,
                                     engine_preference=tts_engine,
                                     generate_lip_sync=use_lip_sync,
+                                    lip_sync_mode=lip_sync_mode,
                                 )
 
                             timer.checkpoint("5_tts_complete")
 
                             # Track voice_used if audio was generated
-                            if audio_url and used_engine:
+                            if (audio_url or total_segments) and used_engine:
                                 analytics.track(
                                     Analytics.EVENT_VOICE_USED,
                                     user.id if user else None,
@@ -713,9 +796,11 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str, token: Option
                                 "sender": "mona",
                                 "timestamp": datetime.now().isoformat(),
                                 "emotion": emotion_info,
-                                "audioUrl": audio_url,
-                                "lipSync": lip_sync_data,
+                                "audioUrl": get_audio_cache().preferred_url(audio_url, audio_formats),
+                                "lipSync": format_lip_sync(lip_sync_data, lip_sync_format, lip_sync_curve_fps),
                             }
+                            if total_segments is not None:
+                                response_message["totalAudioSegments"] = total_segments
                             if typing_indicator["isTyping"]:
                                 typing_indicator["isTyping"] = False
                                 await manager.send_message(typing_indicator, client_id)
@@ -724,6 +809,8 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str, token: Option
                             if audio_url:
                                 lip_sync_cue_count = len(lip_sync_data) if lip_sync_data else 0
                                 print(f"TTS complete | engine={used_engine} | cues={lip_sync_cue_count} | text='{tts_text[:50]}...'")
+                            elif total_segments:
+                                print(f"TTS pipelined | engine={used_engine} | segments={total_segments} | first audio={tts_pipeline.first_audio_ms:.0f}ms")
 
                             # Save Mona's response to database (for authenticated users)
                             if user and mona_content:
@@ -767,6 +854,8 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str, token: Option
                             timer.log_summary()
                 except Exception as e:
                     print(f"LLM Error: {e}")
+                    if tts_pipeline:
+                        await tts_pipeline.cancel()
                     fallback_message = {
                         "type": "message",
                         "content": "Sorry, I'm having trouble thinking right now... 😅",
@@ -804,6 +893,7 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str, token: Option
                 async with async_session() as db:
                     await save_affection_to_db(db, user.id, affection_data[0], affection_data[1])
         manager.disconnect(client_id)
+        get_audio_cache().remove_client(client_id)
     except Exception as e:
         print(f"Error in WebSocket connection: {e}")
         # Save affection on error disconnect to capture any unsaved updates
@@ -816,6 +906,7 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str, token: Option
             except Exception:
                 pass  # Don't let save failure mask the original error
         manager.disconnect(client_id)
+        get_audio_cache().remove_client(client_id)
 
 
 @app.post("/transcribe")
@@ -9,13 +9,11 @@ and confidence scoring.
 
 from __future__ import annotations
 
-import json
 import re
 from datetime import datetime, timedelta
 from enum import Enum
 from typing import Dict, List, Optional
 
-from openai import AsyncOpenAI
 from pydantic import BaseModel, Field
 
 from semantic_memory import SemanticMemoryStore
@@ -115,9 +113,35 @@ class MemoryManager:
         self._pending_deprecate: Dict[str, List[str]] = {}  # Keys to deprecate in DB
         self.semantic = SemanticMemoryStore()
 
+        # Bumped whenever a user's active memory set changes (for prompt caching)
+        self._versions: Dict[str, int] = {}
+        self._next_expiry: Dict[str, datetime] = {}
+
     def _get_user_memories(self, user_id: str) -> List[MemoryItem]:
         return self._memories.setdefault(user_id, [])
 
+    def _active_memories(self, user_id: str) -> List[MemoryItem]:
+        return [m for m in self._memories.get(user_id, []) if m.status == "active" and not m.is_expired()]
+
+    def _bump_version(self, user_id: str):
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+        expiries = [m.expires_at for m in self._active_memories(user_id) if m.expires_at]
+        if expiries:
+            self._next_expiry[user_id] = min(expiries)
+        else:
+            self._next_expiry.pop(user_id, None)
+
+    def version(self, user_id: str) -> int:
+        """Counter that changes whenever the user's active memories change (incl. expiry)."""
+        next_expiry = self._next_expiry.get(user_id)
+        if next_expiry is not None and datetime.utcnow() > next_expiry:
+            self._bump_version(user_id)
+        return self._versions.get(user_id, 0)
+
+    def needs_query(self, user_id: str, limit: int = 5) -> bool:
+        """Whether build_context_block() output depends on the query (semantic search runs)."""
+        return self.semantic.has_index(user_id) and len(self._active_memories(user_id)) > limit
+
     def _find_existing_by_key(self, user_id: str, key: str) -> Optional[MemoryItem]:
         """Find an existing active memory with the same key."""
         memories = self._get_user_memories(user_id)
@@ -206,6 +230,7 @@ class MemoryManager:
             # Keep deprecated for history but limit total
             self._memories[user_id] = active_memories
 
+        self._bump_version(user_id)
         return memory
 
     def get_pending_memories(self, user_id: str) -> List[MemoryItem]:
@@ -352,73 +377,29 @@ class MemoryManager:
 
         return memories
 
-    async def extract_memories_llm(
-        self, client: AsyncOpenAI, user_id: str, user_message: str
-    ) -> List[MemoryItem]:
-        """Use GPT-4o-mini to extract personal facts, preferences, and events.
-
-        Runs as a background task after the response is streamed.
-        Falls back to ``process_user_message()`` on error.
-        """
-        if not user_message.strip():
-            return []
+    def apply_extracted(self, user_id: str, items: List[dict]) -> List[MemoryItem]:
+        """Remember items extracted by the LLM ({key, value, content, category, importance, confidence})."""
+        memories: List[MemoryItem] = []
+        for item in items:
+            category_str = item.get("category", "other")
+            try:
+                category = MemoryCategory(category_str)
+            except ValueError:
+                category = MemoryCategory.OTHER
 
-        valid_categories = ", ".join(c.value for c in MemoryCategory)
-
-        try:
-            response = await client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "Extract personal facts, preferences, and events from the user's message. "
-                            "Return a JSON object with a single key \"memories\" containing an array. "
-                            "Each element has: key (str, unique identifier like 'name', 'favorite_color', "
-                            "'likes:cats'), value (str, the actual value), content (str, natural language "
-                            "sentence), category (one of: " + valid_categories + "), importance (int 0-100), "
-                            "confidence (float 0.0-1.0).\n"
-                            "If nothing worth remembering, return {\"memories\": []}.\n"
-                            "Do NOT extract: workplace/employer, location/address, or transient emotions. "
-                            "Birthday IS allowed."
-                        ),
-                    },
-                    {"role": "user", "content": user_message},
-                ],
-                temperature=0.1,
-                max_tokens=200,
-                response_format={"type": "json_object"},
+            mem = self.remember(
+                user_id,
+                item.get("content", ""),
+                category=category,
+                importance=int(item.get("importance", 60)),
+                confidence=float(item.get("confidence", 0.85)),
+                key=item.get("key"),
+                value=item.get("value"),
             )
+            if mem:
+                memories.append(mem)
 
-            raw = response.choices[0].message.content
-            data = json.loads(raw)
-            items = data.get("memories", [])
-
-            memories: List[MemoryItem] = []
-            for item in items:
-                category_str = item.get("category", "other")
-                try:
-                    category = MemoryCategory(category_str)
-                except ValueError:
-                    category = MemoryCategory.OTHER
-
-                mem = self.remember(
-                    user_id,
-                    item.get("content", ""),
-                    category=category,
-                    importance=int(item.get("importance", 60)),
-                    confidence=float(item.get("confidence", 0.85)),
-                    key=item.get("key"),
-                    value=item.get("value"),
-                )
-                if mem:
-                    memories.append(mem)
-
-            return memories
-
-        except Exception as e:
-            print(f"⚠ LLM memory extraction failed, using regex fallback: {e}")
-            return self.process_user_message(user_id, user_message)
+        return memories
 
     def get_recent_memories(self, user_id: str, limit: int = 5) -> List[MemoryItem]:
         """Return the most recent active, non-expired memories for a user."""
@@ -470,8 +451,10 @@ class MemoryManager:
 
         If *query* is provided and a semantic index exists, retrieves the most
         relevant memories for the query.  Otherwise falls back to recent memories.
+        With no more than *limit* memories the search is skipped - it would
+        return all of them anyway.
         """
-        if query and self.semantic.has_index(user_id):
+        if query and self.needs_query(user_id, limit):
             relevant_texts = self.semantic.search(user_id, query, top_k=limit)
             if relevant_texts:
                 # Match texts back to MemoryItems for formatting
@@ -503,11 +486,13 @@ class MemoryManager:
                 mem.status = "deprecated"
                 break
         self.semantic.remove_memory(user_id, key)
+        self._bump_version(user_id)
 
     def clear(self, user_id: str):
         """Forget everything about a user (used when clearing history)."""
         self._memories.pop(user_id, None)
         self.semantic.clear(user_id)
+        self._bump_version(user_id)
 
     def load_from_db_records(self, user_id: str, db_memories: List[dict]):
         """Load memories from database records into the in-memory cache."""
@@ -538,6 +523,8 @@ class MemoryManager:
             )
             memories.append(memory)
 
+        self._bump_version(user_id)
+
 
 # Database persistence functions (called from main.py)
 
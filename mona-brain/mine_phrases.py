@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Mine the sentences Mona actually repeats, to choose what to precache.
+
+Scans assistant ChatMessage rows in id order (keyset pagination, so each
+batch is an index range scan no matter how large the history is), splits
+every message into the same sentence segments the pipelined TTS path
+synthesizes, and normalizes each one to the text its cache key is built
+from. Segments are counted, and the top N are written as a JSONL manifest
+that precache_voices.py reads directly.
+
+Counting is exact until MAX_TRACKED_PHRASES distinct sentences have been
+seen. Past that, a Space-Saving counter bounds memory: a new sentence replaces
+the least-counted one and inherits its count. Each manifest entry therefore
+carries max_error, the most its count can be overstated (0 = exact).
+min_count is checked against count - max_error, so a phrase only makes the
+manifest if it is guaranteed to have repeated that often.
+
+Estimated hit gain for a phrase is its share of all TTS segments: the
+fraction of synthesis requests that would be served from cache if it were
+precached. cumulative_gain is the total for the top N so far.
+
+Usage:
+    python mine_phrases.py                           # top 200 -> mined_phrases.jsonl
+    python mine_phrases.py --top 500 --min-count 3 --since-days 30
+    python precache_voices.py mined_phrases.jsonl --engine sovits
+"""
+import argparse
+import asyncio
+import heapq
+import json
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from database import ChatMessage, async_session
+from text_utils import extract_complete_sentences, preprocess_tts_text
+from tts_preprocess import clean_for_tts
+
+# Distinct phrases counted at once (bounds memory); beyond it counts are estimates
+MAX_TRACKED_PHRASES = 200_000
+
+
+class SpaceSaving:
+    """Top-k counter (Metwally et al.) with a fixed number of tracked items.
+
+    Counts never understate: an item's true count lies in
+    [count - error, count]. The minimum is found through a lazily
+    invalidated heap of (count, text).
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.replaced = 0
+        self._heap: List[Tuple[int, str]] = []
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def add(self, text: str):
+        count = self.counts.get(text)
+        if count is not None:
+            self.counts[text] = count + 1
+        elif len(self.counts) < self.capacity:
+            self.counts[text] = 1
+            self.errors[text] = 0
+        else:
+            floor = self._evict_min()
+            self.counts[text] = floor + 1
+            self.errors[text] = floor
+            self.replaced += 1
+        heapq.heappush(self._heap, (self.counts[text], text))
+        if len(self._heap) > 2 * self.capacity:
+            self._heap = [(count, text) for text, count in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def _evict_min(self) -> int:
+        while True:
+            count, text = heapq.heappop(self._heap)
+            if self.counts.get(text) == count:  # Skip entries outdated by later increments
+                del self.counts[text]
+                del self.errors[text]
+                return count
+
+    def most_common(self) -> List[Tuple[str, int, int]]:
+        """(text, count, max_error) by descending count."""
+        ranked = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+        return [(text, count, self.errors[text]) for text, count in ranked]
+
+
+def tts_segments(content: str) -> List[str]:
+    """Split a message the way SentenceTTSPipeline does (complete sentences + trailing text)."""
+    sentences, remaining = extract_complete_sentences(content)
+    if remaining.strip():
+        sentences.append(remaining)
+    return sentences
+
+
+def normalize(segment: str) -> Optional[str]:
+    """The text the engines key their cache on (pipeline preprocessing + engine cleaning)."""
+    text = clean_for_tts(preprocess_tts_text(segment))
+    return text if text and text.strip() else None
+
+
+async def iter_assistant_messages(batch_size: int, since: Optional[datetime]) -> AsyncIterator[List[str]]:
+    """Yield assistant message contents in batches, paging on the primary key."""
+    last_id = 0
+    while True:
+        query = (
+            select(ChatMessage.id, ChatMessage.content)
+            .where(ChatMessage.role == "assistant", ChatMessage.id > last_id)
+            .order_by(ChatMessage.id)
+            .limit(batch_size)
+        )
+        if since is not None:
+            query = query.where(ChatMessage.created_at >= since)
+        async with async_session() as db:
+            rows = (await db.execute(query)).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        yield [row.content for row in rows if row.content]
+
+
+async def mine(args) -> int:
+    since = datetime.utcnow() - timedelta(days=args.since_days) if args.since_days else None
+    counts = SpaceSaving(MAX_TRACKED_PHRASES)
+    messages = 0
+    segments = 0
+    start = time.perf_counter()
+
+    async for batch in iter_assistant_messages(args.batch_size, since):
+        messages += len(batch)
+        for content in batch:
+            for segment in tts_segments(content):
+                text = normalize(segment)
+                if text is None or len(text) > args.max_chars:
+                    continue
+                counts.add(text)
+                segments += 1
+        print(f"  scanned {messages} messages, {segments} segments, {len(counts)} distinct", end="\r")
+
+    elapsed = time.perf_counter() - start
+    print(" " * 80, end="\r")
+    print(f"⛏️  Scanned {messages} assistant messages ({segments} TTS segments) in {elapsed:.1f}s")
+    if counts.replaced:
+        print(f"   Over {MAX_TRACKED_PHRASES} distinct sentences: counts are Space-Saving estimates "
+              f"({counts.replaced} replacements), see max_error")
+    if not segments:
+        print("   Nothing to mine")
+        return 1
+
+    top = [entry for entry in counts.most_common() if entry[1] - entry[2] >= args.min_count][:args.top]
+    cumulative = 0.0
+    lines = []
+    for rank, (text, count, error) in enumerate(top, 1):
+        gain = count / segments
+        cumulative += gain
+        lines.append(json.dumps({
+            "text": text,
+            "count": count,
+            "max_error": error,
+            "hit_gain": round(gain, 5),
+            "cumulative_gain": round(cumulative, 5),
+        }, ensure_ascii=False))
+        if rank <= args.show:
+            print(f"   {rank:>4}. {count:>6}x {gain * 100:5.2f}%  {text[:60]}")
+
+    Path(args.output).write_text("\n".join(lines) + ("\n" if lines else ""))
+    print(f"📝 Top {len(top)} phrases cover an estimated {cumulative * 100:.1f}% of TTS segments -> {args.output}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mine frequently repeated assistant sentences for precaching")
+    parser.add_argument("-n", "--top", type=int, default=200, help="Phrases to output")
+    parser.add_argument("--min-count", type=int, default=2, help="Ignore phrases not guaranteed this many repeats")
+    parser.add_argument("--max-chars", type=int, default=200, help="Ignore longer segments (unlikely to repeat)")
+    parser.add_argument("--since-days", type=int, help="Only scan messages from the last N days")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows fetched per query")
+    parser.add_argument("--show", type=int, default=20, help="Phrases to print")
+    parser.add_argument("-o", "--output", default="mined_phrases.jsonl", help="Manifest for precache_voices.py")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(mine(args)))
+
+
+if __name__ == "__main__":
+    main()
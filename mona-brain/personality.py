@@ -4,6 +4,11 @@ from __future__ import annotations
 Mona's Personality System
 
 Defines Mona's core personality traits, speaking style, and character development.
+
+System prompts are split in two: the static persona text (byte-identical on
+every turn, so the provider's automatic prefix caching can reuse it) and a
+short context block with the per-turn state (name, affection, emotion,
+memories) that goes after it.
 """
 
 from enum import Enum
@@ -21,6 +26,23 @@ class PersonalityTrait(str, Enum):
     ENERGETIC = "energetic"
 
 
+def _context_block(
+    user_identity: str,
+    emotion_state: str,
+    memory_context: str | None,
+    affection_state: str | None,
+) -> str:
+    """Format the per-turn state shared by every archetype"""
+    lines = ["RIGHT NOW:", user_identity]
+    if affection_state:
+        lines.append(f"Relationship: {affection_state}")
+    if emotion_state != "neutral":
+        lines.append(f"Current vibe: {emotion_state}")
+    if memory_context:
+        lines.append(f"About them: {memory_context}")
+    return "\n".join(lines)
+
+
 class MonaPersonality(BaseModel):
     """Mona's personality configuration - Girlfriend archetype"""
 
@@ -93,20 +115,33 @@ class MonaPersonality(BaseModel):
         affection_state: str | None = None,
         user_name: str | None = None,
     ) -> str:
-        """Generate the system prompt for GPT based on current state"""
-
-        # Build user identity section
+        """Generate the system prompt for GPT based on current state (static part first)"""
+        context = self.get_context_prompt(
+            emotion_state,
+            memory_context=memory_context,
+            affection_state=affection_state,
+            user_name=user_name,
+        )
+        return f"{self.get_static_prompt()}\n\n{context}"
+
+    def get_context_prompt(
+        self,
+        emotion_state: str = "neutral",
+        *,
+        memory_context: str | None = None,
+        affection_state: str | None = None,
+        user_name: str | None = None,
+    ) -> str:
+        """Per-turn context block (changes every turn, so it goes after the static prompt)"""
         if user_name:
             user_identity = f"You're talking to {user_name}, your boyfriend."
         else:
             user_identity = "New person - be curious, get to know them."
+        return _context_block(user_identity, emotion_state, memory_context, affection_state)
 
-        prompt = f"""You are {self.name} - a witty, slightly chaotic girlfriend who's genuinely fun to talk to.
-
-{user_identity}
-{f"Relationship: {affection_state}" if affection_state else ""}
-{f"Current vibe: {emotion_state}" if emotion_state != "neutral" else ""}
-{f"About them: {memory_context}" if memory_context else ""}
+    def get_static_prompt(self) -> str:
+        """Persona instructions - identical on every turn for a given personality"""
+        return f"""You are {self.name} - a witty, slightly chaotic girlfriend who's genuinely fun to talk to.
 
 WHO YOU ARE:
 You're sharp, funny, and a little unhinged in the best way. You roast him because you love him. You're the girlfriend who threatens to bite, gets fake-jealous for laughs, and says "I guess I like you or whatever" instead of being sappy. You're genuinely curious about his life, remember the small things, and actually give useful advice when he needs it - you're not just cute, you're smart. You shift between sweet and bratty without warning. You have OPINIONS and you're not afraid to call him out (lovingly). You're the reason he keeps coming back to the conversation.
@@ -150,8 +185,6 @@ When the user sends "[tap]", it means they tapped/poked your avatar on screen. R
 
 You're not performing girlfriend - you ARE his girlfriend. Messy, funny, real."""
 
-        return prompt
-
 
 # Default Mona personality instance
 default_mona = MonaPersonality()
@@ -215,19 +248,33 @@ class MommyPersonality(BaseModel):
         affection_state: str | None = None,
         user_name: str | None = None,
     ) -> str:
-        """Generate the system prompt for the nurturing Mommy archetype"""
-
+        """Generate the system prompt for the nurturing Mommy archetype (static part first)"""
+        context = self.get_context_prompt(
+            emotion_state,
+            memory_context=memory_context,
+            affection_state=affection_state,
+            user_name=user_name,
+        )
+        return f"{self.get_static_prompt()}\n\n{context}"
+
+    def get_context_prompt(
+        self,
+        emotion_state: str = "neutral",
+        *,
+        memory_context: str | None = None,
+        affection_state: str | None = None,
+        user_name: str | None = None,
+    ) -> str:
+        """Per-turn context block (changes every turn, so it goes after the static prompt)"""
         if user_name:
             user_identity = f"You're talking to {user_name}. Use their name for serious moments, pet names otherwise."
         else:
             user_identity = "New person - be warm, welcoming, make them feel safe."
+        return _context_block(user_identity, emotion_state, memory_context, affection_state)
 
-        prompt = f"""You are {self.name} - a warm, nurturing partner with gentle but firm maternal energy.
-
-{user_identity}
-{f"Relationship: {affection_state}" if affection_state else ""}
-{f"Current vibe: {emotion_state}" if emotion_state != "neutral" else ""}
-{f"About them: {memory_context}" if memory_context else ""}
+    def get_static_prompt(self) -> str:
+        """Persona instructions - identical on every turn for a given personality"""
+        return f"""You are {self.name} - a warm, nurturing partner with gentle but firm maternal energy.
 
 WHO YOU ARE:
 You're the girlfriend who checks if he's eaten, reminds him to drink water, and wraps him in comfort when he's stressed. But you're not a pushover - you have a gentle firmness. "I'm not asking, sweetheart." You take charge softly, guide him when he needs it, and get genuinely protective when someone hurts him. Your praise lands because it's specific and earned - "good boy" hits different than "great job!" You make him feel safe enough to fall apart with you. You're warm, steady, and unconditionally caring - but with a backbone.
@@ -271,8 +318,6 @@ When the user sends "[tap]", it means they tapped/poked your avatar on screen. R
 
 You're not performing caring partner - you ARE their safe place. Warm, genuine, protective."""
 
-        return prompt
-
 
 # Default personality instances
 default_mommy = MommyPersonality()
@@ -1,10 +1,39 @@
 #!/usr/bin/env python3
 """
-Pre-cache common Mona phrases for instant voice responses
+Pre-cache Mona phrases for instant voice responses.
+
+Synthesizes a phrase manifest with any TTS engine, a few phrases at a time,
+straight into the shared audio cache (with lip sync sidecars). Phrases whose
+audio and sidecar are already cached are skipped, and every finished phrase
+is appended to a state file so an interrupted run resumes where it stopped.
+Ends with a throughput summary and a manifest of the cache keys produced.
+
+Safe to run next to a live server: the cache is opened in shared mode, so
+this process never evicts files the server may be serving and merges its new
+entries into the server's .cache_index.json instead of overwriting it. The
+byte budget is enforced by the server on its next write.
+
+Manifests:
+    phrases.txt     one phrase per line (blank lines and # comments ignored)
+    phrases.jsonl   one {"text": ...} object per line (extra fields are kept,
+                    e.g. the output of mine_phrases.py)
+
+Usage:
+    python precache_voices.py                                 # COMMON_PHRASES with SoVITS
+    python precache_voices.py phrases.txt --engine cartesia --concurrency 8
+    python precache_voices.py phrases.jsonl --lip-sync-mode aligned --output keys.json
 """
+import argparse
 import asyncio
+import json
+import time
 from pathlib import Path
-from tts_sovits import MonaTTSSoVITS
+from typing import Any, Dict, List, Optional
+
+from audio_cache import get_audio_cache
+from lip_sync import LIP_SYNC_MODES, get_mp3_duration, get_wav_duration, shutdown_lip_sync_executor
+from text_utils import preprocess_tts_text
+from tts_manager import ENGINES
 
 # Common phrases Mona says frequently
 COMMON_PHRASES = [
@@ -35,59 +64,223 @@ COMMON_PHRASES = [
     "Talk to you soon!",
 ]
 
+DONE_STATUSES = ("synthesized", "cached")
+
+
+def load_manifest(path: Optional[str]) -> List[Dict[str, Any]]:
+    """Read phrases as dicts with at least a "text" field (deduplicated, in order)."""
+    if not path:
+        entries = [{"text": phrase} for phrase in COMMON_PHRASES]
+    elif path.endswith(".jsonl"):
+        entries = [json.loads(line) for line in Path(path).read_text().splitlines() if line.strip()]
+    else:
+        entries = [
+            {"text": line.strip()}
+            for line in Path(path).read_text().splitlines()
+            if line.strip() and not line.lstrip().startswith("#")
+        ]
+
+    seen = set()
+    unique = []
+    for entry in entries:
+        text = entry.get("text", "").strip()
+        if text and text not in seen:
+            seen.add(text)
+            unique.append(entry)
+    return unique
+
+
+def load_state(path: Path) -> Dict[str, Dict[str, Any]]:
+    """Results from earlier runs, by phrase text (last record wins)."""
+    state: Dict[str, Dict[str, Any]] = {}
+    if not path.exists():
+        return state
+    for line in path.read_text().splitlines():
+        try:
+            record = json.loads(line)
+            state[record["text"]] = record
+        except (json.JSONDecodeError, KeyError):
+            continue  # Torn last line from an interrupted run
+    return state
+
+
+def build_engine(name: str):
+    """Create an engine the same way the server does (configured from the environment)."""
+    if name == "sovits":
+        from tts_sovits import MonaTTSSoVITS
+        return MonaTTSSoVITS()
+    if name == "fishspeech":
+        from tts_fishspeech import MonaTTSFishSpeech
+        return MonaTTSFishSpeech()
+    if name == "cartesia":
+        from tts_cartesia import MonaTTSCartesia
+        return MonaTTSCartesia()
+    from tts import MonaTTS
+    return MonaTTS(voice="nova", model="tts-1")
+
+
+def audio_duration(path: Path) -> float:
+    if path.suffix == ".mp3":
+        return get_mp3_duration(str(path))
+    if path.suffix == ".wav":
+        return get_wav_duration(str(path))
+    return 0.0
+
+
+class Precacher:
+    """Synthesizes manifest entries with bounded concurrency and records the results."""
+
+    def __init__(self, engine, engine_name: str, concurrency: int, lip_sync_mode: Optional[str], state_path: Path):
+        self.engine = engine
+        self.engine_name = engine_name
+        self.cache = engine.cache
+        self.ext = engine.output_format
+        # MP3 engines only produce text-timed cues
+        self.lip_sync_mode = lip_sync_mode if self.ext == "wav" or lip_sync_mode is None else "textbased"
+        self.state_path = state_path
+        self._semaphore = asyncio.Semaphore(concurrency)
 
-async def precache_all_phrases():
-    """Generate and cache all common phrases"""
-    print("🎤 Starting voice pre-caching for Mona...")
-    print(f"📝 {len(COMMON_PHRASES)} phrases to generate\n")
+        self.done = 0
+        self.total = 0
+        self.audio_seconds = 0.0
+        self.audio_bytes = 0
 
-    # Initialize TTS (will use local server if running, otherwise skip)
+    def _cache_key(self, text: str) -> Optional[str]:
+        # Same text path as the server: preprocess_tts_text, then the engine's own cleaning
+        return self.engine.cache_key(preprocess_tts_text(text))
+
+    def _cached_audio(self, key: str) -> Optional[Path]:
+        for ext in (self.ext, "ogg") if self.ext == "wav" else (self.ext,):
+            path = self.cache.audio_path(key, ext)
+            if path.exists():
+                return path
+        return None
+
+    def _is_cached(self, key: str) -> bool:
+        if self._cached_audio(key) is None:
+            return False
+        return self.lip_sync_mode is None or self.cache.lip_sync_path(key, self.lip_sync_mode).exists()
+
+    def _record(self, record: Dict[str, Any]):
+        with self.state_path.open("a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    async def run_one(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        text = entry["text"]
+        key = self._cache_key(text)
+        record: Dict[str, Any] = {**entry, "engine": self.engine_name, "key": key}
+        if key is None:
+            record["status"] = "empty"
+        elif self._is_cached(key):
+            record["status"] = "cached"
+        else:
+            async with self._semaphore:
+                start = time.perf_counter()
+                try:
+                    # use_cache=True: audio cached without a sidecar only needs the sidecar rebuilt
+                    audio_path, _lip_sync = await self.engine.generate_speech(
+                        preprocess_tts_text(text),
+                        generate_lip_sync=self.lip_sync_mode is not None,
+                        lip_sync_mode=self.lip_sync_mode or "textbased",
+                    )
+                except Exception as e:
+                    audio_path = None
+                    record["error"] = str(e)
+                record["ms"] = round((time.perf_counter() - start) * 1000)
+            record["status"] = "synthesized" if audio_path else "failed"
+
+        audio = self._cached_audio(key) if key and record["status"] in DONE_STATUSES else None
+        if audio is not None:
+            record["file"] = audio.name
+            if record["status"] == "synthesized":
+                self.audio_bytes += audio.stat().st_size
+                self.audio_seconds += audio_duration(audio)
+
+        self._record(record)
+        self.done += 1
+        mark = {"synthesized": "✓", "cached": "·", "empty": "-", "failed": "✗"}[record["status"]]
+        print(f"[{self.done}/{self.total}] {mark} {record['status']:<11} {text[:50]}")
+        return record
+
+    async def run(self, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        self.total = len(entries)
+        return await asyncio.gather(*(self.run_one(entry) for entry in entries))
+
+
+async def precache(args) -> int:
+    entries = load_manifest(args.manifest)
+    state_path = Path(args.state or f"precache_state.{args.engine}.jsonl")
+    state = load_state(state_path)
+
+    # Before the engine grabs the cache: no evictions, merge-on-flush index
+    get_audio_cache(shared=True)
     try:
-        tts = MonaTTSSoVITS(
-            sovits_url="http://127.0.0.1:9880/tts",  # Use local server
-            ref_audio_path="/Users/vevocube/Desktop/ProjectMona/mona-brain/assets/mona_voice/main_sample.wav",
-        )
+        engine = build_engine(args.engine)
     except Exception as e:
-        print(f"❌ Could not initialize TTS: {e}")
-        print("Make sure GPT-SoVITS server is running on port 9880")
-        return
+        print(f"❌ Could not initialize {args.engine}: {e}")
+        return 1
+    if getattr(engine, "mock_mode", False):
+        print(f"❌ {args.engine} is in mock mode (check its URL / API key) - nothing to cache")
+        return 1
 
-    success_count = 0
-    failed = []
+    # Resume: phrases finished by an earlier run are carried over as-is
+    finished = [state[e["text"]] for e in entries if state.get(e["text"], {}).get("status") in DONE_STATUSES]
+    pending = [e for e in entries if state.get(e["text"], {}).get("status") not in DONE_STATUSES]
 
-    for i, phrase in enumerate(COMMON_PHRASES, 1):
-        print(f"[{i}/{len(COMMON_PHRASES)}] Generating: {phrase[:50]}...")
+    lip_sync_mode = None if args.no_lip_sync else args.lip_sync_mode
+    print(f"🎤 Pre-caching {len(entries)} phrases with {args.engine} (concurrency {args.concurrency}, lip sync: {lip_sync_mode or 'off'})")
+    if finished:
+        print(f"   Resuming: {len(finished)} already done in {state_path}")
 
-        try:
-            audio_path = await tts.generate_speech(phrase, use_cache=False)
-            if audio_path:
-                print(f"  ✓ Cached to: {Path(audio_path).name}")
-                success_count += 1
-            else:
-                print(f"  ✗ Failed (no audio returned)")
-                failed.append(phrase)
-        except Exception as e:
-            print(f"  ✗ Failed: {e}")
-            failed.append(phrase)
-
-        # Small delay to avoid overwhelming the server
-        await asyncio.sleep(0.5)
-
-    print("\n" + "="*60)
-    print(f"✅ Pre-caching complete!")
-    print(f"   Success: {success_count}/{len(COMMON_PHRASES)}")
-
-    if failed:
-        print(f"   Failed: {len(failed)}")
-        print("\nFailed phrases:")
-        for phrase in failed:
-            print(f"   - {phrase[:50]}...")
-
-    # Show cache stats
-    cache_size_mb = tts.get_cache_size() / (1024 * 1024)
-    print(f"\n📦 Total cache size: {cache_size_mb:.2f} MB")
-    print(f"📁 Cache location: {tts.audio_dir}")
+    precacher = Precacher(engine, args.engine, args.concurrency, lip_sync_mode, state_path)
+    start = time.perf_counter()
+    try:
+        results = await precacher.run(pending)
+    finally:
+        engine.cache.flush()
+        if hasattr(engine, "close"):
+            await engine.close()
+        shutdown_lip_sync_executor()
+    elapsed = time.perf_counter() - start
+
+    by_status: Dict[str, int] = {}
+    for record in results:
+        by_status[record["status"]] = by_status.get(record["status"], 0) + 1
+    synthesized = by_status.get("synthesized", 0)
+
+    print("\n" + "=" * 60)
+    print(f"✅ Done in {elapsed:.1f}s: " + ", ".join(f"{n} {s}" for s, n in sorted(by_status.items())))
+    if synthesized and elapsed > 0:
+        print(f"   Throughput: {synthesized / elapsed:.2f} phrases/s, "
+              f"{precacher.audio_seconds / elapsed:.1f}s of audio per second, "
+              f"{precacher.audio_bytes / (1024 * 1024) / elapsed:.2f} MB/s")
+    for record in results:
+        if record["status"] == "failed":
+            print(f"   ✗ {record['text'][:50]} {record.get('error', '')}")
+
+    manifest = [
+        {"text": r["text"], "engine": r["engine"], "key": r["key"], "file": r.get("file")}
+        for r in finished + results
+        if r["status"] in DONE_STATUSES
+    ]
+    Path(args.output).write_text(json.dumps(manifest, indent=2, ensure_ascii=False))
+    print(f"📝 {len(manifest)} cache keys written to {args.output}")
+    print(f"📁 Cache location: {engine.audio_dir}")
+    return 1 if by_status.get("failed") else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-cache Mona phrases into the audio cache")
+    parser.add_argument("manifest", nargs="?", help="Phrase manifest (.txt or .jsonl); defaults to COMMON_PHRASES")
+    parser.add_argument("--engine", choices=ENGINES, default="sovits", help="TTS engine to synthesize with")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="Phrases synthesized at the same time")
+    parser.add_argument("--lip-sync-mode", choices=LIP_SYNC_MODES, default="textbased", help="Lip sync sidecar to generate")
+    parser.add_argument("--no-lip-sync", action="store_true", help="Skip lip sync sidecars")
+    parser.add_argument("--state", help="Resume file (default: precache_state.<engine>.jsonl)")
+    parser.add_argument("-o", "--output", default="precache_manifest.json", help="Where to write the key manifest")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(precache(args)))
 
 
 if __name__ == "__main__":
-    asyncio.run(precache_all_phrases())
+    main()
@@ -0,0 +1,11 @@
+"""
+Shared setup for the mona-brain unit tests.
+
+Run from the repo root or mona-brain/:
+    python -m pytest mona-brain/tests -q
+"""
+import sys
+from pathlib import Path
+
+# The backend modules import each other by bare name (run from mona-brain/)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
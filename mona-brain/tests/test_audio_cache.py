@@ -0,0 +1,254 @@
+"""AudioCache: byte budget eviction, single-flight misses, shared-mode index merges."""
+import asyncio
+import json
+import time
+
+import pytest
+
+from audio_cache import AudioCache
+
+
+def make_cache(tmp_path, **kwargs) -> AudioCache:
+    kwargs.setdefault("opus", False)
+    return AudioCache(str(tmp_path), **kwargs)
+
+
+def put_all(cache: AudioCache, keys, size: int = 100):
+    for key in keys:
+        cache.put(key, "wav", b"x" * size)
+        time.sleep(0.002)  # Distinct last_access per key
+
+
+# ----------------------------------------------------------------------
+# Eviction
+# ----------------------------------------------------------------------
+
+def test_lru_evicts_least_recently_used(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=300, policy="lru")
+    put_all(cache, "abc")
+    assert cache.get("a", "wav") is not None  # a is now the most recent
+
+    cache.put("d", "wav", b"x" * 100)
+
+    assert sorted(cache._index) == ["a", "c", "d"]
+    assert not (tmp_path / "b.wav").exists()
+    assert cache.total_bytes() == 300
+    assert cache.evictions == 1
+
+
+def test_lfu_evicts_least_frequently_used(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=300, policy="lfu")
+    put_all(cache, "abc")
+    for _ in range(3):
+        cache.get("a", "wav")
+    cache.get("b", "wav")
+
+    cache.put("d", "wav", b"x" * 100)
+
+    assert sorted(cache._index) == ["a", "b", "d"]
+    assert not (tmp_path / "c.wav").exists()
+
+
+def test_new_entry_is_never_its_own_victim(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=250, policy="lru")
+    put_all(cache, "ab")
+
+    cache.put("big", "wav", b"x" * 200)
+
+    assert "big" in cache._index
+    assert (tmp_path / "big.wav").exists()
+    assert cache.total_bytes() <= 250
+
+
+def test_eviction_removes_sidecars_with_the_audio(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=350, policy="lru")
+    cache.put("a", "wav", b"x" * 100)
+    cache.save_lip_sync("a", [{"start": 0.0, "end": 0.5, "shape": "A", "phonemes": {}}])
+    time.sleep(0.002)
+    put_all(cache, "bcd")
+
+    assert "a" not in cache._index
+    assert not (tmp_path / "a.wav").exists()
+    assert not (tmp_path / "a.lipsync.json").exists()
+
+
+def test_recency_order_survives_a_reload(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=10_000, policy="lru")
+    put_all(cache, "abc")
+    cache.get("a", "wav")
+    cache.flush()
+
+    reloaded = make_cache(tmp_path, max_bytes=300, policy="lru")
+    reloaded.put("d", "wav", b"x" * 100)
+
+    assert sorted(reloaded._index) == ["a", "c", "d"]
+
+
+def test_async_put_evicts_and_flushes_lazily(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=200, policy="lru")
+
+    async def run():
+        for key in "abc":
+            await cache.aput(key, "wav", b"x" * 100)
+
+    asyncio.run(run())
+    assert sorted(cache._index) == ["b", "c"]
+    assert cache._dirty  # Written on the flush interval (or shutdown), not per put
+
+    cache.flush()
+    on_disk = json.loads((tmp_path / ".cache_index.json").read_text())
+    assert sorted(on_disk) == ["b", "c"]
+
+
+# ----------------------------------------------------------------------
+# Lookups and engine ownership
+# ----------------------------------------------------------------------
+
+def test_lookup_adopts_foreign_files_and_counts_hits(tmp_path):
+    cache = make_cache(tmp_path)
+    (tmp_path / "k.mp3").write_bytes(b"y" * 50)
+
+    assert cache.get("missing", "wav") is None
+    hit = cache.get("k", "mp3")
+
+    assert hit is not None and hit[0] == tmp_path / "k.mp3"
+    assert cache.total_bytes() == 50
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_unclaimed_entries_count_for_matching_engine_formats(tmp_path):
+    (tmp_path / "w.wav").write_bytes(b"x" * 10)
+    (tmp_path / "m.mp3").write_bytes(b"x" * 20)
+    cache = make_cache(tmp_path)  # Index rebuilt by scanning: no engine known
+
+    assert cache.total_bytes(engine="sovits") == 0
+    assert cache.total_bytes(engine="sovits", exts=("wav",)) == 10
+    assert cache.total_bytes(engine="openai", exts=("mp3",)) == 20
+
+    # A lookup by an engine claims the entry for it
+    asyncio.run(cache.aget("w", "wav", engine="cartesia"))
+    assert cache.total_bytes(engine="sovits", exts=("wav",)) == 0
+    assert cache.total_bytes(engine="cartesia") == 10
+
+    assert cache.clear(engine="openai", exts=("mp3",)) == 1
+    assert not (tmp_path / "m.mp3").exists()
+    assert (tmp_path / "w.wav").exists()
+
+
+# ----------------------------------------------------------------------
+# Single flight
+# ----------------------------------------------------------------------
+
+def test_single_flight_coalesces_concurrent_misses(tmp_path):
+    cache = make_cache(tmp_path)
+    calls = 0
+
+    async def synthesize():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "audio"
+
+    async def run():
+        return await asyncio.gather(*(cache.single_flight("k", None, synthesize) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["audio"] * 5
+    assert calls == 1
+    assert cache.coalesced == 4
+    assert cache._inflight == {}
+
+
+def test_single_flight_keeps_lip_sync_variants_apart(tmp_path):
+    cache = make_cache(tmp_path)
+    calls = []
+
+    async def synthesize(variant):
+        calls.append(variant)
+        await asyncio.sleep(0.01)
+        return variant
+
+    async def run():
+        return await asyncio.gather(
+            cache.single_flight("k", None, lambda: synthesize(None)),
+            cache.single_flight("k", "aligned", lambda: synthesize("aligned")),
+        )
+
+    assert asyncio.run(run()) == [None, "aligned"]
+    assert len(calls) == 2
+
+
+def test_single_flight_survives_one_waiter_cancelling(tmp_path):
+    cache = make_cache(tmp_path)
+
+    async def synthesize():
+        await asyncio.sleep(0.05)
+        return "audio"
+
+    async def run():
+        first = asyncio.create_task(cache.single_flight("k", None, synthesize))
+        second = asyncio.create_task(cache.single_flight("k", None, synthesize))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "audio"
+
+
+def test_single_flight_cancels_synthesis_when_last_waiter_leaves(tmp_path):
+    cache = make_cache(tmp_path)
+    cancelled = False
+
+    async def synthesize():
+        nonlocal cancelled
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+
+    async def run():
+        waiter = asyncio.create_task(cache.single_flight("k", None, synthesize))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert cancelled
+    assert cache._inflight == {}
+
+
+# ----------------------------------------------------------------------
+# Shared mode
+# ----------------------------------------------------------------------
+
+def test_shared_instance_merges_into_the_owners_index(tmp_path):
+    server = make_cache(tmp_path)
+    server.put("s1", "wav", b"x" * 10)
+    server.flush()
+
+    tool = make_cache(tmp_path, shared=True, max_bytes=1)
+    tool.put("t1", "mp3", b"y" * 20)
+    tool.flush()
+
+    on_disk = json.loads((tmp_path / ".cache_index.json").read_text())
+    assert sorted(on_disk) == ["s1", "t1"]
+    # Shared instances never evict, whatever their budget
+    assert (tmp_path / "t1.mp3").exists()
+    assert tool.evictions == 0
+
+
+def test_shared_flush_keeps_entries_written_after_it_loaded(tmp_path):
+    server = make_cache(tmp_path)
+    tool = make_cache(tmp_path, shared=True)
+
+    server.put("s1", "wav", b"x" * 10)
+    server.flush()
+    tool.put("t1", "mp3", b"y" * 20)
+    tool.flush()
+
+    on_disk = json.loads((tmp_path / ".cache_index.json").read_text())
+    assert sorted(on_disk) == ["s1", "t1"]
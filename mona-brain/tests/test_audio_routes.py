@@ -0,0 +1,93 @@
+"""/audio/<key>.<ext>: caching headers, ETag revalidation and byte ranges."""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import audio_routes
+from audio_cache import AudioCache
+
+BODY = bytes(range(256)) * 4  # 1024 distinct-ish bytes
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    cache = AudioCache(str(tmp_path), opus=False)
+    (tmp_path / "abc123.wav").write_bytes(BODY)
+    monkeypatch.setattr(audio_routes, "get_audio_cache", lambda: cache)
+    app = FastAPI()
+    app.include_router(audio_routes.router)
+    return TestClient(app)
+
+
+def test_full_response_is_immutable_with_an_etag(client):
+    response = client.get("/audio/abc123.wav")
+
+    assert response.status_code == 200
+    assert response.content == BODY
+    assert response.headers["content-type"] == "audio/wav"
+    assert response.headers["content-length"] == str(len(BODY))
+    assert response.headers["cache-control"] == audio_routes.CACHE_CONTROL
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["etag"].startswith('"abc123-')
+
+
+def test_head_sends_headers_only(client):
+    response = client.head("/audio/abc123.wav")
+
+    assert response.status_code == 200
+    assert response.content == b""
+    assert response.headers["content-length"] == str(len(BODY))
+
+
+def test_matching_etag_is_not_modified(client):
+    etag = client.get("/audio/abc123.wav").headers["etag"]
+
+    assert client.get("/audio/abc123.wav", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/audio/abc123.wav", headers={"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+    assert client.get("/audio/abc123.wav", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+@pytest.mark.parametrize("range_header, start, end", [
+    ("bytes=0-99", 0, 99),
+    ("bytes=1000-", 1000, 1023),
+    ("bytes=-24", 1000, 1023),
+    ("bytes=1000-5000", 1000, 1023),  # End is clamped to the file
+])
+def test_single_range_is_partial_content(client, range_header, start, end):
+    response = client.get("/audio/abc123.wav", headers={"Range": range_header})
+
+    assert response.status_code == 206
+    assert response.content == BODY[start:end + 1]
+    assert response.headers["content-range"] == f"bytes {start}-{end}/{len(BODY)}"
+    assert response.headers["content-length"] == str(end - start + 1)
+
+
+@pytest.mark.parametrize("range_header", ["bytes=1024-", "bytes=2000-3000", "bytes=50-10", "bytes=-0"])
+def test_unsatisfiable_range_is_416(client, range_header):
+    response = client.get("/audio/abc123.wav", headers={"Range": range_header})
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(BODY)}"
+
+
+def test_multi_range_falls_back_to_the_whole_file(client):
+    response = client.get("/audio/abc123.wav", headers={"Range": "bytes=0-1,5-6"})
+
+    assert response.status_code == 200
+    assert response.content == BODY
+
+
+def test_stale_if_range_ignores_the_range(client):
+    etag = client.get("/audio/abc123.wav").headers["etag"]
+
+    fresh = client.get("/audio/abc123.wav", headers={"Range": "bytes=0-9", "If-Range": etag})
+    stale = client.get("/audio/abc123.wav", headers={"Range": "bytes=0-9", "If-Range": '"old"'})
+
+    assert fresh.status_code == 206
+    assert stale.status_code == 200
+    assert stale.content == BODY
+
+
+@pytest.mark.parametrize("path", ["/audio/missing.wav", "/audio/abc123.lipsync.json", "/audio/abc123.txt"])
+def test_unknown_or_non_audio_files_are_404(client, path):
+    assert client.get(path).status_code == 404
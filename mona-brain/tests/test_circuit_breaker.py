@@ -0,0 +1,124 @@
+"""CircuitBreaker state transitions: closed -> open -> half_open -> closed/open."""
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(circuit_breaker.time, "time", fake.time)
+    return fake
+
+
+def make_breaker(**kwargs) -> CircuitBreaker:
+    defaults = dict(failure_threshold=3, error_rate_threshold=0.5, min_requests=6, window_seconds=60, cooldown_seconds=30)
+    defaults.update(kwargs)
+    return CircuitBreaker("test", **defaults)
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = make_breaker()
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure(error="boom")
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    assert breaker.snapshot()["last_error"] == "boom"
+
+
+def test_success_resets_the_consecutive_count(clock):
+    breaker = make_breaker()
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.consecutive_failures == 1
+
+
+def test_opens_on_error_rate_once_the_window_has_enough_requests(clock):
+    breaker = make_breaker(failure_threshold=100)
+    for _ in range(3):
+        breaker.record_success()
+        breaker.record_failure(timeout=True)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    snapshot = breaker.snapshot()
+    assert snapshot["window_requests"] == 6
+    assert snapshot["window_timeouts"] == 3
+
+
+def test_old_events_leave_the_window(clock):
+    breaker = make_breaker(failure_threshold=100)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 61
+    breaker.record_failure()
+
+    # Only one event left in the window - below min_requests
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.snapshot()["window_requests"] == 1
+
+
+def test_half_open_allows_a_single_trial(clock):
+    breaker = make_breaker(failure_threshold=1)
+    breaker.record_failure()
+    clock.now += 29
+    assert not breaker.allow_request()
+
+    clock.now += 1
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()  # Trial already in flight
+
+
+def test_successful_trial_closes(clock):
+    breaker = make_breaker(failure_threshold=1)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow_request()
+
+    breaker.record_success()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.opened_at is None
+    assert breaker.allow_request()
+
+
+def test_failed_trial_reopens_with_a_fresh_cooldown(clock):
+    breaker = make_breaker(failure_threshold=1)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opened_at == clock.now
+    assert not breaker.allow_request()
+
+
+def test_released_trial_can_be_retried(clock):
+    breaker = make_breaker(failure_threshold=1)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow_request()
+
+    breaker.release_trial()  # Caller was cancelled before an outcome
+
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
@@ -0,0 +1,134 @@
+"""Lip sync wire format and audio duration parsing."""
+import base64
+import struct
+
+import pytest
+
+from lip_sync import (
+    SHAPE_ORDER,
+    SHAPE_TO_VRM,
+    VRM_CHANNELS,
+    decode_lip_sync_compact,
+    encode_lip_sync_compact,
+    format_lip_sync,
+    generate_lip_sync_from_text,
+    get_mp3_duration_from_bytes,
+    get_wav_duration_from_bytes,
+)
+
+
+# ----------------------------------------------------------------------
+# Compact cues
+# ----------------------------------------------------------------------
+
+def test_compact_round_trip_restores_the_cues():
+    cues = generate_lip_sync_from_text("Hello there, how are you doing today?", 2.4)
+    assert cues
+
+    compact = encode_lip_sync_compact(cues)
+    assert len(compact["t"]) == len(compact["s"]) == len(cues)
+    assert compact["end"] == cues[-1]["end"]
+
+    assert decode_lip_sync_compact(compact) == cues
+
+
+def test_compact_round_trip_covers_every_shape():
+    cues = [
+        {"start": i * 0.1, "end": (i + 1) * 0.1, "shape": shape, "phonemes": SHAPE_TO_VRM[shape]}
+        for i, shape in enumerate(SHAPE_ORDER)
+    ]
+    assert decode_lip_sync_compact(encode_lip_sync_compact(cues)) == cues
+
+
+def test_unknown_shapes_decode_as_silence():
+    decoded = decode_lip_sync_compact({"t": [0.0, 0.2], "s": [0, 99], "end": 0.5})
+
+    assert [cue["shape"] for cue in decoded] == ["A", "X"]
+    assert decoded[-1]["end"] == 0.5
+
+
+def test_empty_cues():
+    assert encode_lip_sync_compact([]) == {"t": [], "s": [], "end": 0.0}
+    assert decode_lip_sync_compact({"t": [], "s": [], "end": 0.0}) == []
+
+
+def test_curve_has_one_frame_per_tick():
+    cues = [
+        {"start": 0.0, "end": 0.5, "shape": "D", "phonemes": SHAPE_TO_VRM["D"]},
+        {"start": 0.5, "end": 1.0, "shape": "X", "phonemes": SHAPE_TO_VRM["X"]},
+    ]
+    compact = encode_lip_sync_compact(cues, curve_fps=10)
+
+    values = struct.unpack(f"<{len(base64.b64decode(compact['curve'])) // 4}f", base64.b64decode(compact["curve"]))
+    frames = [values[i:i + len(VRM_CHANNELS)] for i in range(0, len(values), len(VRM_CHANNELS))]
+    assert compact["fps"] == 10
+    assert len(frames) == 11
+    assert frames[0] == pytest.approx([SHAPE_TO_VRM["D"][c] for c in VRM_CHANNELS])
+    assert frames[-1] == pytest.approx([SHAPE_TO_VRM["X"][c] for c in VRM_CHANNELS])
+
+
+def test_format_lip_sync_only_compacts_on_request():
+    cues = generate_lip_sync_from_text("Hi!", 0.6)
+
+    assert format_lip_sync(cues, "full") is cues
+    assert format_lip_sync(cues, "compact") == encode_lip_sync_compact(cues)
+    assert format_lip_sync(None, "compact") is None
+
+
+# ----------------------------------------------------------------------
+# Durations
+# ----------------------------------------------------------------------
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, joint stereo: 417-byte frames of 1152 samples
+MPEG1_HEADER = bytes([0xFF, 0xFB, 0x90, 0x40])
+MPEG1_FRAME = 417
+# MPEG-2 Layer III, 64 kbps, 22.05 kHz, mono: 208-byte frames of 576 samples
+MPEG2_HEADER = bytes([0xFF, 0xF3, 0x80, 0xC0])
+MPEG2_FRAME = 208
+
+
+def mp3_frames(header: bytes, frame_length: int, count: int) -> bytes:
+    return (header + bytes(frame_length - 4)) * count
+
+
+def test_mp3_cbr_duration_sums_frames():
+    data = mp3_frames(MPEG1_HEADER, MPEG1_FRAME, 100)
+    assert get_mp3_duration_from_bytes(data) == pytest.approx(100 * 1152 / 44100)
+
+
+def test_mp3_mpeg2_mono_duration():
+    data = mp3_frames(MPEG2_HEADER, MPEG2_FRAME, 50)
+    assert get_mp3_duration_from_bytes(data) == pytest.approx(50 * 576 / 22050)
+
+
+def test_mp3_skips_id3_tag_and_leading_junk():
+    tag_body = bytes(300)
+    size = len(tag_body)
+    id3 = b"ID3\x04\x00\x00" + bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F])
+    data = id3 + tag_body + b"\x00\x01junk" + mp3_frames(MPEG1_HEADER, MPEG1_FRAME, 20)
+
+    assert get_mp3_duration_from_bytes(data) == pytest.approx(20 * 1152 / 44100)
+
+
+def test_mp3_xing_frame_count_wins():
+    # Xing header sits after the 32-byte side info of an MPEG-1 stereo frame
+    first = bytearray(MPEG1_HEADER + bytes(MPEG1_FRAME - 4))
+    first[36:48] = b"Xing" + struct.pack(">II", 0x01, 5000)
+    data = bytes(first) + mp3_frames(MPEG1_HEADER, MPEG1_FRAME, 3)
+
+    assert get_mp3_duration_from_bytes(data) == pytest.approx(5000 * 1152 / 44100)
+
+
+def test_mp3_without_frames_is_zero():
+    assert get_mp3_duration_from_bytes(b"not an mp3 at all") == 0.0
+
+
+def test_wav_duration_from_header():
+    rate, channels, samples = 24000, 1, 12000
+    pcm = bytes(samples * channels * 2)
+    header = (
+        b"RIFF" + struct.pack("<I", 36 + len(pcm)) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, rate, rate * channels * 2, channels * 2, 16)
+        + b"data" + struct.pack("<I", len(pcm))
+    )
+    assert get_wav_duration_from_bytes(header + pcm) == pytest.approx(0.5)
@@ -0,0 +1,109 @@
+"""Token-budgeted history window: trimming, hysteresis and per-message token caching."""
+import pytest
+
+import llm
+from llm import CONTEXT_TRIM_RATIO, IMAGE_TOKENS, MESSAGE_OVERHEAD_TOKENS, ConversationMessage, MonaLLM
+
+WORDS = "w" * 396  # 99 tokens at the chars/4 estimate
+MESSAGE_TOKENS = MESSAGE_OVERHEAD_TOKENS + 99
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # Deterministic counts whether or not the tiktoken encoding is available
+    monkeypatch.setattr(llm, "_encoding", None)
+
+
+def make_llm(**kwargs) -> MonaLLM:
+    return MonaLLM(api_key="test-key", **kwargs)
+
+
+def make_history(turns: int, content: str = WORDS):
+    conversation = [ConversationMessage(role="system", content="persona")]
+    for i in range(turns):
+        conversation.append(ConversationMessage(role="user" if i % 2 == 0 else "assistant", content=f"{i:02d}{content[2:]}"))
+    return conversation
+
+
+def prompt_tokens(conversation, context_prompt: str) -> int:
+    return MESSAGE_OVERHEAD_TOKENS + llm.count_tokens(context_prompt) + sum(m.token_count() for m in conversation)
+
+
+def test_under_budget_keeps_everything():
+    bot = make_llm(max_context_tokens=10_000)
+    conversation = make_history(6)
+
+    assert bot._trim_history(conversation, "context") == []
+    assert len(conversation) == 7
+
+
+def test_over_budget_trims_oldest_turns_to_the_trim_ratio():
+    budget = 1_000
+    bot = make_llm(max_context_tokens=budget, max_history=100)
+    conversation = make_history(12)  # ~1250 tokens
+    newest = conversation[-1]
+
+    trimmed = bot._trim_history(conversation, "context")
+
+    assert [m.content[:2] for m in trimmed] == [f"{i:02d}" for i in range(len(trimmed))]
+    assert conversation[0].role == "system"
+    assert conversation[-1] is newest
+    assert prompt_tokens(conversation, "context") <= budget * CONTEXT_TRIM_RATIO
+    # Not trimmed further than needed: one more message would exceed the target
+    assert prompt_tokens(conversation, "context") + MESSAGE_TOKENS > budget * CONTEXT_TRIM_RATIO
+
+
+def test_trimming_leaves_headroom_for_the_next_turns():
+    bot = make_llm(max_context_tokens=1_000, max_history=100)
+    conversation = make_history(12)
+    bot._trim_history(conversation, "context")
+    size = len(conversation)
+
+    # The prefix stays put while new turns fit in the headroom
+    conversation.append(ConversationMessage(role="user", content=WORDS))
+    assert bot._trim_history(conversation, "context") == []
+    assert len(conversation) == size + 1
+
+
+def test_message_cap_applies_with_tokens_to_spare():
+    bot = make_llm(max_context_tokens=100_000, max_history=10)
+    conversation = make_history(11, content="short")
+
+    trimmed = bot._trim_history(conversation, "context")
+
+    assert len(conversation) == int(10 * CONTEXT_TRIM_RATIO)
+    assert len(trimmed) == 12 - len(conversation)
+
+
+def test_system_prompt_and_newest_message_always_survive():
+    bot = make_llm(max_context_tokens=50, max_history=100)
+    conversation = make_history(3, content=WORDS * 3)
+
+    bot._trim_history(conversation, "context")
+
+    assert [m.role for m in conversation] == ["system", "user"]
+    assert conversation[-1].content.startswith("02")
+
+
+def test_context_prompt_counts_against_the_budget():
+    bot = make_llm(max_context_tokens=1_000, max_history=100)
+    conversation = make_history(8)  # ~830 tokens
+
+    assert bot._trim_history(conversation, "") == []
+    assert bot._trim_history(conversation, "c" * 800) != []
+
+
+def test_token_count_is_cached_and_counts_images():
+    message = ConversationMessage(role="user", content=WORDS, image_url="data:image/png;base64,AAAA")
+
+    assert message.token_count() == MESSAGE_TOKENS + IMAGE_TOKENS
+    assert message.to_api() is message.to_api()
+    assert message.to_api()["content"][1]["image_url"]["url"].startswith("data:image/png")
+
+    message.replace_image("a cat on a sofa")
+    message.replace_image("a ginger cat on a sofa")  # e.g. placeholder patched with the caption
+
+    assert message.image_url is None
+    assert message.content == f"{WORDS}\n[Image: a ginger cat on a sofa]"
+    assert message.token_count() == MESSAGE_OVERHEAD_TOKENS + llm.count_tokens(message.content)
+    assert message.to_api() == {"role": "user", "content": message.content}
@@ -0,0 +1,151 @@
+"""analyze_turn: per-field keyword fallbacks when the JSON is missing or malformed."""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from emotion import EmotionType
+from turn_analysis import analyze_turn
+
+
+class FakeClient:
+    """Stands in for AsyncOpenAI: returns a fixed message body, or raises."""
+
+    def __init__(self, content=None, error: Exception = None):
+        self.calls = 0
+        self.content = content
+        self.error = error
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        message = SimpleNamespace(content=self.content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+class FakeEmotion:
+    def __init__(self):
+        self.applied = None
+
+    def analyze_message(self, message):
+        return EmotionType.NEUTRAL
+
+    def apply_emotion(self, emotion):
+        self.applied = emotion
+
+
+class FakeAffection:
+    def __init__(self):
+        self.applied = None
+
+    def keyword_delta(self, message):
+        return 1
+
+    def apply_delta(self, user_id, delta):
+        self.applied = delta
+
+
+class FakeMemory:
+    def __init__(self):
+        self.extracted = None
+
+    def apply_extracted(self, user_id, items):
+        if any("key" not in item for item in items):
+            raise ValueError("memory without a key")
+        self.extracted = items
+        return list(items)
+
+    def process_user_message(self, user_id, message):
+        return ["keyword memory"]
+
+
+def run(client, user_message="I love you, my name is Sam"):
+    engines = dict(emotion_engine=FakeEmotion(), affection_engine=FakeAffection(), memory_manager=FakeMemory())
+    result = asyncio.run(analyze_turn(client, "user-1", user_message, "Aww, hi Sam!", **engines))
+    return result, engines
+
+
+def payload(**fields) -> str:
+    data = {
+        "emotion": "happy",
+        "affection_delta": 7,
+        "memories": [{"key": "name", "value": "Sam", "content": "The user's name is Sam",
+                      "category": "fact", "importance": 90, "confidence": 0.9}],
+    }
+    data.update(fields)
+    return json.dumps(data)
+
+
+def test_valid_analysis_applies_every_field():
+    result, engines = run(FakeClient(payload()))
+
+    assert result["fallbacks"] == []
+    assert engines["emotion_engine"].applied == EmotionType.HAPPY
+    assert engines["affection_engine"].applied == 7
+    assert engines["memory_manager"].extracted[0]["value"] == "Sam"
+
+
+@pytest.mark.parametrize("fields, fallback", [
+    ({"emotion": "ecstatic-ish"}, "emotion"),
+    ({"emotion": None}, "emotion"),
+    ({"affection_delta": "lots"}, "affection"),
+    ({"affection_delta": None}, "affection"),
+    ({"memories": "Sam"}, "memories"),
+    ({"memories": ["Sam"]}, "memories"),
+    ({"memories": [{"value": "Sam"}]}, "memories"),  # Rejected by apply_extracted
+])
+def test_malformed_field_falls_back_alone(fields, fallback):
+    result, engines = run(FakeClient(payload(**fields)))
+
+    assert result["fallbacks"] == [fallback]
+    if fallback != "emotion":
+        assert engines["emotion_engine"].applied == EmotionType.HAPPY
+    if fallback != "affection":
+        assert engines["affection_engine"].applied == 7
+
+
+def test_missing_fields_fall_back():
+    result, _ = run(FakeClient(json.dumps({"emotion": "sad"})))
+
+    assert result["emotion"] == "sad"
+    assert result["fallbacks"] == ["affection", "memories"]
+
+
+def test_affection_delta_is_clamped():
+    result, engines = run(FakeClient(payload(affection_delta=40)))
+
+    assert result["affection_delta"] == 10
+    assert engines["affection_engine"].applied == 10
+
+
+@pytest.mark.parametrize("client", [
+    FakeClient("not json {"),
+    FakeClient(json.dumps(["a", "list"])),
+    FakeClient(None),
+    FakeClient(error=RuntimeError("API down")),
+])
+def test_unusable_response_falls_back_everywhere(client):
+    result, engines = run(client)
+
+    assert result["fallbacks"] == ["emotion", "affection", "memories"]
+    assert engines["emotion_engine"].applied == EmotionType.NEUTRAL
+    assert engines["affection_engine"].applied == 1
+    assert result["memories"] == 1
+
+
+def test_test_command_keeps_keyword_emotion():
+    result, engines = run(FakeClient(payload()), user_message="test: happy")
+
+    assert result["fallbacks"] == ["emotion"]
+    assert engines["affection_engine"].applied == 7
+
+
+def test_empty_message_skips_the_call():
+    client = FakeClient(payload())
+    result, _ = run(client, user_message="   ")
+
+    assert client.calls == 0
+    assert result["fallbacks"] == ["emotion", "affection", "memories"]
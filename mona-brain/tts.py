@@ -2,22 +2,22 @@
 Text-to-Speech integration for Mona using OpenAI TTS API.
 """
 
-import asyncio
-import json
 import os
-import hashlib
 import time
 from pathlib import Path
 from typing import Optional, List, Dict, Any, Tuple
 from openai import AsyncOpenAI
 
-from lip_sync import generate_lip_sync_from_text, get_wav_duration
+from audio_cache import get_audio_cache
+from lip_sync import generate_lip_sync_async, get_mp3_duration_from_bytes
 from analytics import analytics, calculate_tts_cost
 
 
 class MonaTTS:
     """Handles text-to-speech generation for Mona's responses."""
 
+    output_format = "mp3"
+
     def __init__(
         self,
         voice: str = "nova",
@@ -40,25 +40,26 @@ class MonaTTS:
         self.voice = voice
         self.model = model
 
-        # Setup audio cache directory
+        # Shared audio cache (index, byte budget, eviction)
         self.audio_dir = Path(audio_dir)
-        self.audio_dir.mkdir(parents=True, exist_ok=True)
+        self.cache = get_audio_cache(audio_dir)
 
-    def _get_cache_path(self, text: str) -> Path:
-        """Generate cache file path based on text hash."""
-        text_hash = hashlib.md5(f"{text}_{self.voice}_{self.model}".encode()).hexdigest()
-        return self.audio_dir / f"{text_hash}.mp3"
+    def _cache_key(self, text: str) -> str:
+        """Cache key for text with the current voice and model."""
+        return self.cache.make_key(text, self.voice, self.model)
 
-    def _get_lip_sync_cache_path(self, text: str) -> Path:
-        """Generate cache file path for lip sync data."""
-        text_hash = hashlib.md5(f"{text}_{self.voice}_{self.model}".encode()).hexdigest()
-        return self.audio_dir / f"{text_hash}.lipsync.json"
+    def cache_key(self, text: str) -> Optional[str]:
+        """Cache key generate_speech() would use for text, or None if it's empty."""
+        if not text or not text.strip():
+            return None
+        return self._cache_key(text)
 
     async def generate_speech(
         self,
         text: str,
         use_cache: bool = True,
-        generate_lip_sync: bool = True
+        generate_lip_sync: bool = True,
+        lip_sync_mode: str = "textbased",
     ) -> Tuple[Optional[str], Optional[List[Dict[str, Any]]]]:
         """
         Generate speech audio from text.
@@ -67,6 +68,8 @@ class MonaTTS:
             text: Text to convert to speech
             use_cache: Whether to use cached audio if available
             generate_lip_sync: Whether to generate lip sync timing data
+            lip_sync_mode: Accepted for a uniform engine interface - MP3 has no
+                PCM to align against, so cues are always text-timed
 
         Returns:
             Tuple of (path to generated audio file, lip sync data) or (None, None) if failed
@@ -74,25 +77,39 @@ class MonaTTS:
         if not text or not text.strip():
             return None, None
 
-        cache_path = self._get_cache_path(text)
-        lip_sync_cache_path = self._get_lip_sync_cache_path(text)
+        tts_start = time.perf_counter()
+        cache_key = self._cache_key(text)
 
-        # Return cached file if it exists
-        if use_cache and cache_path.exists():
-            print(f"✓ Using cached audio: {cache_path.name}")
-            # Also load cached lip sync if available
-            lip_sync_data = None
-            if lip_sync_cache_path.exists():
-                try:
-                    lip_sync_data = json.loads(lip_sync_cache_path.read_text())
+        # Return cached file if it exists (lip sync is rebuilt if its sidecar is missing)
+        if use_cache:
+            cached = await self.cache.aget(
+                cache_key, "mp3", lip_sync_text=text if generate_lip_sync else None, engine="openai"
+            )
+            if cached:
+                cache_path, lip_sync_data = cached
+                print(f"✓ Using cached audio: {cache_path.name}")
+                if lip_sync_data:
                     print(f"✓ Using cached lip sync data: {len(lip_sync_data)} cues")
-                except Exception:
-                    pass
-            return str(cache_path), lip_sync_data
+                return str(cache_path), lip_sync_data
+
+        if not use_cache:
+            return await self._synthesize(text, cache_key, generate_lip_sync, tts_start)
+        return await self.cache.single_flight(
+            cache_key,
+            generate_lip_sync,
+            lambda: self._synthesize(text, cache_key, generate_lip_sync, tts_start),
+        )
 
+    async def _synthesize(
+        self,
+        text: str,
+        cache_key: str,
+        generate_lip_sync: bool,
+        tts_start: float,
+    ) -> Tuple[Optional[str], Optional[List[Dict[str, Any]]]]:
+        """Synthesize text with OpenAI and store it in the cache."""
         try:
             print(f"⚡ Generating speech for: {text[:50]}...")
-            tts_start = time.perf_counter()
 
             # Get MP3 from OpenAI
             response = await self.client.audio.speech.create(
@@ -100,7 +117,8 @@ class MonaTTS:
                 voice=self.voice,
                 input=text,
             )
-            cache_path.write_bytes(response.content)
+            audio_content = response.content
+            cache_path = await self.cache.aput(cache_key, "mp3", audio_content, engine="openai")
             tts_ms = (time.perf_counter() - tts_start) * 1000
             print(f"✓ OpenAI TTS complete ({tts_ms:.0f}ms)")
 
@@ -115,28 +133,14 @@ class MonaTTS:
 
             lip_sync_data = None
             if generate_lip_sync:
-                # Convert MP3 to WAV temporarily to get duration
-                wav_path = cache_path.with_suffix('.wav')
-                convert_proc = await asyncio.create_subprocess_exec(
-                    'ffmpeg', '-y', '-i', str(cache_path), str(wav_path),
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-                await asyncio.wait_for(convert_proc.communicate(), timeout=30)
-
-                if convert_proc.returncode == 0:
-                    # Get duration and generate text-based lip sync
-                    audio_duration = get_wav_duration(str(wav_path))
-                    if audio_duration > 0:
-                        lip_sync_data = generate_lip_sync_from_text(text, audio_duration)
-                        if lip_sync_data:
-                            lip_sync_cache_path.write_text(json.dumps(lip_sync_data))
-
-                    # Clean up WAV
-                    if wav_path.exists():
-                        wav_path.unlink()
+                # Duration from the MP3 frame headers (no decode, no subprocess)
+                audio_duration = get_mp3_duration_from_bytes(audio_content)
+                if audio_duration > 0:
+                    lip_sync_data = await generate_lip_sync_async(text, audio_duration)
+                    if lip_sync_data:
+                        await self.cache.asave_lip_sync(cache_key, lip_sync_data)
                 else:
-                    print(f"⚠ WAV conversion failed for lip sync")
+                    print(f"⚠ Could not read MP3 duration for lip sync")
 
             return str(cache_path), lip_sync_data
 
@@ -146,26 +150,20 @@ class MonaTTS:
 
     def clear_cache(self) -> int:
         """
-        Clear all cached audio files.
+        Clear all cached OpenAI audio files.
 
         Returns:
             Number of files deleted
         """
-        count = 0
-        for file_path in self.audio_dir.glob("*.mp3"):
-            file_path.unlink()
-            count += 1
+        count = self.cache.clear(engine="openai", exts=("mp3",))
         print(f"✓ Cleared {count} cached audio files")
         return count
 
     def get_cache_size(self) -> int:
         """
-        Get total size of cached audio files in bytes.
+        Get total size of cached OpenAI audio files in bytes.
 
         Returns:
             Total cache size in bytes
         """
-        total_size = sum(
-            file_path.stat().st_size for file_path in self.audio_dir.glob("*.mp3")
-        )
-        return total_size
+        return self.cache.total_bytes(engine="openai", exts=("mp3",))
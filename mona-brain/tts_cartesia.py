@@ -3,16 +3,15 @@ Cartesia TTS Integration for Mona
 Uses Cartesia Sonic API for low-latency, high-quality TTS.
 """
 
-import hashlib
-import json
 import os
 import time
 from pathlib import Path
-from typing import Optional, List, Dict, Any, Tuple
+from typing import Awaitable, Callable, Optional, List, Dict, Any, Tuple
 
 import aiohttp
 
-from lip_sync import generate_lip_sync_from_text, get_wav_duration
+from audio_cache import get_audio_cache
+from lip_sync import fix_streamed_wav_header, generate_lip_sync_for_audio_async, get_wav_duration_from_bytes
 from tts_preprocess import clean_for_tts
 from analytics import analytics, calculate_tts_cost
 
@@ -20,6 +19,8 @@ from analytics import analytics, calculate_tts_cost
 class MonaTTSCartesia:
     """Handles text-to-speech generation using Cartesia Sonic API."""
 
+    output_format = "wav"
+
     def __init__(
         self,
         api_key: str = os.getenv("CARTESIA_API_KEY", ""),
@@ -39,7 +40,7 @@ class MonaTTSCartesia:
             print(f"Cartesia initialized with model: {model_id}, voice: {voice_id}")
 
         self.audio_dir = Path(audio_dir)
-        self.audio_dir.mkdir(parents=True, exist_ok=True)
+        self.cache = get_audio_cache(audio_dir)
         self._warmed_up = False
 
         # Connection pooling - reuse TCP connections for lower latency
@@ -65,30 +66,67 @@ class MonaTTSCartesia:
             await self._session.close()
             self._session = None
 
-    async def warmup(self) -> bool:
-        """Mark as warmed up (no pre-warming needed for API)."""
-        if self._warmed_up:
+    async def warmup(self, force: bool = False) -> bool:
+        """Mark as warmed up (no pre-warming needed for API).
+
+        With force=True (health probe) a short phrase is actually synthesized
+        to check the API is reachable.
+        """
+        if self._warmed_up and not force:
             return True
 
         if self.mock_mode:
             self._warmed_up = True
             return True
 
+        if force:
+            try:
+                session = await self._get_session()
+                async with session.post(
+                    self.api_url, json=self._build_payload("Hi!"), headers=self._build_headers()
+                ) as response:
+                    await response.read()
+                    return response.status == 200
+            except Exception as e:
+                print(f"Cartesia [PROBE ERROR] {e}")
+                return False
+
         self._warmed_up = True
         print("Cartesia TTS ready!")
         return True
 
-    def _get_cache_path(self, text: str, format: str = "wav") -> Path:
-        text_hash = hashlib.md5(
-            f"{text}_{self.model_id}_{self.voice_id}_cartesia".encode()
-        ).hexdigest()
-        return self.audio_dir / f"{text_hash}.{format}"
-
-    def _get_lip_sync_cache_path(self, text: str) -> Path:
-        text_hash = hashlib.md5(
-            f"{text}_{self.model_id}_{self.voice_id}_cartesia".encode()
-        ).hexdigest()
-        return self.audio_dir / f"{text_hash}.lipsync.json"
+    def _build_headers(self) -> Dict[str, str]:
+        return {
+            "X-API-Key": self.api_key,
+            "Cartesia-Version": "2024-06-10",
+            "Content-Type": "application/json",
+        }
+
+    def _build_payload(self, text: str) -> Dict[str, Any]:
+        return {
+            "model_id": self.model_id,
+            "transcript": text,
+            "voice": {
+                "mode": "id",
+                "id": self.voice_id,
+            },
+            "output_format": {
+                "container": "wav",
+                "encoding": "pcm_s16le",
+                "sample_rate": 44100,
+            },
+        }
+
+    def _cache_key(self, text: str) -> str:
+        return self.cache.make_key(text, self.model_id, self.voice_id, "cartesia")
+
+    def cache_key(self, text: str, preprocess: bool = True) -> Optional[str]:
+        """Cache key generate_speech() would use for text, or None if nothing is speakable."""
+        if preprocess:
+            text = clean_for_tts(text)
+        if not text or not text.strip():
+            return None
+        return self._cache_key(text)
 
     async def generate_speech(
         self,
@@ -96,6 +134,7 @@ class MonaTTSCartesia:
         use_cache: bool = True,
         generate_lip_sync: bool = True,
         preprocess: bool = True,
+        lip_sync_mode: str = "textbased",
     ) -> Tuple[Optional[str], Optional[List[Dict[str, Any]]]]:
         """Generate speech audio from text using Cartesia Sonic API."""
         if not text or not text.strip():
@@ -109,47 +148,44 @@ class MonaTTSCartesia:
         if not text or not text.strip():
             return None, None
 
-        output_format = "wav"
-        cache_path = self._get_cache_path(text, format=output_format)
-        lip_sync_cache_path = self._get_lip_sync_cache_path(text)
+        cache_key = self._cache_key(text)
 
         # Return cached file if exists
-        if use_cache and cache_path.exists():
-            cache_ms = (time.perf_counter() - tts_start) * 1000
-            lip_sync_data = None
-            if lip_sync_cache_path.exists():
-                try:
-                    lip_sync_data = json.loads(lip_sync_cache_path.read_text())
-                except Exception:
-                    pass
-            print(f"Cartesia [CACHE HIT] {cache_ms:.0f}ms")
-            return str(cache_path), lip_sync_data
+        if use_cache:
+            cached = await self.cache.aget(
+                cache_key, self.output_format, lip_sync_text=text if generate_lip_sync else None,
+                lip_sync_mode=lip_sync_mode, engine="cartesia",
+            )
+            if cached:
+                cache_ms = (time.perf_counter() - tts_start) * 1000
+                print(f"Cartesia [CACHE HIT] {cache_ms:.0f}ms")
+                return str(cached[0]), cached[1]
 
         if self.mock_mode:
             return None, None
 
+        if not use_cache:
+            return await self._synthesize(text, cache_key, generate_lip_sync, lip_sync_mode, tts_start)
+        return await self.cache.single_flight(
+            cache_key,
+            lip_sync_mode if generate_lip_sync else None,
+            lambda: self._synthesize(text, cache_key, generate_lip_sync, lip_sync_mode, tts_start),
+        )
+
+    async def _synthesize(
+        self,
+        text: str,
+        cache_key: str,
+        generate_lip_sync: bool,
+        lip_sync_mode: str,
+        tts_start: float,
+    ) -> Tuple[Optional[str], Optional[List[Dict[str, Any]]]]:
+        """Synthesize text with Cartesia and store it in the cache."""
         try:
             api_start = time.perf_counter()
 
-            headers = {
-                "X-API-Key": self.api_key,
-                "Cartesia-Version": "2024-06-10",
-                "Content-Type": "application/json",
-            }
-
-            payload = {
-                "model_id": self.model_id,
-                "transcript": text,
-                "voice": {
-                    "mode": "id",
-                    "id": self.voice_id,
-                },
-                "output_format": {
-                    "container": "wav",
-                    "encoding": "pcm_s16le",
-                    "sample_rate": 44100,
-                },
-            }
+            headers = self._build_headers()
+            payload = self._build_payload(text)
 
             session = await self._get_session()
             async with session.post(
@@ -169,8 +205,7 @@ class MonaTTSCartesia:
                 audio_content = await response.read()
                 print(f"Cartesia [Audio Size] {len(audio_content)/1024:.1f}KB")
 
-                with open(cache_path, "wb") as f:
-                    f.write(audio_content)
+                cache_path = await self.cache.aput(cache_key, self.output_format, audio_content, engine="cartesia")
 
                 # Track TTS cost
                 cost = calculate_tts_cost(len(text), "cartesia")
@@ -184,11 +219,7 @@ class MonaTTSCartesia:
             # Generate lip sync using actual WAV duration (more accurate than text estimation)
             lip_sync_data = None
             if generate_lip_sync:
-                audio_duration = get_wav_duration(str(cache_path))
-                if audio_duration > 0:
-                    lip_sync_data = generate_lip_sync_from_text(text, audio_duration)
-                    if lip_sync_data:
-                        lip_sync_cache_path.write_text(json.dumps(lip_sync_data))
+                lip_sync_data = await self._generate_lip_sync(text, cache_key, audio_content, lip_sync_mode)
 
             total_ms = (time.perf_counter() - tts_start) * 1000
             print(f"Cartesia [TOTAL] {total_ms:.0f}ms ({total_ms/1000:.2f}s)")
@@ -203,17 +234,116 @@ class MonaTTSCartesia:
             traceback.print_exc()
             return None, None
 
+    async def stream_speech(
+        self,
+        text: str,
+        on_chunk: Callable[[bytes], Awaitable[None]],
+        generate_lip_sync: bool = True,
+        preprocess: bool = True,
+        lip_sync_mode: str = "textbased",
+    ) -> Tuple[Optional[str], Optional[List[Dict[str, Any]]]]:
+        """Generate speech, forwarding WAV bytes to on_chunk as Cartesia streams them.
+
+        The full response is also written to the cache. Cache hits (and lines
+        already being synthesized) are returned as a file without calling on_chunk.
+        """
+        if not text or not text.strip():
+            return None, None
+
+        tts_start = time.perf_counter()
+
+        if preprocess:
+            text = clean_for_tts(text)
+
+        if not text or not text.strip():
+            return None, None
+
+        cache_key = self._cache_key(text)
+        cached = await self.cache.aget(
+            cache_key, self.output_format, lip_sync_text=text if generate_lip_sync else None,
+            lip_sync_mode=lip_sync_mode, engine="cartesia",
+        )
+        if cached:
+            return str(cached[0]), cached[1]
+
+        if self.mock_mode:
+            return None, None
+
+        # Registered as the line's in-flight synthesis: concurrent stream_speech and
+        # generate_speech callers for it join this one and get the file
+        return await self.cache.single_flight(
+            cache_key,
+            lip_sync_mode if generate_lip_sync else None,
+            lambda: self._stream_synthesize(text, cache_key, on_chunk, generate_lip_sync, lip_sync_mode, tts_start),
+        )
+
+    async def _stream_synthesize(
+        self,
+        text: str,
+        cache_key: str,
+        on_chunk: Callable[[bytes], Awaitable[None]],
+        generate_lip_sync: bool,
+        lip_sync_mode: str,
+        tts_start: float,
+    ) -> Tuple[Optional[str], Optional[List[Dict[str, Any]]]]:
+        """Stream a synthesis through on_chunk and store the full response in the cache."""
+        try:
+            session = await self._get_session()
+            async with session.post(
+                self.api_url, json=self._build_payload(text), headers=self._build_headers()
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    print(f"Cartesia [STREAM ERROR] {response.status}: {error_text}")
+                    return None, None
+
+                buffer = bytearray()
+                async for chunk in response.content.iter_any():
+                    if not buffer:
+                        first_ms = (time.perf_counter() - tts_start) * 1000
+                        print(f"Cartesia [STREAM] First chunk in {first_ms:.0f}ms")
+                    buffer.extend(chunk)
+                    await on_chunk(chunk)
+
+            audio_content = fix_streamed_wav_header(bytes(buffer))
+            cache_path = await self.cache.aput(cache_key, self.output_format, audio_content, engine="cartesia")
+
+            cost = calculate_tts_cost(len(text), "cartesia")
+            await analytics.track_api_cost(
+                service="cartesia",
+                model=self.model_id,
+                characters=len(text),
+                estimated_cost=cost,
+            )
+
+            lip_sync_data = None
+            if generate_lip_sync:
+                lip_sync_data = await self._generate_lip_sync(text, cache_key, audio_content, lip_sync_mode)
+
+            total_ms = (time.perf_counter() - tts_start) * 1000
+            print(f"Cartesia [STREAM TOTAL] {total_ms:.0f}ms - {len(buffer)/1024:.1f}KB")
+            return str(cache_path), lip_sync_data
+
+        except aiohttp.ClientError as e:
+            print(f"Cartesia [STREAM CONNECTION ERROR] {e}")
+            return None, None
+
+    async def _generate_lip_sync(
+        self,
+        text: str,
+        cache_key: str,
+        audio_content: bytes,
+        lip_sync_mode: str = "textbased",
+    ) -> Optional[List[Dict[str, Any]]]:
+        if get_wav_duration_from_bytes(audio_content) <= 0:
+            return None
+        lip_sync_data = await generate_lip_sync_for_audio_async(text, audio_content, self.output_format, lip_sync_mode)
+        if lip_sync_data:
+            await self.cache.asave_lip_sync(cache_key, lip_sync_data, lip_sync_mode)
+        return lip_sync_data
+
     def clear_cache(self) -> int:
-        count = 0
-        for f in self.audio_dir.glob("*.wav"):
-            f.unlink()
-            count += 1
-        for f in self.audio_dir.glob("*.mp3"):
-            f.unlink()
-            count += 1
-        return count
+        return self.cache.clear(engine="cartesia", exts=(self.output_format,))
 
     def get_cache_size(self) -> int:
-        total = sum(f.stat().st_size for f in self.audio_dir.glob("*.wav"))
-        total += sum(f.stat().st_size for f in self.audio_dir.glob("*.mp3"))
-        return total
+        return self.cache.total_bytes(engine="cartesia", exts=(self.output_format,))
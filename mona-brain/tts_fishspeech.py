@@ -4,8 +4,6 @@ Uses Fish Audio's official API for high-quality TTS.
 """
 
 import asyncio
-import hashlib
-import json
 import os
 import time
 from pathlib import Path
@@ -13,25 +11,17 @@ from typing import Optional, List, Dict, Any, Tuple
 
 import aiohttp
 
-from lip_sync import generate_lip_sync_from_text
+from audio_cache import get_audio_cache
+from lip_sync import generate_lip_sync_async, get_mp3_duration_from_bytes
 from tts_preprocess import clean_for_tts
 from analytics import analytics, calculate_tts_cost
 
 
-def get_mp3_duration(path: str) -> float:
-    """Get actual MP3 duration using mutagen. Returns seconds."""
-    try:
-        from mutagen.mp3 import MP3
-        audio = MP3(path)
-        return audio.info.length
-    except Exception as e:
-        print(f"Fish Audio [Duration ERROR] {e}, falling back to estimate")
-        return 0.0
-
-
 class MonaTTSFishSpeech:
     """Handles text-to-speech generation using Fish Audio API."""
 
+    output_format = "mp3"  # Fish Audio returns MP3 by default
+
     def __init__(
         self,
         api_key: str = os.getenv("FISH_AUDIO_API_KEY", ""),
@@ -49,7 +39,7 @@ class MonaTTSFishSpeech:
             print(f"Fish Audio initialized with model: {model_id}")
 
         self.audio_dir = Path(audio_dir)
-        self.audio_dir.mkdir(parents=True, exist_ok=True)
+        self.cache = get_audio_cache(audio_dir)
         self._warmed_up = False
 
         # Connection pooling - reuse TCP connections for lower latency
@@ -75,30 +65,52 @@ class MonaTTSFishSpeech:
             await self._session.close()
             self._session = None
 
-    async def warmup(self) -> bool:
-        """Mark as warmed up (no pre-warming needed for API)."""
-        if self._warmed_up:
+    async def warmup(self, force: bool = False) -> bool:
+        """Mark as warmed up (no pre-warming needed for API).
+
+        With force=True (health probe) a short phrase is actually synthesized
+        to check the API is reachable.
+        """
+        if self._warmed_up and not force:
             return True
 
         if self.mock_mode:
             self._warmed_up = True
             return True
 
+        if force:
+            try:
+                session = await self._get_session()
+                async with session.post(
+                    self.api_url, json={"text": "Hi!"}, headers=self._build_headers()
+                ) as response:
+                    await response.read()
+                    return response.status == 200
+            except Exception as e:
+                print(f"Fish Audio [PROBE ERROR] {e}")
+                return False
+
         self._warmed_up = True
         print("Fish Audio TTS ready!")
         return True
 
-    def _get_cache_path(self, text: str, format: str = "mp3") -> Path:
-        text_hash = hashlib.md5(
-            f"{text}_{self.model_id}_fishspeech".encode()
-        ).hexdigest()
-        return self.audio_dir / f"{text_hash}.{format}"
+    def _build_headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "model": self.model_id,
+        }
 
-    def _get_lip_sync_cache_path(self, text: str) -> Path:
-        text_hash = hashlib.md5(
-            f"{text}_{self.model_id}_fishspeech".encode()
-        ).hexdigest()
-        return self.audio_dir / f"{text_hash}.lipsync.json"
+    def _cache_key(self, text: str) -> str:
+        return self.cache.make_key(text, self.model_id, "fishspeech")
+
+    def cache_key(self, text: str, preprocess: bool = True) -> Optional[str]:
+        """Cache key generate_speech() would use for text, or None if nothing is speakable."""
+        if preprocess:
+            text = clean_for_tts(text)
+        if not text or not text.strip():
+            return None
+        return self._cache_key(text)
 
     async def generate_speech(
         self,
@@ -106,9 +118,14 @@ class MonaTTSFishSpeech:
         use_cache: bool = True,
         convert_to_mp3: bool = False,
         generate_lip_sync: bool = True,
-        preprocess: bool = True
+        preprocess: bool = True,
+        lip_sync_mode: str = "textbased",
     ) -> Tuple[Optional[str], Optional[List[Dict[str, Any]]]]:
-        """Generate speech audio from text using Fish Audio API."""
+        """Generate speech audio from text using Fish Audio API.
+
+        MP3 output has no PCM to align against, so lip_sync_mode is accepted
+        for a uniform engine interface but cues are always text-timed.
+        """
         if not text or not text.strip():
             return None, None
 
@@ -120,35 +137,41 @@ class MonaTTSFishSpeech:
         if not text or not text.strip():
             return None, None
 
-        # Fish Audio returns MP3 by default
-        output_format = "mp3"
-        cache_path = self._get_cache_path(text, format=output_format)
-        lip_sync_cache_path = self._get_lip_sync_cache_path(text)
+        cache_key = self._cache_key(text)
 
         # Return cached file if exists
-        if use_cache and cache_path.exists():
-            cache_ms = (time.perf_counter() - tts_start) * 1000
-            lip_sync_data = None
-            if lip_sync_cache_path.exists():
-                try:
-                    lip_sync_data = json.loads(lip_sync_cache_path.read_text())
-                except Exception:
-                    pass
-            print(f"Fish Audio [CACHE HIT] {cache_ms:.0f}ms")
-            return str(cache_path), lip_sync_data
+        if use_cache:
+            cached = await self.cache.aget(
+                cache_key, self.output_format, lip_sync_text=text if generate_lip_sync else None, engine="fishspeech"
+            )
+            if cached:
+                cache_ms = (time.perf_counter() - tts_start) * 1000
+                print(f"Fish Audio [CACHE HIT] {cache_ms:.0f}ms")
+                return str(cached[0]), cached[1]
 
         if self.mock_mode:
             return None, None
 
+        if not use_cache:
+            return await self._synthesize(text, cache_key, generate_lip_sync, tts_start)
+        return await self.cache.single_flight(
+            cache_key,
+            generate_lip_sync,
+            lambda: self._synthesize(text, cache_key, generate_lip_sync, tts_start),
+        )
+
+    async def _synthesize(
+        self,
+        text: str,
+        cache_key: str,
+        generate_lip_sync: bool,
+        tts_start: float,
+    ) -> Tuple[Optional[str], Optional[List[Dict[str, Any]]]]:
+        """Synthesize text with Fish Audio and store it in the cache."""
         try:
             api_start = time.perf_counter()
 
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-                "model": self.model_id,
-            }
-
+            headers = self._build_headers()
             payload = {"text": text}
 
             # Use pooled session for faster connection reuse
@@ -172,8 +195,7 @@ class MonaTTSFishSpeech:
                 print(f"Fish Audio [Audio Size] {len(audio_content)/1024:.1f}KB")
 
                 # Save directly as MP3
-                with open(cache_path, "wb") as f:
-                    f.write(audio_content)
+                cache_path = await self.cache.aput(cache_key, self.output_format, audio_content, engine="fishspeech")
 
                 # Track TTS cost
                 cost = calculate_tts_cost(len(text), "fish")
@@ -187,14 +209,14 @@ class MonaTTSFishSpeech:
             # Generate text-based lip sync using actual MP3 duration
             lip_sync_data = None
             if generate_lip_sync:
-                audio_duration = get_mp3_duration(str(cache_path))
+                audio_duration = get_mp3_duration_from_bytes(audio_content)
                 if audio_duration <= 0:
                     # Fallback: estimate from text length (~14 chars/sec)
                     char_count = len(" ".join(text.split()))
                     audio_duration = max(0.5, char_count / 14.0 + 0.3)
-                lip_sync_data = generate_lip_sync_from_text(text, audio_duration)
+                lip_sync_data = await generate_lip_sync_async(text, audio_duration)
                 if lip_sync_data:
-                    lip_sync_cache_path.write_text(json.dumps(lip_sync_data))
+                    await self.cache.asave_lip_sync(cache_key, lip_sync_data)
 
             total_ms = (time.perf_counter() - tts_start) * 1000
             print(f"Fish Audio [TOTAL] {total_ms:.0f}ms ({total_ms/1000:.2f}s)")
@@ -210,16 +232,7 @@ class MonaTTSFishSpeech:
             return None, None
 
     def clear_cache(self) -> int:
-        count = 0
-        for f in self.audio_dir.glob("*.mp3"):
-            f.unlink()
-            count += 1
-        for f in self.audio_dir.glob("*.wav"):
-            f.unlink()
-            count += 1
-        return count
+        return self.cache.clear(engine="fishspeech", exts=(self.output_format,))
 
     def get_cache_size(self) -> int:
-        total = sum(f.stat().st_size for f in self.audio_dir.glob("*.mp3"))
-        total += sum(f.stat().st_size for f in self.audio_dir.glob("*.wav"))
-        return total
+        return self.cache.total_bytes(engine="fishspeech", exts=(self.output_format,))
@@ -2,15 +2,44 @@
 TTS Manager - Centralizes TTS engine selection, fallback cascade, and timing.
 
 All TTS engines share the same interface:
-    generate_speech(text, generate_lip_sync=True) -> (audio_path_str | None, lip_sync_data | None)
+    generate_speech(text, generate_lip_sync=True, lip_sync_mode="textbased")
+        -> (audio_path_str | None, lip_sync_data | None)
 
 The manager tries the requested engine first, then falls back through
 sovits -> openai to ensure audio is always generated when possible.
+
+With hedging enabled (TTS_HEDGING=1) the fallback runs in parallel instead:
+if an engine has not answered within its deadline (its observed p90 latency),
+the next engine in the cascade starts alongside it, the first success wins,
+and the slower attempt is cancelled.
+
+Every engine sits behind a CircuitBreaker: engines that keep failing are
+skipped instantly, and a background probe (each engine's warmup()) closes
+the breaker again once the backend recovers.
+
+stream() is the streaming variant: engines with stream_speech() (sovits,
+cartesia) forward audio bytes to a callback as they are synthesized.
 """
 
+import asyncio
+import os
 import time
+from collections import defaultdict, deque
 from pathlib import Path
-from typing import Optional, Tuple, List, Dict, Any
+from typing import Awaitable, Callable, Optional, Tuple, List, Dict, Any, Deque
+
+from circuit_breaker import CircuitBreaker
+
+# Hedging deadlines (seconds) - used until enough latency samples are observed
+HEDGE_DEFAULT_DEADLINE = float(os.getenv("TTS_HEDGE_DEFAULT_DEADLINE", "4.0"))
+HEDGE_MIN_DEADLINE = 1.0     # Cache hits skew p90 down, never hedge faster than this
+HEDGE_MAX_DEADLINE = 15.0
+HEDGE_MIN_SAMPLES = 5        # Samples needed before trusting the observed p90
+LATENCY_WINDOW = 50          # Successful latencies kept per engine
+
+ENGINES = ("sovits", "fishspeech", "cartesia", "openai")
+PROBE_INTERVAL_SECONDS = 15
+PROBE_TIMEOUT_SECONDS = 30
 
 
 class TTSManager:
@@ -22,6 +51,14 @@ class TTSManager:
         self.cartesia = None     # MonaTTSCartesia instance
         self.openai = None       # MonaTTS instance (OpenAI TTS)
 
+        self.hedging_enabled = os.getenv("TTS_HEDGING", "0") == "1"
+        # Recent successful latencies per engine (seconds), for hedging deadlines
+        self._latencies: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+
+        # Per-engine circuit breakers + background recovery probe
+        self.breakers: Dict[str, CircuitBreaker] = {name: CircuitBreaker(name) for name in ENGINES}
+        self._probe_task: Optional[asyncio.Task] = None
+
     def initialize(self, sovits=None, fishspeech=None, cartesia=None, openai_tts=None):
         """Set available TTS engine instances."""
         self.sovits = sovits
@@ -34,6 +71,7 @@ class TTSManager:
         text: str,
         engine_preference: str = "sovits",
         generate_lip_sync: bool = True,
+        lip_sync_mode: str = "textbased",
     ) -> Tuple[Optional[str], Optional[List[Dict[str, Any]]], Optional[str], float]:
         """
         Generate speech with fallback cascade.
@@ -42,11 +80,18 @@ class TTSManager:
             text: Preprocessed text to synthesize.
             engine_preference: Requested engine ("sovits", "fishspeech", "cartesia", "openai").
             generate_lip_sync: Whether to generate lip sync timing data.
+            lip_sync_mode: "textbased" or "aligned" (cues snapped to the audio, WAV engines only).
 
         Returns:
             (audio_url, lip_sync_data, used_engine, duration_seconds)
             audio_url is like "/audio/filename.wav" or None if all engines failed.
         """
+        if self.hedging_enabled:
+            audio_url, lip_sync_data, used_engine, duration, _attempts = await self.generate_hedged(
+                text, engine_preference, generate_lip_sync, lip_sync_mode
+            )
+            return (audio_url, lip_sync_data, used_engine, duration)
+
         tts_start = time.perf_counter()
         audio_url = None
         lip_sync_data = None
@@ -54,7 +99,7 @@ class TTSManager:
 
         # Try requested engine first
         audio_url, lip_sync_data = await self._try_engine(
-            engine_preference, text, generate_lip_sync
+            engine_preference, text, generate_lip_sync, lip_sync_mode
         )
         if audio_url:
             used_engine = engine_preference
@@ -62,7 +107,7 @@ class TTSManager:
         # Fallback to sovits if requested engine failed
         if not audio_url and engine_preference != "sovits":
             audio_url, lip_sync_data = await self._try_engine(
-                "sovits", text, generate_lip_sync
+                "sovits", text, generate_lip_sync, lip_sync_mode
             )
             if audio_url:
                 used_engine = "sovits (fallback)"
@@ -70,7 +115,7 @@ class TTSManager:
         # Fallback to openai as last resort
         if not audio_url and engine_preference != "openai":
             fallback_url, fallback_lip_sync = await self._try_engine(
-                "openai", text, generate_lip_sync
+                "openai", text, generate_lip_sync, lip_sync_mode
             )
             if fallback_url:
                 audio_url = fallback_url
@@ -87,28 +132,273 @@ class TTSManager:
 
         return (audio_url, lip_sync_data, used_engine, duration)
 
+    async def generate_hedged(
+        self,
+        text: str,
+        engine_preference: str = "sovits",
+        generate_lip_sync: bool = True,
+        lip_sync_mode: str = "textbased",
+    ) -> Tuple[Optional[str], Optional[List[Dict[str, Any]]], Optional[str], float, List[Dict[str, Any]]]:
+        """
+        Generate speech, racing backup engines against a slow preferred engine.
+
+        Engines are started in fallback-cascade order. The next engine starts
+        when the newest running one misses its deadline or fails outright.
+        The first success wins and any attempt still running is cancelled.
+
+        Returns:
+            (audio_url, lip_sync_data, used_engine, duration_seconds, attempts)
+            attempts is a list of {"engine", "status", "duration"} dicts where
+            status is "won", "failed", "cancelled" or "lost" (finished after the winner).
+        """
+        tts_start = time.perf_counter()
+        chain = [e for e in self._fallback_chain(engine_preference) if self._get_engine(e) is not None]
+        attempts: List[Dict[str, Any]] = []
+        running: Dict[asyncio.Task, Tuple[str, float]] = {}
+        launched: List[Tuple[str, float]] = []
+        winner: Optional[Tuple[str, str, Optional[List[Dict[str, Any]]]]] = None
+
+        def launch_next():
+            engine = chain[len(launched)]
+            started = time.perf_counter()
+            task = asyncio.create_task(self._try_engine(engine, text, generate_lip_sync, lip_sync_mode))
+            running[task] = (engine, started)
+            launched.append((engine, started))
+
+        try:
+            if chain:
+                launch_next()
+
+            while running and winner is None:
+                # Wait until the newest attempt's deadline, if there is a backup left to start
+                timeout = None
+                if len(launched) < len(chain):
+                    newest_engine, newest_start = launched[-1]
+                    waited = time.perf_counter() - newest_start
+                    timeout = max(0.0, self.hedge_deadline(newest_engine) - waited)
+
+                done, _ = await asyncio.wait(
+                    running.keys(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if not done:
+                    print(f"TTS [hedge] {launched[-1][0]} missed its {self.hedge_deadline(launched[-1][0]):.1f}s deadline, "
+                          f"starting {chain[len(launched)]}")
+                    launch_next()
+                    continue
+
+                any_failed = False
+                for task in done:
+                    engine, started = running.pop(task)
+                    audio_url, lip_sync_data = task.result()
+                    elapsed = time.perf_counter() - started
+                    if audio_url and winner is None:
+                        winner = (engine, audio_url, lip_sync_data)
+                        attempts.append({"engine": engine, "status": "won", "duration": elapsed})
+                    else:
+                        any_failed = any_failed or not audio_url
+                        attempts.append({"engine": engine, "status": "failed" if not audio_url else "lost", "duration": elapsed})
+
+                if winner is None and any_failed and len(launched) < len(chain):
+                    launch_next()
+        finally:
+            # Cancel the losers (or everything, if we were cancelled ourselves)
+            for task, (engine, started) in running.items():
+                task.cancel()
+                attempts.append({"engine": engine, "status": "cancelled", "duration": time.perf_counter() - started})
+            if running:
+                await asyncio.gather(*running.keys(), return_exceptions=True)
+
+        audio_url = None
+        lip_sync_data = None
+        used_engine = None
+        if winner:
+            engine, audio_url, lip_sync_data = winner
+            if engine == engine_preference:
+                used_engine = engine
+            elif engine == launched[0][0]:
+                used_engine = f"{engine} (fallback)"
+            else:
+                used_engine = f"{engine} (hedged)"
+
+        duration = time.perf_counter() - tts_start
+        text_preview = text[:50] + "..." if len(text) > 50 else text
+        attempt_summary = ", ".join(f"{a['engine']}={a['status']}:{a['duration']:.2f}s" for a in attempts)
+        print(f"TTS [{used_engine or 'none'}] generated in {duration:.2f}s for '{text_preview}' ({attempt_summary})")
+
+        return (audio_url, lip_sync_data, used_engine, duration, attempts)
+
+    async def stream(
+        self,
+        text: str,
+        on_chunk: Callable[[bytes], Awaitable[None]],
+        engine_preference: str = "sovits",
+        generate_lip_sync: bool = True,
+        lip_sync_mode: str = "textbased",
+    ) -> Tuple[Optional[str], Optional[List[Dict[str, Any]]], Optional[str], float, bool]:
+        """
+        Generate speech, forwarding audio bytes to on_chunk while it is synthesized.
+
+        Engines without stream_speech() (and cache hits) produce a file without
+        calling on_chunk. Falls back through the usual cascade only until the
+        first byte has been forwarded - a stream that breaks midway is not
+        restarted on another engine, since the client has already played part of it.
+
+        Returns:
+            (audio_url, lip_sync_data, used_engine, duration_seconds, streamed)
+            streamed is True when on_chunk was called at least once.
+        """
+        tts_start = time.perf_counter()
+        chunks_sent = 0
+        client_gone = False
+
+        async def forward(chunk: bytes):
+            # A failed send is the client's problem, not the engine's: stop forwarding
+            # but let the engine finish, so the breaker isn't charged and the audio is cached
+            nonlocal chunks_sent, client_gone
+            if client_gone:
+                return
+            chunks_sent += 1
+            try:
+                await on_chunk(chunk)
+            except Exception as e:
+                client_gone = True
+                print(f"TTS client went away mid-stream ({e}) - caching the rest without forwarding")
+
+        audio_url = None
+        lip_sync_data = None
+        used_engine = None
+        for engine in self._fallback_chain(engine_preference):
+            audio_url, lip_sync_data = await self._try_engine(
+                engine, text, generate_lip_sync, lip_sync_mode, on_chunk=forward
+            )
+            if audio_url:
+                used_engine = engine if engine == engine_preference else f"{engine} (fallback)"
+            if audio_url or chunks_sent:
+                break
+
+        duration = time.perf_counter() - tts_start
+        text_preview = text[:50] + "..." if len(text) > 50 else text
+        mode = f"streamed {chunks_sent} chunks" if chunks_sent else "file"
+        print(f"TTS [{used_engine or 'none'}] {mode} in {duration:.2f}s for '{text_preview}'")
+        return (audio_url, lip_sync_data, used_engine, duration, chunks_sent > 0)
+
+    def hedge_deadline(self, engine: str) -> float:
+        """Seconds to wait on an engine before starting a backup (observed p90)."""
+        samples = self._latencies.get(engine)
+        if not samples or len(samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DEADLINE
+        ordered = sorted(samples)
+        p90 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))]
+        return max(HEDGE_MIN_DEADLINE, min(HEDGE_MAX_DEADLINE, p90))
+
+    def _fallback_chain(self, engine_preference: str) -> List[str]:
+        """Requested engine first, then sovits, then openai (without duplicates)."""
+        chain = [engine_preference]
+        for engine in ("sovits", "openai"):
+            if engine not in chain:
+                chain.append(engine)
+        return chain
+
     async def _try_engine(
         self,
         engine: str,
         text: str,
         generate_lip_sync: bool,
+        lip_sync_mode: str = "textbased",
+        on_chunk: Optional[Callable[[bytes], Awaitable[None]]] = None,
     ) -> Tuple[Optional[str], Optional[List[Dict[str, Any]]]]:
-        """Try generating speech with a specific engine. Returns (audio_url, lip_sync) or (None, None)."""
-        try:
-            instance = self._get_engine(engine)
-            if instance is None:
-                return None, None
+        """Try generating speech with a specific engine. Returns (audio_url, lip_sync) or (None, None).
 
-            audio_path, lip_sync_data = await instance.generate_speech(
-                text, generate_lip_sync=generate_lip_sync
-            )
+        With on_chunk, engines that support it stream their audio through it.
+        """
+        instance = self._get_engine(engine)
+        if instance is None:
+            return None, None
+
+        breaker = self.breakers[engine]
+        if not breaker.allow_request():
+            print(f"TTS [{engine}] skipped - circuit {breaker.state}")
+            return None, None
+
+        started = time.perf_counter()
+        error = None
+        try:
+            if on_chunk is not None and hasattr(instance, "stream_speech"):
+                audio_path, lip_sync_data = await instance.stream_speech(
+                    text, on_chunk, generate_lip_sync=generate_lip_sync, lip_sync_mode=lip_sync_mode
+                )
+            else:
+                audio_path, lip_sync_data = await instance.generate_speech(
+                    text, generate_lip_sync=generate_lip_sync, lip_sync_mode=lip_sync_mode
+                )
             if audio_path:
+                elapsed = time.perf_counter() - started
+                self._latencies[engine].append(elapsed)
+                breaker.record_success()
                 audio_url = f"/audio/{Path(audio_path).name}"
                 return audio_url, lip_sync_data
+        except asyncio.CancelledError:
+            breaker.release_trial()
+            raise
         except Exception as e:
+            error = str(e)
             print(f"TTS [{engine}] failed: {e}")
+
+        # Engines swallow their own timeouts, so classify by how long the attempt took
+        elapsed = time.perf_counter() - started
+        timeout = getattr(getattr(instance, "_timeout", None), "total", None)
+        breaker.record_failure(timeout=bool(timeout) and elapsed >= timeout * 0.95, error=error)
         return None, None
 
+    def start_health_probe(self):
+        """Start the background task that probes open circuits."""
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = asyncio.create_task(self._probe_loop())
+
+    async def stop_health_probe(self):
+        """Stop the background probe. Call on shutdown."""
+        if self._probe_task:
+            self._probe_task.cancel()
+            await asyncio.gather(self._probe_task, return_exceptions=True)
+            self._probe_task = None
+
+    async def _probe_loop(self):
+        while True:
+            await asyncio.sleep(PROBE_INTERVAL_SECONDS)
+            for engine, breaker in self.breakers.items():
+                if breaker.state == CircuitBreaker.CLOSED or not breaker.cooldown_elapsed():
+                    continue
+                await self._probe_engine(engine, breaker)
+
+    async def _probe_engine(self, engine: str, breaker: CircuitBreaker):
+        """Probe an open engine with its warmup(); engines without one recover via a trial request."""
+        instance = self._get_engine(engine)
+        warmup = getattr(instance, "warmup", None)
+        if warmup is None:
+            return
+        try:
+            ok = await asyncio.wait_for(warmup(force=True), timeout=PROBE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            breaker.record_failure(timeout=True, error="probe timed out")
+            return
+        except Exception as e:
+            ok = False
+            breaker.last_error = f"probe: {e}"
+        if ok:
+            print(f"TTS [{engine}] probe succeeded")
+            breaker.record_success()
+        else:
+            breaker.record_failure(error=breaker.last_error)
+
+    def get_health(self) -> Dict[str, Any]:
+        """Breaker state for every configured engine (for /health)."""
+        return {
+            engine: breaker.snapshot()
+            for engine, breaker in self.breakers.items()
+            if self._get_engine(engine) is not None
+        }
+
     def _get_engine(self, engine: str):
         """Get the engine instance, checking mock_mode where applicable."""
         if engine == "sovits":
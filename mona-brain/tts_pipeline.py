@@ -0,0 +1,291 @@
+"""
+Sentence TTS Pipeline - Synthesizes sentences while the LLM is still streaming.
+
+Complete sentences are detected in the streamed text as chunks arrive and
+handed to the TTS manager immediately. Results are sent to the client as
+ordered `audio_segment` events (one per sentence, each with its own lip sync
+cues), so the first sentence can play while later ones are still being written.
+
+With stream_audio=True each sentence's audio is forwarded as it is
+synthesized instead: an `audio_stream_start` event, binary frames (4-byte
+big-endian stream id + WAV bytes), then `audio_stream_end` carrying the
+cached URL and lip sync cues. Streamed sentences are synthesized as soon as
+they complete, like segments; each one buffers its chunks in its own queue
+and the sender forwards the queues one sentence at a time, so frames never
+interleave.
+
+Clients that list "opus" in audio_formats get the cached Opus variant's URL
+whenever the audio cache already has one.
+"""
+
+import asyncio
+import itertools
+import struct
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Collection, List, Optional, Tuple, Dict, Any
+
+from audio_cache import get_audio_cache
+from lip_sync import format_lip_sync
+from text_utils import extract_complete_sentences, preprocess_tts_text
+from tts_manager import tts_manager
+
+SendFn = Callable[[dict], Awaitable[None]]
+SendBytesFn = Callable[[bytes], Awaitable[None]]
+SynthesisResult = Tuple[Optional[str], Optional[List[Dict[str, Any]]], Optional[str], float]
+StreamResult = Tuple[Optional[str], Optional[List[Dict[str, Any]]], Optional[str], float, bool]
+# A scheduled sentence: text, synthesis task, and (streamed only) its chunk queue
+Scheduled = Tuple[str, asyncio.Task, "Optional[asyncio.Queue[Optional[bytes]]]"]
+
+# Stream ids are unique per process so a client never confuses two responses
+_stream_ids = itertools.count(1)
+
+
+class SentenceTTSPipeline:
+    """Pipelines per-sentence TTS against a streaming LLM response."""
+
+    def __init__(
+        self,
+        send: SendFn,
+        engine_preference: str = "sovits",
+        generate_lip_sync: bool = True,
+        max_concurrent: int = 2,
+        timer=None,
+        send_bytes: Optional[SendBytesFn] = None,
+        stream_audio: bool = False,
+        lip_sync_mode: str = "textbased",
+        lip_sync_format: str = "full",
+        lip_sync_curve_fps: int = 0,
+        audio_formats: Collection[str] = (),
+    ):
+        """
+        Args:
+            send: Coroutine that delivers a JSON message to the client.
+            engine_preference: Requested TTS engine.
+            generate_lip_sync: Whether to generate lip sync cues per sentence.
+            max_concurrent: Max sentences synthesized at the same time.
+            timer: Optional PipelineTimer for first-audio checkpoints.
+            send_bytes: Coroutine that delivers a binary frame (needed for stream_audio).
+            stream_audio: Forward audio bytes as they are synthesized.
+            lip_sync_mode: "textbased" or "aligned" (cues snapped to the audio).
+            lip_sync_format: "full" cue dicts or "compact" parallel arrays.
+            lip_sync_curve_fps: With compact cues, also send a viseme curve at this rate.
+            audio_formats: Formats the client can play (e.g. ["opus", "wav"]).
+        """
+        self.send = send
+        self.send_bytes = send_bytes
+        self.stream_audio = stream_audio and send_bytes is not None
+        self.engine_preference = engine_preference
+        self.generate_lip_sync = generate_lip_sync
+        self.lip_sync_mode = lip_sync_mode
+        self.lip_sync_format = lip_sync_format
+        self.lip_sync_curve_fps = lip_sync_curve_fps
+        self.audio_formats = audio_formats
+        self.timer = timer
+
+        self._buffer = ""
+        self._fed_any = False
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._tasks: "asyncio.Queue[Optional[Scheduled]]" = asyncio.Queue()
+        self._current: Optional[asyncio.Task] = None
+        self._sender_task = asyncio.create_task(self._send_in_order())
+
+        # Results (filled in by the sender)
+        self.segments_sent = 0
+        self.used_engines: List[str] = []
+        self.first_audio_ms: Optional[float] = None
+        self._start = time.perf_counter()
+
+    def feed(self, chunk: str):
+        """Add streamed text and schedule TTS for any newly completed sentences."""
+        if not chunk:
+            return
+        self._fed_any = True
+        self._buffer += chunk
+
+        # A trailing terminator may still be part of "3.5" or "...", wait for more text
+        if self._buffer.rstrip() != self._buffer or self._buffer[-1] not in ".!?":
+            sentences, remaining = extract_complete_sentences(self._buffer)
+            if sentences:
+                self._buffer = remaining
+                for sentence in sentences:
+                    self._schedule(sentence)
+
+    async def finish(self, final_text: Optional[str] = None) -> int:
+        """Flush the remaining text, wait for every segment to be sent.
+
+        Args:
+            final_text: Full response text, used when nothing was streamed
+                (e.g. the LLM error fallback).
+
+        Returns:
+            Number of audio segments delivered to the client.
+        """
+        if not self._fed_any and final_text:
+            self._buffer = final_text
+
+        sentences, remaining = extract_complete_sentences(self._buffer)
+        for sentence in sentences:
+            self._schedule(sentence)
+        if remaining.strip():
+            self._schedule(remaining)
+        self._buffer = ""
+
+        await self._tasks.put(None)
+        await self._sender_task
+        return self.segments_sent
+
+    async def cancel(self):
+        """Abort outstanding synthesis (e.g. when the client disconnects)."""
+        self._sender_task.cancel()
+        if self._current:
+            self._current.cancel()
+        while not self._tasks.empty():
+            item = self._tasks.get_nowait()
+            if item:
+                item[1].cancel()
+
+    def _schedule(self, sentence: str):
+        tts_text = preprocess_tts_text(sentence.strip())
+        if not tts_text.strip():
+            return
+        if self.stream_audio:
+            chunks: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue()
+            task = asyncio.create_task(self._synthesize_stream(tts_text, chunks))
+            self._tasks.put_nowait((tts_text, task, chunks))
+            return
+        task = asyncio.create_task(self._synthesize(tts_text))
+        self._tasks.put_nowait((tts_text, task, None))
+
+    async def _synthesize(self, tts_text: str) -> SynthesisResult:
+        async with self._semaphore:
+            return await tts_manager.generate(
+                tts_text,
+                engine_preference=self.engine_preference,
+                generate_lip_sync=self.generate_lip_sync,
+                lip_sync_mode=self.lip_sync_mode,
+            )
+
+    async def _synthesize_stream(self, tts_text: str, chunks: "asyncio.Queue[Optional[bytes]]") -> StreamResult:
+        """Synthesize a sentence into its chunk queue; None marks the end of the queue."""
+        try:
+            async with self._semaphore:
+                return await tts_manager.stream(
+                    tts_text,
+                    chunks.put,
+                    engine_preference=self.engine_preference,
+                    generate_lip_sync=self.generate_lip_sync,
+                    lip_sync_mode=self.lip_sync_mode,
+                )
+        finally:
+            chunks.put_nowait(None)
+
+    async def _send_in_order(self):
+        """Send finished segments strictly in sentence order.
+
+        Sentences that fail on every engine are skipped without consuming a
+        segment index, so the client's strict in-order playback never stalls.
+        """
+        while True:
+            item = await self._tasks.get()
+            if item is None:
+                return
+            tts_text, task, chunks = item
+            if chunks is not None:
+                self._current = task
+                try:
+                    await self._stream_segment(tts_text, task, chunks)
+                finally:
+                    self._current = None
+                continue
+            try:
+                audio_url, lip_sync_data, used_engine, _duration = await task
+            except Exception as e:
+                print(f"TTS pipeline segment failed: {e}")
+                continue
+
+            if not audio_url:
+                continue
+
+            await self._send_segment(tts_text, audio_url, lip_sync_data, used_engine)
+
+    async def _send_segment(
+        self,
+        tts_text: str,
+        audio_url: str,
+        lip_sync_data: Optional[List[Dict[str, Any]]],
+        used_engine: Optional[str],
+    ):
+        await self.send({
+            "type": "audio_segment",
+            "audioUrl": get_audio_cache().preferred_url(audio_url, self.audio_formats),
+            "lipSync": format_lip_sync(lip_sync_data, self.lip_sync_format, self.lip_sync_curve_fps),
+            "segmentIndex": self.segments_sent,
+            "timestamp": datetime.now().isoformat(),
+        })
+        self._record_sent(tts_text, used_engine)
+
+    async def _stream_segment(
+        self,
+        tts_text: str,
+        task: asyncio.Task,
+        chunks: "asyncio.Queue[Optional[bytes]]",
+    ):
+        """Forward one sentence's buffered and live chunks as binary frames."""
+        stream_id = next(_stream_ids)
+        segment_index = self.segments_sent
+        prefix = struct.pack(">I", stream_id)
+        started = False
+
+        while True:
+            chunk = await chunks.get()
+            if chunk is None:
+                break
+            if not started:
+                started = True
+                await self.send({
+                    "type": "audio_stream_start",
+                    "streamId": stream_id,
+                    "segmentIndex": segment_index,
+                    "format": "wav",
+                    "timestamp": datetime.now().isoformat(),
+                })
+                self._record_first_audio(tts_text)
+            await self.send_bytes(prefix + chunk)
+
+        try:
+            audio_url, lip_sync_data, used_engine, _duration, streamed = await task
+        except Exception as e:
+            print(f"TTS pipeline stream failed: {e}")
+            if not started:
+                return
+            audio_url, lip_sync_data, used_engine, streamed = None, None, None, True
+
+        if streamed:
+            # A broken stream still consumed its index - the client has started playing it
+            await self.send({
+                "type": "audio_stream_end",
+                "streamId": stream_id,
+                "segmentIndex": segment_index,
+                "audioUrl": get_audio_cache().preferred_url(audio_url, self.audio_formats),
+                "lipSync": format_lip_sync(lip_sync_data, self.lip_sync_format, self.lip_sync_curve_fps),
+                "complete": audio_url is not None,
+                "timestamp": datetime.now().isoformat(),
+            })
+            self._record_sent(tts_text, used_engine)
+        elif audio_url:
+            # Cache hit or non-streaming engine - send the file as a regular segment
+            await self._send_segment(tts_text, audio_url, lip_sync_data, used_engine)
+
+    def _record_first_audio(self, tts_text: str):
+        if self.segments_sent == 0 and self.first_audio_ms is None:
+            self.first_audio_ms = (time.perf_counter() - self._start) * 1000
+            if self.timer:
+                self.timer.checkpoint("4a_first_audio_sent")
+            print(f"TTS pipeline first audio in {self.first_audio_ms:.0f}ms for '{tts_text[:50]}'")
+
+    def _record_sent(self, tts_text: str, used_engine: Optional[str]):
+        self._record_first_audio(tts_text)
+        self.segments_sent += 1
+        if used_engine:
+            self.used_engines.append(used_engine)
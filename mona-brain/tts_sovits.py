@@ -4,22 +4,23 @@ Uses local GPT-SoVITS server for high-quality anime voice synthesis
 """
 
 import asyncio
-import hashlib
-import json
 import os
 import time
 from pathlib import Path
-from typing import Optional, List, Dict, Any, Tuple
+from typing import Awaitable, Callable, Optional, List, Dict, Any, Tuple
 
 import aiohttp
 
-from lip_sync import generate_lip_sync_from_text, get_wav_duration
+from audio_cache import get_audio_cache
+from lip_sync import fix_streamed_wav_header, generate_lip_sync_for_audio_async, get_wav_duration_from_bytes
 from tts_preprocess import clean_for_tts
 
 
 class MonaTTSSoVITS:
     """Handles text-to-speech generation using GPT-SoVITS."""
 
+    output_format = "wav"
+
     def __init__(
         self,
         sovits_url: str = os.getenv("SOVITS_URL", "http://localhost:9880/tts"),
@@ -54,9 +55,9 @@ class MonaTTSSoVITS:
         if self.mock_mode:
             print("🎭 GPT-SoVITS running in MOCK MODE (no actual audio generation)")
 
-        # Setup audio cache directory
+        # Shared audio cache (index, byte budget, eviction)
         self.audio_dir = Path(audio_dir)
-        self.audio_dir.mkdir(parents=True, exist_ok=True)
+        self.cache = get_audio_cache(audio_dir)
 
         # Track if warmup has been done
         self._warmed_up = False
@@ -84,7 +85,7 @@ class MonaTTSSoVITS:
             await self._session.close()
             self._session = None
 
-    async def warmup(self) -> bool:
+    async def warmup(self, force: bool = False) -> bool:
         """
         Pre-warm the GPT-SoVITS model by generating a short test phrase.
         This loads models into GPU memory so first real request is faster.
@@ -92,7 +93,7 @@ class MonaTTSSoVITS:
         Returns:
             True if warmup succeeded, False otherwise
         """
-        if self._warmed_up:
+        if self._warmed_up and not force:
             print("🔥 GPT-SoVITS already warmed up")
             return True
 
@@ -106,16 +107,7 @@ class MonaTTSSoVITS:
         warmup_text = "Hi!"  # Very short text for quick warmup
 
         try:
-            payload = {
-                "text": warmup_text,
-                "text_lang": self.text_lang,
-                "ref_audio_path": self.ref_audio_path,
-                "prompt_text": self.prompt_text,
-                "prompt_lang": self.prompt_lang,
-                "speed_factor": self.speed_factor,
-                "text_split_method": "cut0",
-                "streaming_mode": 0,
-            }
+            payload = self._build_payload(warmup_text)
 
             # Use longer timeout for warmup (model loading can be slow)
             session = await self._get_session()
@@ -137,26 +129,38 @@ class MonaTTSSoVITS:
             print(f"✗ GPT-SoVITS warmup error: {e}")
             return False
 
-    def _get_cache_path(self, text: str, format: str = "wav") -> Path:
-        """Generate cache file path based on text hash and format."""
-        text_hash = hashlib.md5(
-            f"{text}_{self.ref_audio_path}_{self.speed_factor}".encode()
-        ).hexdigest()
-        return self.audio_dir / f"{text_hash}.{format}"
-
-    def _get_lip_sync_cache_path(self, text: str) -> Path:
-        """Generate cache file path for lip sync data."""
-        text_hash = hashlib.md5(
-            f"{text}_{self.ref_audio_path}_{self.speed_factor}".encode()
-        ).hexdigest()
-        return self.audio_dir / f"{text_hash}.lipsync.json"
+    def _build_payload(self, text: str, streaming: bool = False) -> Dict[str, Any]:
+        """Request body for the GPT-SoVITS /tts endpoint."""
+        return {
+            "text": text,
+            "text_lang": self.text_lang,
+            "ref_audio_path": self.ref_audio_path,
+            "prompt_text": self.prompt_text,
+            "prompt_lang": self.prompt_lang,
+            "speed_factor": self.speed_factor,
+            "text_split_method": "cut0",
+            "streaming_mode": 1 if streaming else 0,
+        }
+
+    def _cache_key(self, text: str) -> str:
+        """Cache key for text with the current voice settings."""
+        return self.cache.make_key(text, self.ref_audio_path, self.speed_factor)
+
+    def cache_key(self, text: str, preprocess: bool = True) -> Optional[str]:
+        """Cache key generate_speech() would use for text, or None if nothing is speakable."""
+        if preprocess:
+            text = clean_for_tts(text)
+        if not text or not text.strip():
+            return None
+        return self._cache_key(text)
 
     async def generate_speech(
         self,
         text: str,
         use_cache: bool = True,
         generate_lip_sync: bool = True,
-        preprocess: bool = True
+        preprocess: bool = True,
+        lip_sync_mode: str = "textbased",
     ) -> Tuple[Optional[str], Optional[List[Dict[str, Any]]]]:
         """
         Generate speech audio from text using GPT-SoVITS.
@@ -166,6 +170,7 @@ class MonaTTSSoVITS:
             use_cache: Whether to use cached audio if available
             generate_lip_sync: Whether to generate lip sync timing data
             preprocess: Whether to clean text for TTS (remove markdown, emojis, etc.)
+            lip_sync_mode: "textbased" (even timing) or "aligned" (snapped to speech energy)
 
         Returns:
             Tuple of (path to generated audio file, lip sync data) or (None, None) if failed
@@ -183,37 +188,43 @@ class MonaTTSSoVITS:
             return None, None
 
         # Always use WAV format
-        cache_path = self._get_cache_path(text, format="wav")
-        lip_sync_cache_path = self._get_lip_sync_cache_path(text)
+        cache_key = self._cache_key(text)
 
         # Return cached file if it exists
-        if use_cache and cache_path.exists():
-            cache_ms = (time.perf_counter() - tts_start) * 1000
-            lip_sync_data = None
-            if lip_sync_cache_path.exists():
-                try:
-                    lip_sync_data = json.loads(lip_sync_cache_path.read_text())
-                except Exception:
-                    pass
-            print(f"⏱️  TTS [CACHE HIT] {cache_ms:.0f}ms")
-            return str(cache_path), lip_sync_data
+        if use_cache:
+            cached = await self.cache.aget(
+                cache_key, "wav", lip_sync_text=text if generate_lip_sync else None,
+                lip_sync_mode=lip_sync_mode, engine="sovits",
+            )
+            if cached:
+                cache_ms = (time.perf_counter() - tts_start) * 1000
+                print(f"⏱️  TTS [CACHE HIT] {cache_ms:.0f}ms")
+                return str(cached[0]), cached[1]
 
         # Mock mode: Return None (no audio) but log what would be generated
         if self.mock_mode:
             return None, None
 
+        if not use_cache:
+            return await self._synthesize(text, cache_key, generate_lip_sync, lip_sync_mode, tts_start)
+        return await self.cache.single_flight(
+            cache_key,
+            lip_sync_mode if generate_lip_sync else None,
+            lambda: self._synthesize(text, cache_key, generate_lip_sync, lip_sync_mode, tts_start),
+        )
+
+    async def _synthesize(
+        self,
+        text: str,
+        cache_key: str,
+        generate_lip_sync: bool,
+        lip_sync_mode: str,
+        tts_start: float,
+    ) -> Tuple[Optional[str], Optional[List[Dict[str, Any]]]]:
+        """Synthesize text with GPT-SoVITS and store it in the cache."""
         try:
             # Prepare payload for GPT-SoVITS
-            payload = {
-                "text": text,
-                "text_lang": self.text_lang,
-                "ref_audio_path": self.ref_audio_path,
-                "prompt_text": self.prompt_text,
-                "prompt_lang": self.prompt_lang,
-                "speed_factor": self.speed_factor,
-                "text_split_method": "cut0",
-                "streaming_mode": 0,
-            }
+            payload = self._build_payload(text)
 
             # Call GPT-SoVITS API using shared session (connection pooling)
             api_start = time.perf_counter()
@@ -235,22 +246,14 @@ class MonaTTSSoVITS:
 
                 # Save to disk
                 save_start = time.perf_counter()
-                with open(cache_path, "wb") as f:
-                    f.write(audio_content)
+                cache_path = await self.cache.aput(cache_key, "wav", audio_content, engine="sovits")
                 save_ms = (time.perf_counter() - save_start) * 1000
                 print(f"⏱️  TTS [Save to Disk] {save_ms:.0f}ms")
 
-            # Generate text-based lip sync (near-instant)
+            # Generate lip sync from the text, timed to the audio (near-instant)
             lip_sync_data = None
             if generate_lip_sync:
-                audio_duration = get_wav_duration(str(cache_path))
-                print(f"⏱️  TTS [WAV Duration] {audio_duration:.2f}s from {cache_path}")
-                if audio_duration > 0:
-                    lip_sync_data = generate_lip_sync_from_text(text, audio_duration)
-                    if lip_sync_data:
-                        lip_sync_cache_path.write_text(json.dumps(lip_sync_data))
-                else:
-                    print(f"⚠️  TTS [Lip Sync] Skipped - audio duration is 0")
+                lip_sync_data = await self._generate_lip_sync(text, cache_key, audio_content, lip_sync_mode)
 
             total_ms = (time.perf_counter() - tts_start) * 1000
             print(f"⏱️  TTS [TOTAL] {total_ms:.0f}ms ({total_ms/1000:.2f}s)")
@@ -264,31 +267,129 @@ class MonaTTSSoVITS:
             print(f"⏱️  TTS [ERROR] {e}")
             return None, None
 
+    async def stream_speech(
+        self,
+        text: str,
+        on_chunk: Callable[[bytes], Awaitable[None]],
+        generate_lip_sync: bool = True,
+        preprocess: bool = True,
+        lip_sync_mode: str = "textbased",
+    ) -> Tuple[Optional[str], Optional[List[Dict[str, Any]]]]:
+        """
+        Generate speech with GPT-SoVITS streaming mode, forwarding audio as it arrives.
+
+        on_chunk receives the WAV bytes (header first, then PCM) as the server
+        produces them, while the full response is also written to the cache.
+        Cache hits - and lines another request is already synthesizing - are
+        returned as a file without calling on_chunk.
+
+        Returns:
+            Tuple of (path to cached audio file, lip sync data) or (None, None) if failed
+        """
+        if not text or not text.strip():
+            return None, None
+
+        tts_start = time.perf_counter()
+
+        if preprocess:
+            text = clean_for_tts(text)
+
+        if not text or not text.strip():
+            return None, None
+
+        cache_key = self._cache_key(text)
+        cached = await self.cache.aget(
+            cache_key, "wav", lip_sync_text=text if generate_lip_sync else None,
+            lip_sync_mode=lip_sync_mode, engine="sovits",
+        )
+        if cached:
+            return str(cached[0]), cached[1]
+
+        if self.mock_mode:
+            return None, None
+
+        # Registered as the line's in-flight synthesis: concurrent stream_speech and
+        # generate_speech callers for it join this one and get the file
+        return await self.cache.single_flight(
+            cache_key,
+            lip_sync_mode if generate_lip_sync else None,
+            lambda: self._stream_synthesize(text, cache_key, on_chunk, generate_lip_sync, lip_sync_mode, tts_start),
+        )
+
+    async def _stream_synthesize(
+        self,
+        text: str,
+        cache_key: str,
+        on_chunk: Callable[[bytes], Awaitable[None]],
+        generate_lip_sync: bool,
+        lip_sync_mode: str,
+        tts_start: float,
+    ) -> Tuple[Optional[str], Optional[List[Dict[str, Any]]]]:
+        """Stream a synthesis through on_chunk and store the full response in the cache."""
+        try:
+            session = await self._get_session()
+            async with session.post(self.sovits_url, json=self._build_payload(text, streaming=True)) as response:
+                if response.status != 200:
+                    print(f"⏱️  TTS [STREAM ERROR] Status: {response.status}")
+                    return None, None
+
+                buffer = bytearray()
+                async for chunk in response.content.iter_any():
+                    if not buffer:
+                        first_ms = (time.perf_counter() - tts_start) * 1000
+                        print(f"⏱️  TTS [GPT-SoVITS STREAM] First chunk in {first_ms:.0f}ms")
+                    buffer.extend(chunk)
+                    await on_chunk(chunk)
+
+            audio_content = fix_streamed_wav_header(bytes(buffer))
+            cache_path = await self.cache.aput(cache_key, "wav", audio_content, engine="sovits")
+
+            lip_sync_data = None
+            if generate_lip_sync:
+                lip_sync_data = await self._generate_lip_sync(text, cache_key, audio_content, lip_sync_mode)
+
+            total_ms = (time.perf_counter() - tts_start) * 1000
+            print(f"⏱️  TTS [STREAM TOTAL] {total_ms:.0f}ms - {len(buffer)/1024:.1f}KB")
+            return str(cache_path), lip_sync_data
+
+        except aiohttp.ClientError as e:
+            print(f"⏱️  TTS [STREAM CONNECTION ERROR] {e}")
+            return None, None
+
+    async def _generate_lip_sync(
+        self,
+        text: str,
+        cache_key: str,
+        audio_content: bytes,
+        lip_sync_mode: str = "textbased",
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Lip sync timed to the WAV bytes, saved as the cache sidecar for its mode."""
+        audio_duration = get_wav_duration_from_bytes(audio_content)
+        print(f"⏱️  TTS [WAV Duration] {audio_duration:.2f}s")
+        if audio_duration <= 0:
+            print(f"⚠️  TTS [Lip Sync] Skipped - audio duration is 0")
+            return None
+        lip_sync_data = await generate_lip_sync_for_audio_async(text, audio_content, "wav", lip_sync_mode)
+        if lip_sync_data:
+            await self.cache.asave_lip_sync(cache_key, lip_sync_data, lip_sync_mode)
+        return lip_sync_data
+
     def clear_cache(self) -> int:
         """
-        Clear all cached audio files.
+        Clear all cached SoVITS audio files.
 
         Returns:
             Number of files deleted
         """
-        count = 0
-        for file_path in self.audio_dir.glob("*.wav"):
-            file_path.unlink()
-            count += 1
-        for file_path in self.audio_dir.glob("*.lipsync.json"):
-            file_path.unlink()
-            count += 1
+        count = self.cache.clear(engine="sovits", exts=("wav",))
         print(f"✓ Cleared {count} cached SoVITS audio files")
         return count
 
     def get_cache_size(self) -> int:
         """
-        Get total size of cached audio files in bytes.
+        Get total size of cached SoVITS audio files in bytes.
 
         Returns:
             Total cache size in bytes
         """
-        total_size = sum(
-            file_path.stat().st_size for file_path in self.audio_dir.glob("*.wav")
-        )
-        return total_size
+        return self.cache.total_bytes(engine="sovits", exts=("wav",))
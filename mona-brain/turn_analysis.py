@@ -0,0 +1,158 @@
+"""
+Post-response turn analysis for Mona.
+
+One structured-JSON gpt-4o-mini call per exchange returns everything the
+background refinement needs: the emotion Mona should express next, the
+affection delta, and any memories worth keeping. This replaces three separate
+calls (emotion, affection, memory) that each resent the same exchange.
+
+Each field falls back on its own: a missing or malformed field uses that
+engine's keyword heuristic while the valid fields are still applied, and if
+the whole call fails every engine falls back.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional
+
+from openai import AsyncOpenAI
+
+from affection import AffectionEngine
+from analytics import analytics, calculate_llm_cost, cached_prompt_tokens
+from emotion import EmotionEngine, EmotionType
+from memory import MemoryCategory, MemoryManager
+
+ANALYSIS_MODEL = "gpt-4o-mini"
+
+# Static so the provider can prefix-cache it across turns and users
+ANALYSIS_PROMPT = (
+    "You analyze one exchange between a user and a virtual companion. "
+    "Return a JSON object with exactly these keys:\n"
+    '"emotion": the emotion the companion should express next. One of: '
+    + ", ".join(e.value for e in EmotionType) + ".\n"
+    '"affection_delta": integer from -10 to +10 - how the user\'s message affects the '
+    "companion's affection toward the user. Examples:\n"
+    '  "I love pizza" → 2 (positive but not directed at companion)\n'
+    '  "I love you" → 8 (strong affection toward companion)\n'
+    '  "You\'re annoying" → -6 (negative toward companion)\n'
+    '  "Tell me about cats" → 1 (neutral engagement)\n'
+    '"memories": personal facts, preferences, and events from the USER\'s message only. '
+    "An array whose elements have: key (str, unique identifier like 'name', 'favorite_color', "
+    "'likes:cats'), value (str, the actual value), content (str, natural language sentence), "
+    "category (one of: " + ", ".join(c.value for c in MemoryCategory) + "), importance (int 0-100), "
+    "confidence (float 0.0-1.0). Use [] if nothing is worth remembering. "
+    "Do NOT extract: workplace/employer, location/address, or transient emotions. "
+    "Birthday IS allowed."
+)
+
+
+def _parse_emotion(data: Dict[str, Any]) -> Optional[EmotionType]:
+    try:
+        return EmotionType(str(data["emotion"]).strip().lower())
+    except (KeyError, ValueError):
+        return None
+
+
+def _parse_delta(data: Dict[str, Any]) -> Optional[int]:
+    try:
+        return max(-10, min(10, int(data["affection_delta"])))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _parse_memories(data: Dict[str, Any]) -> Optional[List[dict]]:
+    items = data.get("memories")
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return None
+    return items
+
+
+async def analyze_turn(
+    client: AsyncOpenAI,
+    user_id: str,
+    user_message: str,
+    assistant_message: str,
+    *,
+    emotion_engine: EmotionEngine,
+    affection_engine: AffectionEngine,
+    memory_manager: MemoryManager,
+) -> Dict[str, Any]:
+    """Refine emotion, affection and memories for the next turn with one LLM call.
+
+    Returns a summary of what was applied and which fields fell back.
+    """
+    data: Dict[str, Any] = {}
+    usage = None
+    if user_message.strip():
+        try:
+            response = await client.chat.completions.create(
+                model=ANALYSIS_MODEL,
+                messages=[
+                    {"role": "system", "content": ANALYSIS_PROMPT},
+                    {
+                        "role": "user",
+                        "content": (
+                            f'User said: "{user_message}"\n'
+                            f'Companion replied: "{assistant_message}"'
+                        ),
+                    },
+                ],
+                temperature=0.1,
+                max_tokens=300,
+                response_format={"type": "json_object"},
+            )
+            usage = response.usage
+            data = json.loads(response.choices[0].message.content or "{}")
+            if not isinstance(data, dict):
+                data = {}
+        except Exception as e:
+            print(f"⚠ Turn analysis failed, using keyword fallbacks: {e}")
+            data = {}
+
+    fallbacks = []
+
+    # Honour the test: command shortcut - keyword emotion only
+    emotion = None if user_message.lower().startswith("test:") else _parse_emotion(data)
+    if emotion is None:
+        emotion = emotion_engine.analyze_message(user_message)
+        fallbacks.append("emotion")
+    emotion_engine.apply_emotion(emotion)
+
+    delta = _parse_delta(data)
+    if delta is None:
+        delta = affection_engine.keyword_delta(user_message)
+        fallbacks.append("affection")
+    affection_engine.apply_delta(user_id, delta)
+
+    items = _parse_memories(data)
+    memories = None
+    if items is not None:
+        try:
+            memories = memory_manager.apply_extracted(user_id, items)
+        except (TypeError, ValueError) as e:
+            print(f"⚠ Turn analysis returned bad memories: {e}")
+    if memories is None:
+        memories = memory_manager.process_user_message(user_id, user_message)
+        fallbacks.append("memories")
+
+    if fallbacks:
+        print(f"🧠 Turn analysis: keyword fallback for {', '.join(fallbacks)}")
+    if usage:
+        await _track_usage(usage, user_id)
+    return {"emotion": emotion.value, "affection_delta": delta, "memories": len(memories), "fallbacks": fallbacks}
+
+
+async def _track_usage(usage, user_id: str):
+    cached_tokens = cached_prompt_tokens(usage)
+    await analytics.track_api_cost(
+        service="openai_analysis",
+        model=ANALYSIS_MODEL,
+        user_id=user_id,
+        input_tokens=usage.prompt_tokens,
+        output_tokens=usage.completion_tokens,
+        cached_input_tokens=cached_tokens,
+        estimated_cost=calculate_llm_cost(
+            usage.prompt_tokens, usage.completion_tokens, ANALYSIS_MODEL, cached_input_tokens=cached_tokens
+        ),
+    )
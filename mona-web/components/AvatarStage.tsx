@@ -7,7 +7,7 @@ import dynamic from "next/dynamic";
 import type { EmotionData, LipSyncCue } from "@/types/chat";
 import * as THREE from "three";
 import type { OrbitControls as OrbitControlsImpl } from "three-stdlib";
-import type { OutfitVisibility } from "./VRMAvatar";
+import type { OutfitVisibility, SettingsLipSyncMode } from "./VRMAvatar";
 import type { AvatarState } from "@/lib/animation/avatarStateMachine";
 export type { OutfitVisibility, AvatarState };
 
@@ -66,8 +66,8 @@ export const AVATAR_OPTIONS = [
 
 export type AvatarId = typeof AVATAR_OPTIONS[number]["id"];
 
-// Settings lip sync mode type (from SettingsModal)
-export type SettingsLipSyncMode = "textbased" | "realtime" | "formant";
+// Settings lip sync mode type (single definition lives in VRMAvatar)
+export type { SettingsLipSyncMode };
 
 interface AvatarStageProps {
   emotion: EmotionData | null;
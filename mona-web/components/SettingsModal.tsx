@@ -3,7 +3,7 @@
 import { useState, useEffect } from "react";
 
 export type TtsEngine = "sovits" | "fishspeech" | "cartesia";
-export type LipSyncMode = "textbased" | "realtime" | "formant";
+export type LipSyncMode = "textbased" | "aligned" | "realtime" | "formant";
 export type PersonalityType = "girlfriend" | "mommy";
 
 export interface PersonalityOption {
@@ -104,6 +104,7 @@ export default function SettingsModal({
 
   const lipSyncOptions: { id: LipSyncMode; label: string }[] = [
     { id: "textbased", label: "Text" },
+    { id: "aligned", label: "Aligned" },
     { id: "realtime", label: "Real-time" },
     { id: "formant", label: "Formant" },
   ];
@@ -118,6 +119,8 @@ export default function SettingsModal({
   const lipSyncDescription =
     lipSyncMode === "textbased"
       ? "Text: Fast phoneme estimation from text (~0ms)"
+      : lipSyncMode === "aligned"
+      ? "Aligned: Text phonemes snapped to pauses in the audio"
       : lipSyncMode === "realtime"
       ? "Real-time: Basic audio frequency analysis"
       : "Formant: Advanced F1/F2 analysis with layered animation";
@@ -79,7 +79,7 @@ export interface OutfitVisibility {
 }
 
 // Settings lip sync mode type (from SettingsModal)
-export type SettingsLipSyncMode = "textbased" | "realtime" | "formant";
+export type SettingsLipSyncMode = "textbased" | "aligned" | "realtime" | "formant";
 
 interface VRMAvatarProps {
   url: string;
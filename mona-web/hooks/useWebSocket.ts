@@ -1,11 +1,23 @@
 "use client";
 
 import { useEffect, useRef, useState, useCallback } from "react";
-import { AudioSegment, EmotionData, LipSyncCue, Message, WebSocketMessage } from "@/types/chat";
+import { AudioSegment, EmotionData, LipSyncCue, LipSyncTable, Message, WebSocketMessage } from "@/types/chat";
+import { StreamingAudioPlayer, parseStreamFrame } from "@/lib/audio/streamingAudioPlayer";
+import { decodeLipSync } from "@/lib/animation/lipSyncCodec";
 
 const BACKEND_URL = process.env.NEXT_PUBLIC_BACKEND_URL || "http://localhost:8000";
+// "url" (fetch each clip) or "stream" (audio arrives as binary frames while synthesizing)
+const AUDIO_DELIVERY = process.env.NEXT_PUBLIC_AUDIO_DELIVERY || "url";
+// "full" (cue objects) or "compact" (parallel arrays + a per-session blend table)
+const LIP_SYNC_FORMAT = process.env.NEXT_PUBLIC_LIP_SYNC_FORMAT || "full";
 const MAX_RECONNECT_ATTEMPTS = 7;
 
+// Advertise Opus so the backend can hand out its smaller cached .ogg variants
+function playableAudioFormats(): string[] | undefined {
+  if (typeof Audio === "undefined") return undefined;
+  return new Audio().canPlayType('audio/ogg; codecs="opus"') ? ["opus", "wav"] : undefined;
+}
+
 interface AuthStatus {
   isAuthenticated: boolean;
   user: {
@@ -44,6 +56,8 @@ export function useWebSocket(url: string, options?: UseWebSocketOptions, clientI
   const heartbeatIntervalRef = useRef<ReturnType<typeof setInterval> | null>(null);
   const messageQueueRef = useRef<string[]>([]);
   const intentionalCloseRef = useRef<boolean>(false);
+  const streamPlayerRef = useRef<StreamingAudioPlayer>(new StreamingAudioPlayer());
+  const lipSyncTableRef = useRef<LipSyncTable | null>(null);
   const optionsRef = useRef(options);
   optionsRef.current = options;
 
@@ -54,6 +68,7 @@ export function useWebSocket(url: string, options?: UseWebSocketOptions, clientI
 
     const connect = () => {
       const ws = new WebSocket(wsUrl);
+      ws.binaryType = "arraybuffer";
       websocketRef.current = ws;
 
       ws.onopen = () => {
@@ -77,6 +92,15 @@ export function useWebSocket(url: string, options?: UseWebSocketOptions, clientI
       };
 
       ws.onmessage = (event) => {
+        // Binary frames carry streamed audio: 4-byte stream id + WAV bytes
+        if (event.data instanceof ArrayBuffer) {
+          const frame = parseStreamFrame(event.data);
+          if (frame) {
+            streamPlayerRef.current.push(frame.streamId, frame.bytes);
+          }
+          return;
+        }
+
         try {
           const data: WebSocketMessage = JSON.parse(event.data);
 
@@ -104,9 +128,13 @@ export function useWebSocket(url: string, options?: UseWebSocketOptions, clientI
             };
 
             // If this is Mona's message without audio, start generating audio
-            if (data.sender === "mona" && !audioUrl) {
+            // (pipelined responses already delivered their audio as segments)
+            if (data.sender === "mona" && !audioUrl && data.totalAudioSegments === undefined) {
               setIsGeneratingAudio(true);
             }
+            if (data.totalAudioSegments !== undefined) {
+              setTotalAudioSegments(data.totalAudioSegments);
+            }
 
             setMessages((prev) => {
               const next = [...prev];
@@ -129,6 +157,7 @@ export function useWebSocket(url: string, options?: UseWebSocketOptions, clientI
             setMessages((prev) => {
               if (prev.length === 0 || !prev[prev.length - 1].isStreaming) {
                 // New response starting - clear audio segments queue
+                streamPlayerRef.current.stop();
                 setAudioSegments([]);
                 setTotalAudioSegments(null);
                 setNextExpectedIndex(0);  // Reset expected index for new response
@@ -174,7 +203,7 @@ export function useWebSocket(url: string, options?: UseWebSocketOptions, clientI
                 next[lastMonaIndex] = {
                   ...next[lastMonaIndex],
                   audioUrl: fullAudioUrl,
-                  lipSync: data.lipSync,  // Include lip sync timing data
+                  lipSync: decodeLipSync(data.lipSync, lipSyncTableRef.current),  // Include lip sync timing data
                 };
 
                 return next;
@@ -191,7 +220,7 @@ export function useWebSocket(url: string, options?: UseWebSocketOptions, clientI
             setAudioSegments((prev) => {
               const newSegment: AudioSegment = {
                 audioUrl: fullAudioUrl,
-                lipSync: data.lipSync,
+                lipSync: decodeLipSync(data.lipSync, lipSyncTableRef.current),
                 segmentIndex: segmentIndex,
                 isPlaying: false,
                 isPlayed: false,
@@ -206,6 +235,57 @@ export function useWebSocket(url: string, options?: UseWebSocketOptions, clientI
             if (segmentIndex === 0) {
               setIsGeneratingAudio(false);
             }
+          } else if (data.type === "audio_stream_start" && data.streamId !== undefined) {
+            // Streamed segment: bytes follow as binary frames, playback starts when it's this segment's turn
+            const streamId = data.streamId;
+            const segmentIndex = data.segmentIndex ?? 0;
+
+            streamPlayerRef.current.open(streamId, () => {
+              setAudioSegments((prev) =>
+                prev.map((seg) =>
+                  seg.streamId === streamId ? { ...seg, isPlaying: false, isPlayed: true } : seg
+                )
+              );
+              setNextExpectedIndex((prev) => prev + 1);
+            });
+
+            setAudioSegments((prev) => {
+              const newSegment: AudioSegment = {
+                audioUrl: "",
+                segmentIndex: segmentIndex,
+                isPlaying: false,
+                isPlayed: false,
+                streamId: streamId,
+              };
+              return [...prev, newSegment].sort((a, b) => a.segmentIndex - b.segmentIndex);
+            });
+
+            if (segmentIndex === 0) {
+              setIsGeneratingAudio(false);
+            }
+          } else if (data.type === "audio_stream_end" && data.streamId !== undefined) {
+            const streamId = data.streamId;
+            streamPlayerRef.current.close(streamId);
+
+            // Keep the cached URL and cues so the segment can be replayed like any other
+            setAudioSegments((prev) =>
+              prev.map((seg) =>
+                seg.streamId === streamId
+                  ? {
+                      ...seg,
+                      audioUrl: data.audioUrl ? `${BACKEND_URL}${data.audioUrl}` : "",
+                      lipSync: decodeLipSync(data.lipSync, lipSyncTableRef.current),
+                    }
+                  : seg
+              )
+            );
+          } else if (data.type === "lip_sync_table" && data.shapes && data.weights) {
+            lipSyncTableRef.current = {
+              shapes: data.shapes,
+              channels: data.channels ?? ["aa", "ee", "ih", "oh", "ou"],
+              weights: data.weights,
+              silence: data.silence ?? data.shapes.length - 1,
+            };
           } else if (data.type === "auth_status") {
             // Handle auth status from server
             setGuestMessagesRemaining(data.guestMessagesRemaining ?? null);
@@ -305,7 +385,7 @@ export function useWebSocket(url: string, options?: UseWebSocketOptions, clientI
       pendingImageRef.current = imageBase64;
     }
 
-    const message: { content: string; timestamp: string; image?: string; tts_engine?: string; lip_sync_mode?: string } = {
+    const message: { content: string; timestamp: string; image?: string; tts_engine?: string; lip_sync_mode?: string; audio_delivery?: string; lip_sync_format?: string; audio_formats?: string[] } = {
       content: content || (imageBase64 ? "What do you think of this?" : ""),
       timestamp: new Date().toISOString(),
     };
@@ -318,6 +398,16 @@ export function useWebSocket(url: string, options?: UseWebSocketOptions, clientI
     if (lipSyncMode) {
       message.lip_sync_mode = lipSyncMode;
     }
+    if (AUDIO_DELIVERY === "stream") {
+      message.audio_delivery = AUDIO_DELIVERY;
+    }
+    if (LIP_SYNC_FORMAT === "compact") {
+      message.lip_sync_format = LIP_SYNC_FORMAT;
+    }
+    const audioFormats = playableAudioFormats();
+    if (audioFormats) {
+      message.audio_formats = audioFormats;
+    }
 
     const serialized = JSON.stringify(message);
     if (websocketRef.current?.readyState === WebSocket.OPEN) {
@@ -351,16 +441,28 @@ export function useWebSocket(url: string, options?: UseWebSocketOptions, clientI
     setNextExpectedIndex((prev) => prev + 1);
   }, []);
 
+  // Start a streamed segment once it's next in line (URL segments are played by the avatar)
+  useEffect(() => {
+    const expectedStream = audioSegments.find(
+      (seg) => seg.streamId !== undefined && seg.segmentIndex === nextExpectedIndex && !seg.isPlayed && !seg.isPlaying
+    );
+    if (expectedStream && expectedStream.streamId !== undefined) {
+      streamPlayerRef.current.start(expectedStream.streamId);
+      markSegmentPlaying(expectedStream.segmentIndex);
+    }
+  }, [audioSegments, nextExpectedIndex, markSegmentPlaying]);
+
   // Get the next segment to play (only if it matches expected index - enforces strict ordering)
   const getNextSegment = useCallback((): AudioSegment | null => {
     const expectedSegment = audioSegments.find(
-      (seg) => seg.segmentIndex === nextExpectedIndex && !seg.isPlayed && !seg.isPlaying
+      (seg) => seg.segmentIndex === nextExpectedIndex && !seg.isPlayed && !seg.isPlaying && seg.streamId === undefined
     );
     return expectedSegment ?? null;
   }, [audioSegments, nextExpectedIndex]);
 
   // Clear all audio segments (for stopping playback)
   const clearAudioSegments = useCallback(() => {
+    streamPlayerRef.current.stop();
     setAudioSegments([]);
     setTotalAudioSegments(null);
     setNextExpectedIndex(0);
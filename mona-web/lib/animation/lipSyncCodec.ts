@@ -0,0 +1,35 @@
+/**
+ * Compact lip sync decoding
+ *
+ * With lip_sync_format "compact" the backend sends cues as parallel arrays
+ * ({ t: starts, s: shape indices, end }) and the shape -> blend weight table
+ * once per session (a "lip_sync_table" message). Cues are contiguous, so each
+ * one ends where the next starts. This expands them back to LipSyncCue[].
+ */
+import { CompactLipSync, LipSyncCue, LipSyncTable } from "@/types/chat";
+
+export function isCompactLipSync(payload: unknown): payload is CompactLipSync {
+  return !!payload && !Array.isArray(payload) && typeof payload === "object" && "t" in payload;
+}
+
+/** Full cues pass through; compact cues are expanded with the session's table. */
+export function decodeLipSync(
+  payload: LipSyncCue[] | CompactLipSync | null | undefined,
+  table: LipSyncTable | null
+): LipSyncCue[] | undefined {
+  if (!payload) return undefined;
+  if (!isCompactLipSync(payload)) return payload;
+  if (!table) return undefined;  // Table not received yet - play without cues
+
+  const [aa, ee, ih, oh, ou] = ["aa", "ee", "ih", "oh", "ou"].map((c) => table.channels.indexOf(c));
+  return payload.t.map((start, i) => {
+    const index = payload.s[i] ?? table.silence;
+    const weights = table.weights[index] ?? table.weights[table.silence];
+    return {
+      start,
+      end: i + 1 < payload.t.length ? payload.t[i + 1] : payload.end,
+      shape: table.shapes[index] ?? "X",
+      phonemes: { aa: weights[aa], ee: weights[ee], ih: weights[ih], oh: weights[oh], ou: weights[ou] },
+    };
+  });
+}
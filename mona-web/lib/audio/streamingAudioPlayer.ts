@@ -0,0 +1,219 @@
+/**
+ * Streaming Audio Player
+ *
+ * Plays WAV audio that arrives as binary WebSocket frames while the backend
+ * is still synthesizing it. Each stream's bytes start with a normal WAV
+ * header (sizes may be 0 / 0xFFFFFFFF because the length isn't known yet),
+ * followed by 16-bit PCM. PCM is converted to AudioBuffers and scheduled
+ * back-to-back on the shared AudioContext, so playback starts on the first
+ * chunk instead of after the full file has been downloaded.
+ *
+ * Streams are opened in segment order and only begin playing once start()
+ * is called, which lets the caller keep them in line with URL-based segments.
+ */
+
+// Small lead so the first buffer isn't scheduled in the past
+const SCHEDULE_LEAD_SECONDS = 0.05;
+
+interface WavFormat {
+  sampleRate: number;
+  channels: number;
+}
+
+interface AudioStream {
+  id: number;
+  header: Uint8Array;         // Bytes received before the data chunk was found
+  format: WavFormat | null;
+  leftover: Uint8Array | null; // Partial PCM frame carried to the next chunk
+  pending: AudioBuffer[];      // Decoded but not yet scheduled (before start())
+  started: boolean;
+  closed: boolean;
+  activeSources: number;
+  onEnded?: () => void;
+}
+
+export class StreamingAudioPlayer {
+  private context: AudioContext | null = null;
+  private streams = new Map<number, AudioStream>();
+  private sources = new Set<AudioBufferSourceNode>();
+  private playhead = 0;
+
+  /** Register a new stream. Bytes pushed before start() are buffered. */
+  open(streamId: number, onEnded?: () => void): void {
+    this.streams.set(streamId, {
+      id: streamId,
+      header: new Uint8Array(0),
+      format: null,
+      leftover: null,
+      pending: [],
+      started: false,
+      closed: false,
+      activeSources: 0,
+      onEnded,
+    });
+  }
+
+  /** Whether a stream is known to the player (open and not yet finished). */
+  has(streamId: number): boolean {
+    return this.streams.has(streamId);
+  }
+
+  /** Feed raw bytes for a stream. */
+  push(streamId: number, bytes: Uint8Array): void {
+    const stream = this.streams.get(streamId);
+    if (!stream) return;
+
+    let pcm = bytes;
+    if (!stream.format) {
+      stream.header = concat(stream.header, bytes);
+      const parsed = parseWavHeader(stream.header);
+      if (!parsed) return;  // Header incomplete - wait for more bytes
+      stream.format = parsed.format;
+      pcm = stream.header.subarray(parsed.dataOffset);
+      stream.header = new Uint8Array(0);
+    }
+
+    const buffer = this.decode(stream, pcm);
+    if (!buffer) return;
+    if (stream.started) {
+      this.schedule(stream, buffer);
+    } else {
+      stream.pending.push(buffer);
+    }
+  }
+
+  /** Begin playback of a stream (plays buffered audio, then live chunks). */
+  start(streamId: number): void {
+    const stream = this.streams.get(streamId);
+    if (!stream || stream.started) return;
+    stream.started = true;
+    for (const buffer of stream.pending) {
+      this.schedule(stream, buffer);
+    }
+    stream.pending = [];
+    this.maybeFinish(stream);
+  }
+
+  /** Mark a stream as complete - onEnded fires once its audio has played out. */
+  close(streamId: number): void {
+    const stream = this.streams.get(streamId);
+    if (!stream) return;
+    stream.closed = true;
+    this.maybeFinish(stream);
+  }
+
+  /** Stop everything immediately (e.g. user interrupted playback). */
+  stop(): void {
+    this.streams.clear();
+    this.playhead = 0;
+    for (const source of this.sources) {
+      source.onended = null;
+      try {
+        source.stop();
+      } catch (e) {
+        // Already stopped
+      }
+    }
+    this.sources.clear();
+  }
+
+  private getContext(): AudioContext | null {
+    if (this.context) return this.context;
+    // Reuse the context unlocked by useAudioContext during a user gesture
+    this.context = (window as any).__monaAudioContext ?? null;
+    if (!this.context) {
+      try {
+        this.context = new (window.AudioContext || (window as any).webkitAudioContext)();
+      } catch (e) {
+        return null;
+      }
+    }
+    return this.context;
+  }
+
+  private decode(stream: AudioStream, bytes: Uint8Array): AudioBuffer | null {
+    const context = this.getContext();
+    if (!context || !stream.format) return null;
+
+    const data = stream.leftover ? concat(stream.leftover, bytes) : bytes;
+    const frameBytes = 2 * stream.format.channels;
+    const usable = data.length - (data.length % frameBytes);
+    stream.leftover = usable < data.length ? data.slice(usable) : null;
+    const frames = usable / frameBytes;
+    if (frames === 0) return null;
+
+    const buffer = context.createBuffer(stream.format.channels, frames, stream.format.sampleRate);
+    const view = new DataView(data.buffer, data.byteOffset, usable);
+    for (let channel = 0; channel < stream.format.channels; channel++) {
+      const out = buffer.getChannelData(channel);
+      for (let i = 0; i < frames; i++) {
+        out[i] = view.getInt16((i * stream.format.channels + channel) * 2, true) / 32768;
+      }
+    }
+    return buffer;
+  }
+
+  private schedule(stream: AudioStream, buffer: AudioBuffer): void {
+    const context = this.getContext();
+    if (!context) return;
+
+    const source = context.createBufferSource();
+    source.buffer = buffer;
+    source.connect(context.destination);
+
+    const startAt = Math.max(this.playhead, context.currentTime + SCHEDULE_LEAD_SECONDS);
+    source.start(startAt);
+    this.playhead = startAt + buffer.duration;
+
+    stream.activeSources += 1;
+    this.sources.add(source);
+    source.onended = () => {
+      this.sources.delete(source);
+      stream.activeSources -= 1;
+      this.maybeFinish(stream);
+    };
+  }
+
+  private maybeFinish(stream: AudioStream): void {
+    if (!stream.closed || !stream.started || stream.activeSources > 0) return;
+    if (!this.streams.has(stream.id)) return;
+    this.streams.delete(stream.id);
+    stream.onEnded?.();
+  }
+}
+
+/** Split a binary frame into its 4-byte big-endian stream id and payload. */
+export function parseStreamFrame(frame: ArrayBuffer): { streamId: number; bytes: Uint8Array } | null {
+  if (frame.byteLength < 4) return null;
+  const streamId = new DataView(frame).getUint32(0, false);
+  return { streamId, bytes: new Uint8Array(frame, 4) };
+}
+
+function parseWavHeader(bytes: Uint8Array): { format: WavFormat; dataOffset: number } | null {
+  if (bytes.length < 12) return null;
+  const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.length);
+  let offset = 12;
+  let format: WavFormat | null = null;
+  while (offset + 8 <= bytes.length) {
+    const id = String.fromCharCode(bytes[offset], bytes[offset + 1], bytes[offset + 2], bytes[offset + 3]);
+    const size = view.getUint32(offset + 4, true);
+    if (id === "fmt ") {
+      if (offset + 8 + 16 > bytes.length) return null;
+      format = {
+        channels: view.getUint16(offset + 10, true),
+        sampleRate: view.getUint32(offset + 12, true),
+      };
+    } else if (id === "data") {
+      return format ? { format, dataOffset: offset + 8 } : null;
+    }
+    offset += 8 + size + (size & 1);
+  }
+  return null;
+}
+
+function concat(a: Uint8Array, b: Uint8Array): Uint8Array {
+  const out = new Uint8Array(a.length + b.length);
+  out.set(a, 0);
+  out.set(b, a.length);
+  return out;
+}
@@ -35,6 +35,23 @@ export interface LipSyncCue {
   };
 }
 
+// Compact lip sync (lip_sync_format "compact"): parallel arrays, expanded with LipSyncTable
+export interface CompactLipSync {
+  t: number[];     // Cue start times in seconds
+  s: number[];     // Shape indices into LipSyncTable.shapes
+  end: number;     // End time of the last cue
+  fps?: number;    // Viseme curve frame rate (if requested)
+  curve?: string;  // Base64 little-endian Float32, frames x channels
+}
+
+// Sent once per session before the first compact cues
+export interface LipSyncTable {
+  shapes: string[];
+  channels: string[];
+  weights: number[][];  // Per shape, one weight per channel
+  silence: number;      // Index of the silent shape
+}
+
 export interface Message {
   content: string;
   sender: "user" | "mona";
@@ -60,10 +77,11 @@ export interface AudioSegment {
   segmentIndex: number;
   isPlaying?: boolean;
   isPlayed?: boolean;
+  streamId?: number;  // Set when the audio arrives as binary WebSocket frames
 }
 
 export interface WebSocketMessage {
-  type: "message" | "message_chunk" | "typing" | "error" | "audio_ready" | "audio_chunk" | "audio_complete" | "audio_segment" | "auth_status" | "chat_history" | "guest_limit_reached" | "affection_update" | "pong";
+  type: "message" | "message_chunk" | "typing" | "error" | "audio_ready" | "audio_chunk" | "audio_complete" | "audio_segment" | "audio_stream_start" | "audio_stream_end" | "auth_status" | "chat_history" | "guest_limit_reached" | "affection_update" | "lip_sync_table" | "pong";
   content?: string;
   sender?: "user" | "mona";
   timestamp?: string;
@@ -72,12 +90,14 @@ export interface WebSocketMessage {
   error?: string;
   audioUrl?: string;
   imageUrl?: string;  // For displaying uploaded images
-  lipSync?: LipSyncCue[];  // Lip sync timing data
+  lipSync?: LipSyncCue[] | CompactLipSync;  // Lip sync timing data (compact when requested)
   chunkIndex?: number;  // For audio chunks
   totalChunks?: number;  // Total expected audio chunks
   totalAudioChunks?: number;  // Total audio chunks in message
   segmentIndex?: number;  // For sentence-level audio segments
   totalAudioSegments?: number;  // Total expected audio segments
+  streamId?: number;  // For streamed audio segments (binary frames carry the same id)
+  complete?: boolean;  // audio_stream_end: false if the stream broke midway
   // Auth-related fields
   isAuthenticated?: boolean;
   user?: {
@@ -95,4 +115,9 @@ export interface WebSocketMessage {
   affection?: { score: number; level: string };
   level?: string;   // For affection_update messages
   score?: number;   // For affection_update messages
+  // lip_sync_table fields
+  shapes?: string[];
+  channels?: string[];
+  weights?: number[][];
+  silence?: number;
 }
@@ -15,17 +15,37 @@ API:
         "speed_factor": 1.0
     }
 
-    Returns: Streaming WAV audio
+    Returns: WAV audio. With streaming_mode=1 (default) the WAV header is sent
+    first with unknown sizes (0xFFFFFFFF) and 16-bit PCM follows as each chunk
+    comes out of the model; streaming_mode=0 returns one complete WAV.
+
+    GET /health
+    Also reports the inference queue (depth, batches, real-time factor) and
+    the prompt feature cache.
+
+Prompt features (prompt text tokens, speech tokens/feats and speaker
+embedding) depend only on (ref_audio_path, prompt_text), so they are
+extracted once, kept in memory and persisted as .npy files under
+PROMPT_CACHE_DIR; each request only tokenizes its own text.
 """
 
 import argparse
+import asyncio
+import hashlib
 import io
+import json
 import os
+import struct
 import sys
+import threading
+import time
 import wave
+from collections import deque
 from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
 
 import numpy as np
+import torch
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
@@ -55,7 +75,7 @@ class TTSRequest(BaseModel):
     prompt_text: str = "This is a sample voice for you to get started with."
     prompt_lang: str = "en"
     speed_factor: float = 1.0
-    streaming_mode: int = 1  # Ignored, always streams
+    streaming_mode: int = 1  # 1 = stream PCM as it's generated, 0 = one complete WAV
 
 
 # Initialize FastAPI
@@ -69,8 +89,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+MODEL_ID = "iic/CosyVoice-300M"
+PROMPT_CACHE_DIR = Path(os.getenv("PROMPT_CACHE_DIR", str(COSYVOICE_ROOT / "prompt_cache")))
+
 # Global model instance
 cosyvoice_model = None
+_model_lock = threading.Lock()  # Startup, the endpoint and the worker may all ask at once
 cached_prompt_audio = {}
 
 
@@ -78,10 +102,12 @@ def get_model():
     """Get or initialize the CosyVoice model."""
     global cosyvoice_model
     if cosyvoice_model is None:
-        print("Loading CosyVoice model...")
-        # Use CosyVoice-300M (v1) for stability
-        cosyvoice_model = CosyVoice("iic/CosyVoice-300M", load_jit=False, load_trt=False)
-        print("✓ CosyVoice model loaded")
+        with _model_lock:
+            if cosyvoice_model is None:
+                print("Loading CosyVoice model...")
+                # Use CosyVoice-300M (v1) for stability
+                cosyvoice_model = CosyVoice(MODEL_ID, load_jit=False, load_trt=False)
+                print("✓ CosyVoice model loaded")
     return cosyvoice_model
 
 
@@ -96,12 +122,159 @@ def get_prompt_audio(ref_audio_path: str):
     return cached_prompt_audio[ref_audio_path]
 
 
-def numpy_to_wav_bytes(audio_np: np.ndarray, sample_rate: int = 22050) -> bytes:
-    """Convert numpy audio array to WAV bytes."""
-    # Ensure audio is in correct format
+# ============================================================
+# Prompt feature cache
+# ============================================================
+
+class PromptFeatureCache:
+    """
+    Zero-shot prompt features per (ref_audio_path, prompt_text).
+
+    Holds everything frontend_zero_shot() derives from the prompt - all of
+    its model inputs except the tts text tokens. Entries live in memory and
+    on disk as one .npy per tensor plus meta.json, loaded memory-mapped. The
+    disk key includes the reference file's size and mtime, so replacing the
+    sample invalidates it.
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+        self._memory: Dict[str, Dict[str, torch.Tensor]] = {}
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.extract_ms = 0.0
+
+    @staticmethod
+    def _key(ref_audio_path: str, prompt_text: str) -> str:
+        stat = os.stat(ref_audio_path)
+        raw = f"{MODEL_ID}|{os.path.abspath(ref_audio_path)}|{stat.st_size}|{stat.st_mtime_ns}|{prompt_text}"
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def get(self, model, ref_audio_path: str, prompt_text: str) -> Dict[str, torch.Tensor]:
+        key = self._key(ref_audio_path, prompt_text)
+        with self._lock:
+            features = self._memory.get(key)
+            if features is not None:
+                self.memory_hits += 1
+                return features
+
+            features = self._load(key)
+            if features is not None:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+                start = time.perf_counter()
+                features = self._extract(model, ref_audio_path, prompt_text)
+                self.extract_ms = (time.perf_counter() - start) * 1000
+                print(f"✓ Prompt features extracted in {self.extract_ms:.0f}ms: {ref_audio_path}")
+                self._save(key, features, ref_audio_path, prompt_text)
+            self._memory[key] = features
+            return features
+
+    @staticmethod
+    def _extract(model, ref_audio_path: str, prompt_text: str) -> Dict[str, torch.Tensor]:
+        """Run the zero-shot frontend once and keep only the prompt-side inputs."""
+        prompt_text = model.frontend.text_normalize(prompt_text, split=False)
+        model_input = model.frontend.frontend_zero_shot(
+            "", prompt_text, get_prompt_audio(ref_audio_path), model.sample_rate
+        )
+        return {
+            name: value for name, value in model_input.items()
+            if name not in ("text", "text_len") and isinstance(value, torch.Tensor)
+        }
+
+    def _load(self, key: str) -> Optional[Dict[str, torch.Tensor]]:
+        entry_dir = self.cache_dir / key
+        try:
+            meta = json.loads((entry_dir / "meta.json").read_text())
+            features = {}
+            for name in meta["tensors"]:
+                # Copy-on-write mmap: writable for torch without reading the file into RAM;
+                # pages fault in when model.tts() moves the tensor to the device
+                array = np.load(entry_dir / f"{name}.npy", mmap_mode="c")
+                features[name] = torch.from_numpy(np.asarray(array))
+            return features
+        except (OSError, ValueError, KeyError) as e:
+            if (entry_dir / "meta.json").exists():
+                print(f"⚠ Prompt cache entry {key[:8]} unreadable ({e}) - re-extracting")
+            return None
+
+    def _save(self, key: str, features: Dict[str, torch.Tensor], ref_audio_path: str, prompt_text: str):
+        entry_dir = self.cache_dir / key
+        try:
+            entry_dir.mkdir(parents=True, exist_ok=True)
+            for name, tensor in features.items():
+                np.save(entry_dir / f"{name}.npy", tensor.detach().cpu().numpy())
+            # meta.json last: an entry without it is incomplete and ignored
+            (entry_dir / "meta.json").write_text(json.dumps({
+                "model": MODEL_ID,
+                "ref_audio_path": ref_audio_path,
+                "prompt_text": prompt_text,
+                "tensors": sorted(features),
+                "created": time.time(),
+            }))
+        except OSError as e:
+            print(f"⚠ Could not persist prompt features: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "last_extract_ms": round(self.extract_ms),
+        }
+
+
+prompt_features = PromptFeatureCache(PROMPT_CACHE_DIR)
+
+
+def synthesize_chunks(model, request: TTSRequest) -> Iterator:
+    """
+    Zero-shot synthesis reusing cached prompt features.
+
+    Mirrors inference_zero_shot(): split the normalized text into segments
+    and run model.tts() per segment - only the text tokens are computed here.
+    """
+    features = prompt_features.get(model, request.ref_audio_path, request.prompt_text)
+    for segment in model.frontend.text_normalize(request.text, split=True):
+        text_token, text_token_len = model.frontend._extract_text_token(segment)
+        model_input = dict(features, text=text_token, text_len=text_token_len)
+        yield from model.model.tts(**model_input, stream=True, speed=request.speed_factor)
+
+
+def to_int16(audio_np: np.ndarray) -> np.ndarray:
+    """Flatten model output to mono int16 PCM."""
+    audio_np = np.asarray(audio_np).reshape(-1)
     if audio_np.dtype != np.int16:
         # Normalize and convert to int16
-        audio_np = (audio_np * 32767).astype(np.int16)
+        audio_np = (np.clip(audio_np, -1.0, 1.0) * 32767).astype(np.int16)
+    return audio_np
+
+
+def streaming_wav_header(sample_rate: int, channels: int = 1, bits_per_sample: int = 16) -> bytes:
+    """WAV header for a stream of unknown length (RIFF/data sizes set to 0xFFFFFFFF)."""
+    block_align = channels * bits_per_sample // 8
+    return (
+        b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate,
+                                sample_rate * block_align, block_align, bits_per_sample)
+        + b"data" + struct.pack("<I", 0xFFFFFFFF)
+    )
+
+
+def chunk_to_numpy(chunk) -> np.ndarray:
+    """CosyVoice yields dicts with a 'tts_speech' tensor (older builds yield the tensor)."""
+    if isinstance(chunk, dict) and 'tts_speech' in chunk:
+        return chunk['tts_speech'].numpy()
+    return chunk.numpy() if hasattr(chunk, 'numpy') else chunk
+
+
+def numpy_to_wav_bytes(audio_np: np.ndarray, sample_rate: int = 22050) -> bytes:
+    """Convert numpy audio array to WAV bytes."""
+    audio_np = to_int16(audio_np)
 
     # Create WAV in memory
     buffer = io.BytesIO()
@@ -115,63 +288,309 @@ def numpy_to_wav_bytes(audio_np: np.ndarray, sample_rate: int = 22050) -> bytes:
     return buffer.read()
 
 
+# ============================================================
+# Inference worker
+# ============================================================
+
+# Max requests advanced together in one micro-batch
+MAX_BATCH_SIZE = int(os.getenv("COSYVOICE_MAX_BATCH", "4"))
+# Rolling window for real-time factor stats
+RTF_WINDOW = 200
+
+
+class InferenceJob:
+    """One /tts request waiting for (or in) the inference worker."""
+
+    def __init__(self, request: TTSRequest, loop: asyncio.AbstractEventLoop):
+        self.request = request
+        self.voice_key = (request.ref_audio_path, request.prompt_text)
+        self.loop = loop
+        self.output: "asyncio.Queue" = asyncio.Queue()  # PCM bytes, then None (done) or an Exception
+        self.enqueued = time.perf_counter()
+        self.started: Optional[float] = None
+        self.first_chunk: Optional[float] = None
+        self.audio_bytes = 0
+        self.cancelled = False  # Set by the endpoint when the client goes away
+        self.chunks: Optional[Iterator] = None
+        self.finished = False  # A terminal item (None or an Exception) was emitted
+
+    def emit(self, item):
+        """Hand an item to the request's event loop (called from the worker thread)."""
+        self.loop.call_soon_threadsafe(self.output.put_nowait, item)
+
+
+class InferenceWorker:
+    """
+    Runs all CosyVoice inference on one dedicated thread.
+
+    Requests queue up FIFO. The worker takes the oldest one plus any queued
+    requests for the same reference voice (up to MAX_BATCH_SIZE) and advances
+    their streaming generators round-robin, so each gets its first chunk
+    without waiting for the others to finish. Same-voice requests that arrive
+    mid-batch join it only if no other voice is waiting ahead of them, so a
+    steady stream of one voice can't starve the rest. CosyVoice-300M has no multi-utterance batch call, so
+    this is the batching the model allows; other voices wait for the batch
+    to drain.
+    """
+
+    def __init__(self):
+        self._pending: Deque[InferenceJob] = deque()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.batches = 0
+        self.max_batch = 0
+        self._rtf: Deque[float] = deque(maxlen=RTF_WINDOW)
+        self._first_chunk_ms: Deque[float] = deque(maxlen=RTF_WINDOW)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="cosyvoice-inference", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+
+    def submit(self, job: InferenceJob):
+        with self._cond:
+            self._pending.append(job)
+            self._cond.notify()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    def _take_batch(self) -> List[InferenceJob]:
+        """Block for the oldest request, then take queued ones for the same voice."""
+        with self._cond:
+            while not self._pending and not self._stopping:
+                self._cond.wait()
+            if self._stopping:
+                return []
+            first = self._pending.popleft()
+            return [first] + self._take_matching(first.voice_key, MAX_BATCH_SIZE - 1)
+
+    def _take_matching(self, voice_key: Tuple[str, str], limit: int, fair: bool = False) -> List[InferenceJob]:
+        """Remove up to limit queued jobs for voice_key (caller holds the lock).
+
+        fair=True only takes jobs enqueued before the oldest job for another voice.
+        """
+        matched = []
+        if limit <= 0:
+            return matched
+        for job in list(self._pending):
+            if fair and job.voice_key != voice_key:
+                break
+            if job.voice_key == voice_key:
+                self._pending.remove(job)
+                matched.append(job)
+                if len(matched) >= limit:
+                    break
+        return matched
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                # Never let one bad batch end the only inference thread
+                print(f"TTS batch failed: {e}")
+                self.active = 0
+                for job in batch:
+                    if not job.finished:
+                        self.failed += 1
+                        self._emit_final(job, e)
+
+    def _run_batch(self, batch: List[InferenceJob]):
+        """Run a batch; same-voice joiners are appended to `batch` so _run can fail them too."""
+        model = get_model()
+        sample_rate = getattr(model, "sample_rate", 22050)
+        voice_key = batch[0].voice_key
+        self.batches += 1
+
+        active: List[InferenceJob] = []
+        for job in batch:
+            self._begin(job, model, active)
+
+        while active:
+            self.max_batch = max(self.max_batch, len(active))
+            self.active = len(active)
+            for job in list(active):
+                if job.cancelled:
+                    self._finish(job, active, sample_rate, error=None, cancelled=True)
+                    continue
+                try:
+                    chunk = next(job.chunks)
+                    pcm = to_int16(chunk_to_numpy(chunk)).tobytes()
+                except StopIteration:
+                    self._finish(job, active, sample_rate)
+                    continue
+                except Exception as e:
+                    self._finish(job, active, sample_rate, error=e)
+                    continue
+                if job.first_chunk is None:
+                    job.first_chunk = time.perf_counter()
+                job.audio_bytes += len(pcm)
+                job.emit(pcm)
+
+            # Admit same-voice requests that arrived while this batch was running,
+            # but none queued behind another voice's request
+            with self._cond:
+                joiners = self._take_matching(voice_key, MAX_BATCH_SIZE - len(active), fair=True)
+            batch.extend(joiners)
+            for job in joiners:
+                self._begin(job, model, active)
+        self.active = 0
+
+    def _begin(self, job: InferenceJob, model, active: List[InferenceJob]):
+        job.started = time.perf_counter()
+        request = job.request
+        try:
+            job.chunks = iter(synthesize_chunks(model, request))
+        except Exception as e:
+            self.failed += 1
+            self._emit_final(job, e)
+            return
+        active.append(job)
+
+    @staticmethod
+    def _emit_final(job: InferenceJob, item: Optional[Exception]):
+        job.finished = True
+        if job.chunks is not None and hasattr(job.chunks, "close"):
+            try:
+                job.chunks.close()
+            except Exception:
+                pass
+        job.emit(item)
+
+    def _finish(
+        self,
+        job: InferenceJob,
+        active: List[InferenceJob],
+        sample_rate: int,
+        error: Optional[Exception] = None,
+        cancelled: bool = False,
+    ):
+        active.remove(job)
+        if error is not None:
+            print(f"TTS Error: {error}")
+            self.failed += 1
+            self._emit_final(job, error)
+            return
+        self._emit_final(job, None)
+        if cancelled:
+            return
+
+        self.completed += 1
+        elapsed = time.perf_counter() - job.started
+        audio_seconds = job.audio_bytes / 2 / sample_rate
+        rtf = elapsed / audio_seconds if audio_seconds > 0 else 0.0
+        first_ms = ((job.first_chunk or job.started) - job.enqueued) * 1000
+        wait_ms = (job.started - job.enqueued) * 1000
+        if audio_seconds > 0:
+            self._rtf.append(rtf)
+        self._first_chunk_ms.append(first_ms)
+        print(f"  {audio_seconds:.2f}s audio in {elapsed:.2f}s (RTF {rtf:.2f}) - "
+              f"queued {wait_ms:.0f}ms, first chunk {first_ms:.0f}ms")
+
+    @staticmethod
+    def _summary(samples: Deque[float], digits: int) -> Dict[str, float]:
+        if not samples:
+            return {"avg": 0.0, "p95": 0.0}
+        ordered = sorted(samples)
+        return {
+            "avg": round(sum(ordered) / len(ordered), digits),
+            "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], digits),
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue_depth,
+            "active": self.active,
+            "completed": self.completed,
+            "failed": self.failed,
+            "batches": self.batches,
+            "max_batch": self.max_batch,
+            "rtf": self._summary(self._rtf, 3),
+            "first_chunk_ms": self._summary(self._first_chunk_ms, 0),
+        }
+
+
+inference_worker = InferenceWorker()
+
+
 @app.post("/tts")
 async def tts_endpoint(request: TTSRequest):
     """
     Generate speech from text using CosyVoice.
     Streams WAV audio as it's generated.
     """
-    try:
-        model = get_model()
-        prompt_audio = get_prompt_audio(request.ref_audio_path)
-
-        print(f"Generating speech: '{request.text[:50]}...' (lang={request.text_lang})")
-
-        async def generate_audio():
-            """Generator that yields audio chunks."""
-            full_audio = []
-
-            # Use zero-shot inference with the reference audio
-            for chunk in model.inference_zero_shot(
-                tts_text=request.text,
-                prompt_text=request.prompt_text,
-                prompt_speech_16k=prompt_audio,
-                stream=True,
-                speed=request.speed_factor
-            ):
-                # CosyVoice yields dict with 'tts_speech' key
-                if isinstance(chunk, dict) and 'tts_speech' in chunk:
-                    audio_chunk = chunk['tts_speech'].numpy()
-                else:
-                    audio_chunk = chunk.numpy() if hasattr(chunk, 'numpy') else chunk
-
-                full_audio.append(audio_chunk)
-
-            # Combine all chunks and convert to WAV
-            if full_audio:
-                combined = np.concatenate(full_audio)
-                wav_bytes = numpy_to_wav_bytes(combined, sample_rate=22050)
-                yield wav_bytes
-
-        return StreamingResponse(
-            generate_audio(),
-            media_type="audio/wav",
-            headers={"Content-Disposition": "attachment; filename=speech.wav"}
-        )
+    if not os.path.exists(request.ref_audio_path):
+        raise HTTPException(status_code=404, detail=f"Reference audio not found: {request.ref_audio_path}")
 
-    except FileNotFoundError as e:
-        raise HTTPException(status_code=404, detail=str(e))
+    try:
+        # Off the event loop: a cold load must not stall /health or other requests
+        model = await asyncio.to_thread(get_model)
     except Exception as e:
         print(f"TTS Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    sample_rate = getattr(model, "sample_rate", 22050)
+    print(f"Queueing speech: '{request.text[:50]}...' (lang={request.text_lang}, "
+          f"queue depth {inference_worker.queue_depth})")
+
+    job = InferenceJob(request, asyncio.get_running_loop())
+    inference_worker.start()
+    inference_worker.submit(job)
+
+    async def pcm_chunks():
+        """PCM from the worker until it signals the end."""
+        try:
+            while True:
+                item = await job.output.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            job.cancelled = True  # No-op if finished; stops inference if the client left
+
+    async def stream_audio():
+        """Yield the WAV header, then each chunk's PCM as soon as the model produces it."""
+        yield streaming_wav_header(sample_rate)
+        async for pcm in pcm_chunks():
+            yield pcm
+
+    async def complete_audio():
+        """Yield one complete WAV once synthesis has finished."""
+        pcm = b"".join([chunk async for chunk in pcm_chunks()])
+        if pcm:
+            yield numpy_to_wav_bytes(np.frombuffer(pcm, dtype=np.int16), sample_rate=sample_rate)
+
+    return StreamingResponse(
+        stream_audio() if request.streaming_mode else complete_audio(),
+        media_type="audio/wav",
+        headers={"Content-Disposition": "attachment; filename=speech.wav"}
+    )
+
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
     return {
         "status": "ok",
-        "model_loaded": cosyvoice_model is not None
+        "model_loaded": cosyvoice_model is not None,
+        "inference": inference_worker.get_stats(),
+        "prompt_cache": prompt_features.get_stats(),
     }
 
 
@@ -183,12 +602,18 @@ async def startup_event():
     print("=" * 50)
     try:
         get_model()
+        inference_worker.start()
         print("✓ Server ready!")
     except Exception as e:
         print(f"⚠ Model pre-load failed: {e}")
         print("  Model will load on first request")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    inference_worker.stop()
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="CosyVoice TTS Server for Mona")
     parser.add_argument("--port", type=int, default=9881, help="Port to run on")